@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# startup time of the console scripts.
+#
+#   python tools/bench_startup.py
+#   python tools/bench_startup.py -n 20 --max-ms 250
+#
+# each module is imported in a fresh interpreter (as the console scripts do).
+# the exit status is 1 if the median exceeds --max-ms or if a module listed
+# in lazy_modules is imported at startup.
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+cli_modules = [
+    "turbofilemanager.file_manager_cli",
+    "turbofilemanager.job_manager_cli",
+]
+# heavy modules that must be imported only by the subcommands that need them
+lazy_modules = ["pandas", "numpy", "asyncio", "sqlite3", "concurrent.futures"]
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code: str):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [repo_dir] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+def bench(module: str, num: int):
+    times = []
+    for _ in range(num):
+        start = time.perf_counter()
+        run_python(f"import {module}")
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def loaded_lazy_modules(module: str):
+    stdout = run_python(
+        f"import sys, {module}; print(' '.join(sys.modules))"
+    ).stdout.split()
+    return [name for name in lazy_modules if name in stdout]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="startup time of the CLIs")
+    parser.add_argument("-n", type=int, default=10, help="repetitions")
+    parser.add_argument(
+        "--max-ms", type=float, default=None, help="fail above this median"
+    )
+    args = parser.parse_args()
+
+    baseline = statistics.median(bench("sys", args.n))
+    print(f"{'python -c pass':40s} median {baseline:7.1f} ms")
+    failed = False
+    for module in cli_modules:
+        times = bench(module, args.n)
+        median = statistics.median(times)
+        print(
+            f"{module:40s} median {median:7.1f} ms"
+            f" (min {min(times):.1f}, +{median - baseline:.1f} over python)"
+        )
+        if args.max_ms is not None and median > args.max_ms:
+            print(f"  FAIL: slower than {args.max_ms} ms")
+            failed = True
+        loaded = loaded_lazy_modules(module)
+        if len(loaded) > 0:
+            print(f"  FAIL: {', '.join(loaded)} imported at startup")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
-import os
-import glob
-
+# the modules of turbofilemanager. the list is explicit so that importing
+# the package does not scan the package directory.
 __all__ = [
-    os.path.split(os.path.splitext(file)[0])[1]
-    for file in glob.glob(
-        os.path.join(os.path.dirname(__file__), "[a-zA-Z0-9]*.py")
-    )
+    "bulk_fetch",
+    "bulk_submission",
+    "checksum_handler",
+    "data_transfer_manager",
+    "file_manager_cli",
+    "file_manager_env",
+    "job_dag",
+    "job_index",
+    "job_manager",
+    "job_record",
+    "job_report",
+    "job_tail",
+    "job_manager_cli",
+    "job_watcher",
+    "machine_handler",
+    "pending_queue",
+    "queue_selector",
+    "queue_table",
+    "scheduler_adapter",
+    "script_template",
+    "transfer_filter",
+    "transfer_journal",
+    "transfer_planner",
+    "walltime_predictor",
 ]
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import time
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_manager import Job_submission
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def parse_job_ids(text: str):
+    # "3-120", "3,5,7-9" -> [3, 4, ..., 120], [3, 5, 7, 8, 9]
+    job_ids = []
+    for item in str(text).split(","):
+        item = item.strip()
+        if len(item) == 0:
+            continue
+        try:
+            if "-" in item:
+                first, last = [int(v) for v in item.split("-", 1)]
+                job_ids += list(range(first, last + 1))
+            else:
+                job_ids.append(int(item))
+        except ValueError:
+            logger.error(f"job id {item} is not a number or a range (e.g., 3-120).")
+            raise ValueError
+    return sorted(set(job_ids))
+
+
+def format_bytes(size: int):
+    for unit in ["B", "kB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Bulk_fetch:
+    # fetch many jobs concurrently. at most fetch_concurrency jobs per server
+    # are fetched at once, the ssh connections to a server are shared
+    # (ssh_control_persist), and a failed job is retried after the others.
+    max_trials = 3
+    retry_wait = 30  # sec.
+
+    def __init__(
+        self,
+        pkl_paths: list,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        dryrun_flag: bool = False,
+        delete_flag: bool = False,
+        strategy: str = "auto",
+    ):
+        self.pkl_paths = pkl_paths
+        self.include_list = include_list if include_list is not None else []
+        self.exclude_list = exclude_list if exclude_list is not None else []
+        self.dryrun_flag = dryrun_flag
+        self.delete_flag = delete_flag
+        self.strategy = strategy
+        self.semaphores = {}  # server machine name -> threading.Semaphore
+
+    def load_submissions(self):
+        submissions = []
+        for pkl_path in self.pkl_paths:
+            try:
+                submission = Job_submission.load(pkl_path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"{pkl_path} is not readable: {e}")
+                continue
+            if submission.job_dir is None:
+                logger.warning(f"{submission.local_dir} has not been submitted.")
+                continue
+            if submission.job_running:
+                logger.warning(
+                    f"{submission.local_dir} is running ({submission.job_number}); not fetched."
+                )
+                continue
+            submissions.append(submission)
+        return submissions
+
+    def fetch(self, submission: Job_submission):
+        # returns (bytes, sec., error)
+        server_name = submission.server_machine.name
+        with self.semaphores[server_name]:
+            start_time = time.time()
+            try:
+                transferred_bytes = submission.transferred_bytes()
+                submission.fetch_job(
+                    from_objects=[],
+                    include_list=self.include_list,
+                    exclude_list=self.exclude_list,
+                    dryrun_flag=self.dryrun_flag,
+                    delete_flag=self.delete_flag,
+                    strategy=self.strategy,
+                )
+                transferred_bytes = (
+                    submission.transferred_bytes() - transferred_bytes
+                )
+            except Exception as e:
+                # the other jobs go on; this one is retried later.
+                logger.warning(f"fetch of {submission.local_dir} failed: {e!r}")
+                return 0, time.time() - start_time, e
+        return transferred_bytes, time.time() - start_time, None
+
+    def run(self):
+        # returns {local_dir: (bytes, sec., error)}
+        submissions = self.load_submissions()
+        results = {}
+        if len(submissions) == 0:
+            logger.info("No job to fetch.")
+            return results
+        concurrency = {}  # server machine name -> workers
+        for submission in submissions:
+            server_machine = submission.server_machine
+            if server_machine.name not in concurrency:
+                concurrency[server_machine.name] = server_machine.fetch_concurrency
+                self.semaphores[server_machine.name] = threading.Semaphore(
+                    server_machine.fetch_concurrency
+                )
+        max_workers = min(sum(concurrency.values()), len(submissions))
+        logger.info(
+            f"Fetching {len(submissions)} jobs from {len(self.semaphores)} servers with {max_workers} workers."
+        )
+        start_time = time.time()
+        remaining = submissions
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for trial in range(self.max_trials):
+                if trial > 0:
+                    logger.info(
+                        f"Retrying {len(remaining)} jobs in {self.retry_wait} sec. (trial {trial + 1}/{self.max_trials})."
+                    )
+                    time.sleep(self.retry_wait)
+                failed = []
+                for submission, result in zip(
+                    remaining, executor.map(self.fetch, remaining)
+                ):
+                    results[submission.local_dir] = result
+                    if result[2] is not None:
+                        failed.append(submission)
+                remaining = failed
+                if len(remaining) == 0:
+                    break
+        self.show_summary(results, time.time() - start_time)
+        return results
+
+    def show_summary(self, results: dict, elapsed: float):
+        fetched = [r for r in results.values() if r[2] is None]
+        total_bytes = sum(r[0] for r in fetched)
+        durations = sorted(r[1] for r in fetched)
+        logger.info(f"fetched = {len(fetched)}")
+        logger.info(f"failed  = {len(results) - len(fetched)}")
+        logger.info(
+            f"bytes   = {format_bytes(total_bytes)} ({format_bytes(total_bytes / max(elapsed, 1e-3))}/s)"
+        )
+        if len(durations) > 0:
+            logger.info(
+                f"time    = {elapsed:.1f} s (per job: median {durations[len(durations) // 2]:.1f} s, max {durations[-1]:.1f} s)"
+            )
+        for local_dir, (size, duration, error) in sorted(results.items()):
+            if error is not None:
+                logger.error(f"{local_dir} is not fetched: {error!r}")
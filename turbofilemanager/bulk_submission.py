@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import copy
+import glob
+from datetime import datetime
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_manager import Job_submission
+from turbofilemanager.pending_queue import Pending_queue
+from turbofilemanager.scheduler_adapter import get_scheduler, normalize_job_id
+from turbofilemanager.script_template import get_script_template
+from turbofilemanager.walltime_predictor import get_input_key
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def expand_job_dirs(patterns: list):
+    # directories and glob patterns -> sorted absolute directories
+    job_dirs = set()
+    for pattern in patterns:
+        matched = glob.glob(pattern)
+        if len(matched) == 0:
+            logger.warning(f"{pattern} does not match any directory.")
+        for path in matched:
+            if os.path.isdir(path):
+                job_dirs.add(os.path.abspath(path))
+    return sorted(job_dirs)
+
+
+class Bulk_submission:
+    # toss many job directories that share the same job settings with
+    # one staging transfer and one ssh session for the submissions.
+    job_marker = "__turbo_job__"
+    error_marker = "__turbo_err__"
+    max_command_length = 100000
+    common_files = []  # files in the common dir of the job dirs to be staged
+
+    def __init__(
+        self, job_dirs: list, submission_script: str = "submit.sh", **kwargs
+    ):
+        # kwargs are the arguments of Job_submission
+        self.job_dirs = [os.path.abspath(job_dir) for job_dir in job_dirs]
+        self.submission_script = submission_script
+        # package.yaml and queue_data.txt are read only once.
+        self.template = Job_submission(**kwargs)
+        self.submissions = []
+
+    def generate_scripts(self):
+        for job_dir in self.job_dirs:
+            submission = copy.copy(self.template)
+            submission.local_dir = job_dir
+            submission.input_key = get_input_key(submission.input_file, job_dir)
+            submission.events = []
+            submission.pkl_name = os.path.join(
+                job_dir, os.path.basename(self.template.pkl_name)
+            )
+            self.submissions.append(submission)
+        # the template is read and scanned once for all the scripts.
+        scripts = get_script_template(
+            self.template.server_machine.name, nompi=self.template.nompi
+        ).render_many(
+            [submission.script_values() for submission in self.submissions]
+        )
+        for submission, script in zip(self.submissions, scripts):
+            submission.generate_script(
+                submission_script=self.submission_script, script=script
+            )
+        logger.info(f"{len(self.submissions)} submission scripts are generated.")
+
+    def get_server_dir(self, local_dir: str):
+        local_machine = self.template.local_machine
+        client_machine = self.template.client_machine
+        server_machine = self.template.server_machine
+        if (
+            client_machine.machine_type == "local"
+            and server_machine.machine_type == "local"
+        ):
+            return local_dir
+        local_home = local_machine.file_manager_root
+        if local_home not in local_dir:
+            logger.error(
+                "server-client_manager.py works only in the local_home dir."
+            )
+            raise ValueError
+        return local_dir.replace(local_home, server_machine.file_manager_root)
+
+    def stage(
+        self,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        dryrun_flag: bool = False,
+        delete_flag: bool = False,
+    ):
+        # a single transfer of the common parent dir restricted to the job dirs
+        if include_list is None:
+            include_list = []
+        if exclude_list is None:
+            exclude_list = []
+        if (
+            self.template.client_machine.machine_type == "local"
+            and self.template.server_machine.machine_type == "local"
+        ):
+            return
+        common_dir = os.path.commonpath(self.job_dirs)
+        rel_dirs = [
+            os.path.relpath(job_dir, common_dir) for job_dir in self.job_dirs
+        ]
+        if rel_dirs == ["."]:
+            bulk_include_list = list(include_list)
+        elif len(include_list) == 0:
+            bulk_include_list = [f"/{rel_dir}" for rel_dir in rel_dirs]
+            bulk_include_list += [f"/{name}" for name in self.common_files]
+        else:
+            bulk_include_list = [f"/{name}" for name in self.common_files]
+            for rel_dir in rel_dirs:
+                for pattern in include_list:
+                    if pattern.startswith("/"):
+                        bulk_include_list.append(f"/{rel_dir}{pattern}")
+                    else:
+                        bulk_include_list.append(f"/{rel_dir}/{pattern}")
+                        bulk_include_list.append(f"/{rel_dir}/**/{pattern}")
+        for submission in self.submissions:
+            submission.add_event("staging_start")
+        transferred_bytes = self.template.transferred_bytes()
+        self.template.data_transfer.put_objects(
+            from_objects=[],
+            include_list=bulk_include_list,
+            exclude_list=exclude_list,
+            dryrun_flag=dryrun_flag,
+            delete_flag=delete_flag,
+            local_dir=common_dir,
+        )
+        # the shared transfer is divided evenly among the jobs.
+        transferred_bytes = self.template.transferred_bytes() - transferred_bytes
+        for submission in self.submissions:
+            submission.add_event(
+                "staging_end",
+                bytes=transferred_bytes // max(len(self.submissions), 1),
+            )
+
+    def merge_stderr(self, command: str):
+        # the stderr lines are marked and merged into stdout; a warning of
+        # qsub must not trigger a retry of run_command nor shift the job id.
+        return f'(({command}) 3>&1 1>&2 2>&3 | sed "s/^/{self.error_marker} /") 2>&1'
+
+    def split_stderr(self, output: str):
+        # -> (stdout, stderr) of a command wrapped by merge_stderr
+        stdout = []
+        stderr = []
+        for line in output.split("\n"):
+            if line.startswith(self.error_marker):
+                stderr.append(line[len(self.error_marker) + 1 :])
+            else:
+                stdout.append(line)
+        return "\n".join(stdout), "\n".join(stderr)
+
+    def submit_failed(self, submission: Job_submission, output: str):
+        # recorded as failed, not as a running job
+        logger.error(
+            f"submission from {submission.local_dir} failed: {output.strip()}"
+        )
+        submission.job_number = None
+        submission.job_running = False
+        submission.job_status = "failed"
+        submission.add_event("submit_failed", output=output.strip())
+        submission.save()
+
+    def get_free_slots(self):
+        server_machine = self.template.server_machine
+        if not server_machine.queuing:
+            return len(self.submissions)
+        scheduler = get_scheduler(server_machine)
+        free_slots = scheduler.free_slots(
+            scheduler.query(max_age=0),
+            self.template.queue,
+            self.template.max_job_submit,
+            self.template.max_job_run,
+        )
+        if free_slots is None:
+            return len(self.submissions)
+        return free_slots
+
+    def check_dependencies(self, dryrun_flag: bool = False):
+        # the predecessors (depends_on) are shared by the jobs.
+        # returns the job ids for afterany, or None if the jobs are not submitted now.
+        if len(getattr(self.template, "depends_on", None) or []) == 0 or dryrun_flag:
+            return []
+        state, after = self.template.dependency_state()
+        if state == "ready":
+            return after
+        for submission in self.submissions:
+            if state == "failed":
+                submission.job_status = "failed"
+                submission.add_event("dependency_failed")
+            else:
+                if not getattr(submission, "job_waiting", False):
+                    submission.add_event("waiting")
+                submission.job_waiting = True
+            submission.save()
+        if state == "failed":
+            logger.error("A predecessor has failed. The jobs are not submitted.")
+        else:
+            logger.info(
+                f"{len(self.submissions)} jobs are waiting for their predecessors."
+            )
+        return None
+
+    def submit(self, dryrun_flag: bool = False):
+        # returns the submitted Job_submission objects.
+        server_machine = self.template.server_machine
+        scheduler = get_scheduler(server_machine)
+        after = self.check_dependencies(dryrun_flag=dryrun_flag)
+        if after is None:
+            return []
+        free_slots = self.get_free_slots()
+        to_submit = self.submissions[:free_slots]
+        if len(to_submit) < len(self.submissions):
+            logger.info(
+                f"{len(self.submissions) - len(to_submit)} jobs exceed max_job_submit:{self.template.max_job_submit} or max_job_run:{self.template.max_job_run}."
+            )
+            if not dryrun_flag:
+                for submission in self.submissions[len(to_submit) :]:
+                    Pending_queue.add(submission)
+        if dryrun_flag or len(to_submit) == 0:
+            return []
+
+        if server_machine.queuing:
+            submit_command = scheduler.submit_command(
+                self.submission_script, after=after
+            )
+        else:
+            submit_command = (
+                f"{server_machine.jobsubmit} {self.submission_script}"
+            )
+        commands = []
+        for i, submission in enumerate(to_submit):
+            server_dir = self.get_server_dir(submission.local_dir)
+            commands.append(
+                f"echo {self.job_marker} {i}; "
+                + self.merge_stderr(f"cd {server_dir} && {submit_command}")
+            )
+        batches = [[]]
+        length = 0
+        for command in commands:
+            if length + len(command) > self.max_command_length:
+                batches.append([])
+                length = 0
+            batches[-1].append(command)
+            length += len(command) + 2
+        outputs = {}
+        for batch in batches:
+            stdout, stderr = server_machine.run_command("; ".join(batch))
+            index = None
+            for line in stdout.split("\n"):
+                if line.startswith(self.job_marker):
+                    index = int(line.split()[1])
+                    outputs[index] = ""
+                elif index is not None:
+                    outputs[index] += line + "\n"
+        if server_machine.queuing:
+            scheduler.invalidate()
+
+        submitted = []
+        for i, submission in enumerate(to_submit):
+            if i not in outputs:
+                logger.error(f"submission from {submission.local_dir} is not run.")
+                continue
+            stdout, stderr = self.split_stderr(outputs[i])
+            if server_machine.queuing:
+                try:
+                    submission.job_number = scheduler.submitted_job_id(stdout)
+                except ValueError:
+                    self.submit_failed(submission, stderr or stdout)
+                    continue
+                submission.job_running = True
+            else:
+                submission.job_number = None
+                submission.job_running = False
+            if stderr.strip():
+                logger.warning(
+                    f"stderr of the submission from {submission.local_dir}: {stderr.strip()}"
+                )
+            submission.job_dir = self.get_server_dir(submission.local_dir)
+            submission.job_submit_date = datetime.today()
+            submission.add_event(
+                "submitted", job_number=submission.job_number, queue=submission.queue
+            )
+            submission.job_start_date = None
+            submission.job_end_date = None
+            submission.save()
+            submitted.append(submission)
+        logger.info(f"{len(submitted)} jobs are submitted.")
+        return submitted
+
+    def toss(
+        self,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        dryrun_flag: bool = False,
+        delete_flag: bool = False,
+    ):
+        self.generate_scripts()
+        # the jobs submitted later (pending, waiting) stage their own dirs.
+        for submission in self.submissions:
+            submission.staging_options = {
+                "from_objects": [],
+                "include_list": list(include_list or []),
+                "exclude_list": list(exclude_list or []),
+                "delete_flag": delete_flag,
+            }
+        self.stage(
+            include_list=include_list,
+            exclude_list=exclude_list,
+            dryrun_flag=dryrun_flag,
+            delete_flag=delete_flag,
+        )
+        return self.submit(dryrun_flag=dryrun_flag)
+
+
+class Array_submission(Bulk_submission):
+    # one array job (PBS -J, Slurm --array) for all the job directories.
+    # each task runs the submission script of its directory, and the tasks
+    # are recorded as <array job id>_<task index> in the job index.
+    array_script = "submit_array.sh"
+    common_files = [array_script]
+
+    def get_scheduler(self):
+        server_machine = self.template.server_machine
+        if server_machine.queuing:
+            scheduler = get_scheduler(server_machine)
+            if scheduler.array_index_variable is not None:
+                return scheduler
+        logger.error(
+            f"array jobs are not supported on {server_machine.name} (pbs and slurm only)."
+        )
+        raise ValueError
+
+    def generate_scripts(self):
+        super().generate_scripts()
+        scheduler = self.get_scheduler()
+        # the scheduler directives of the rendered script are shared by the tasks.
+        with open(
+            os.path.join(self.submissions[0].local_dir, self.submission_script),
+            "r",
+        ) as f:
+            directives = [
+                line
+                for line in f.readlines()
+                if line.startswith(scheduler.directive_prefix)
+            ]
+        lines = ["#!/bin/bash\n"] + directives
+        lines.append(
+            scheduler.array_directive(
+                len(self.submissions), self.template.max_job_run
+            )
+            + "\n"
+        )
+        lines.append("\n")
+        lines.append("# job directories of the tasks\n")
+        lines.append("TASK_DIRS=(\n")
+        for submission in self.submissions:
+            lines.append(f'  "{self.get_server_dir(submission.local_dir)}"\n')
+        lines.append(")\n")
+        lines.append(
+            f'TASK_DIR="${{TASK_DIRS[${scheduler.array_index_variable}]}}"\n'
+        )
+        lines.append(f'export {scheduler.workdir_variable}="$TASK_DIR"\n')
+        lines.append('cd "$TASK_DIR"\n')
+        lines.append(f"bash {self.submission_script}\n")
+        with open(
+            os.path.join(os.path.commonpath(self.job_dirs), self.array_script),
+            "w",
+        ) as f:
+            f.writelines(lines)
+        logger.info(
+            f"{self.array_script} for {len(self.submissions)} tasks is generated."
+        )
+
+    def submit(self, dryrun_flag: bool = False):
+        # returns the submitted Job_submission objects.
+        server_machine = self.template.server_machine
+        scheduler = self.get_scheduler()
+        after = self.check_dependencies(dryrun_flag=dryrun_flag)
+        if after is None:
+            return []
+        # an array job takes one slot of MAX_JOB_SUBMIT.
+        if self.get_free_slots() == 0:
+            logger.info(
+                f"The queue is full (max_job_submit:{self.template.max_job_submit}, max_job_run:{self.template.max_job_run})."
+            )
+            if not dryrun_flag:
+                for submission in self.submissions:
+                    Pending_queue.add(submission)
+            return []
+        if dryrun_flag:
+            return []
+
+        server_dir = self.get_server_dir(os.path.commonpath(self.job_dirs))
+        output, stderr = server_machine.run_command(
+            self.merge_stderr(
+                f"cd {server_dir} && {scheduler.submit_command(self.array_script, after=after)}"
+            )
+        )
+        scheduler.invalidate()
+        stdout, stderr = self.split_stderr(output)
+        # a rejected array job must not become N running tasks.
+        try:
+            array_job_number = normalize_job_id(scheduler.submitted_job_id(stdout))
+        except ValueError:
+            for submission in self.submissions:
+                self.submit_failed(submission, stderr or stdout)
+            return []
+        if stderr.strip():
+            logger.warning(
+                f"stderr of the submission of {self.array_script}: {stderr.strip()}"
+            )
+        logger.info(f"array job {array_job_number} is submitted.")
+
+        job_submit_date = datetime.today()
+        for i, submission in enumerate(self.submissions):
+            submission.array_job_number = array_job_number
+            submission.job_number = f"{array_job_number}_{i}"
+            submission.job_running = True
+            submission.job_dir = self.get_server_dir(submission.local_dir)
+            submission.job_submit_date = job_submit_date
+            submission.add_event(
+                "submitted",
+                time=job_submit_date,
+                job_number=submission.job_number,
+                queue=submission.queue,
+            )
+            submission.job_start_date = None
+            submission.job_end_date = None
+            submission.save()
+        logger.info(f"{len(self.submissions)} tasks are submitted.")
+        return list(self.submissions)
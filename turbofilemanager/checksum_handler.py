@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import mmap
+import fcntl
+import pickle
+import tempfile
+import hashlib
+import threading
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+# hashlib name -> coreutils command available on the servers
+checksum_commands = {
+    "md5": "md5sum",
+    "sha1": "sha1sum",
+    "sha256": "sha256sum",
+    "blake2b": "b2sum",
+}
+
+
+class Checksum_cache:
+    # digests are keyed by (machine, path) and valid only for the same (size, mtime).
+    # only the sources of transfers are cached: a corrupted destination may
+    # keep its size and mtime, so its digest is always computed.
+    cache_file = os.path.join(file_manager_config_dir, "checksum_cache.pkl")
+
+    def __init__(self, cache_file: Optional[str] = None):
+        if cache_file is not None:
+            self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.changes = {}  # (machine, path) -> value, merged into the file by save
+        self.data = self.read()
+
+    def read(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    def get(
+        self,
+        machine_name: str,
+        path: str,
+        size: int,
+        mtime: float,
+        algorithm: str = "md5",
+    ):
+        with self.lock:
+            value = self.data.get((machine_name, path))
+        if value is None:
+            return None
+        c_size, c_mtime, c_algorithm, c_digest = value
+        if c_size == size and c_mtime == mtime and c_algorithm == algorithm:
+            return c_digest
+        return None
+
+    def set(
+        self,
+        machine_name: str,
+        path: str,
+        size: int,
+        mtime: float,
+        digest: str,
+        algorithm: str = "md5",
+    ):
+        with self.lock:
+            value = (size, mtime, algorithm, digest)
+            self.data[(machine_name, path)] = value
+            self.changes[(machine_name, path)] = value
+
+    def drop(self, machine_name: str, path: str):
+        # e.g., a re-sent file
+        with self.lock:
+            self.data.pop((machine_name, path), None)
+            self.changes[(machine_name, path)] = None
+
+    def save(self):
+        # only the changes are merged into the latest file, so concurrent
+        # transfers (threads or processes) do not lose each other's digests.
+        if len(self.changes) == 0:
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        with self.lock, open(f"{self.cache_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self.read()
+                for key, value in self.changes.items():
+                    if value is None:
+                        data.pop(key, None)
+                    else:
+                        data[key] = value
+                fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(data, f)
+                os.replace(tmp_file, self.cache_file)
+                self.data = data
+                self.changes = {}
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def local_file_checksum(
+    file_name: str, algorithm: str = "md5", block_size: int = 64 * 1024**2
+):
+    # memory-mapped reads; hashlib releases the GIL for large buffers.
+    hash_obj = hashlib.new(algorithm)
+    with open(file_name, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hash_obj.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), block_size):
+                    hash_obj.update(view[offset : offset + block_size])
+            finally:
+                view.release()
+    return hash_obj.hexdigest()
+
+
+def get_checksums(
+    machine,
+    root_dir: str,
+    file_stats: dict,
+    cache: Optional[Checksum_cache] = None,
+    algorithm: str = "md5",
+    num_threads: Optional[int] = None,
+    whole_tree: bool = False,
+):
+    # file_stats = {relative path: (size, mtime)} -> {relative path: digest}
+    # whole_tree means that file_stats lists all the files in root_dir.
+    checksums = {}
+    uncached = []
+    for rel_path, (size, mtime) in file_stats.items():
+        digest = None
+        if cache is not None:
+            digest = cache.get(
+                machine.name,
+                os.path.join(root_dir, rel_path),
+                size,
+                mtime,
+                algorithm,
+            )
+        if digest is None:
+            uncached.append(rel_path)
+        else:
+            checksums[rel_path] = digest
+    logger.debug(
+        f"{len(checksums)} cached and {len(uncached)} uncached checksums on {machine.name}."
+    )
+    if len(uncached) == 0:
+        return checksums
+
+    if machine.machine_type == "local":
+        if num_threads is None:
+            num_threads = min(32, (os.cpu_count() or 1) * 2)
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            digests = executor.map(
+                lambda rel_path: local_file_checksum(
+                    os.path.join(root_dir, rel_path), algorithm=algorithm
+                ),
+                uncached,
+            )
+            new_checksums = dict(zip(uncached, digests))
+    else:
+        new_checksums = machine.get_checksums(
+            dir_name=root_dir,
+            rel_paths=uncached,
+            checksum_command=checksum_commands[algorithm],
+            whole_tree=whole_tree and len(uncached) == len(file_stats),
+        )
+
+    for rel_path, digest in new_checksums.items():
+        checksums[rel_path] = digest
+        if cache is not None and rel_path in file_stats:
+            size, mtime = file_stats[rel_path]
+            cache.set(
+                machine.name,
+                os.path.join(root_dir, rel_path),
+                size,
+                mtime,
+                digest,
+                algorithm,
+            )
+    return checksums
@@ -7,6 +7,7 @@ from logging import getLogger, StreamHandler, Formatter
 # file-manager modules
 from turbofilemanager.machine_handler import Machine, Machines_handler
 from turbofilemanager.file_manager_env import file_manager_test_dir
+from turbofilemanager.transfer_journal import Transfer_journal
 
 logger = getLogger("file-manager").getChild(__name__)
 
@@ -35,6 +36,31 @@ class Data_transfer:
         # logger.warning(f"bwlimit in the rsync is set {self.bwlimit} KBytes = {int(self.bwlimit*8/10**3)} Mbps")
         # logger.warning(f"You should use a smaller value if rsync fails frequently.")
 
+    def get_journal(
+        self,
+        operation: str,
+        local_dir: str,
+        from_objects=[],
+        include_list=[],
+        exclude_list=[],
+        delete_flag=False,
+        strategy="auto",
+    ):
+        return Transfer_journal(
+            operation=operation,
+            parameters={
+                "local_machine_name": self.local_machine.name,
+                "client_machine_name": self.client_machine.name,
+                "server_machine_name": self.server_machine.name,
+                "local_dir": local_dir,
+                "from_objects": list(from_objects),
+                "include_list": list(include_list),
+                "exclude_list": list(exclude_list),
+                "delete_flag": delete_flag,
+                "strategy": strategy,
+            },
+        )
+
     def put_objects(
         self,
         from_objects=[],
@@ -42,6 +68,10 @@ class Data_transfer:
         exclude_list=[],
         dryrun_flag=False,
         delete_flag=False,
+        verify_flag=False,
+        resend_flag=False,
+        strategy="auto",
+        local_dir=None,
     ):
 
         local_home = self.local_machine.file_manager_root
@@ -59,12 +89,28 @@ class Data_transfer:
                 logger.error(f"{server_home} is not found.")
                 raise FileNotFoundError
 
+        if local_dir is None:
+            local_dir = os.getcwd()
+        local_current_dir = os.path.abspath(local_dir)
+
+        # completed objects and shards are skipped when the operation is rerun.
+        journal = None
+        if not dryrun_flag:
+            journal = self.get_journal(
+                operation="put",
+                local_dir=local_current_dir,
+                from_objects=from_objects,
+                include_list=include_list,
+                exclude_list=exclude_list,
+                delete_flag=delete_flag,
+                strategy=strategy,
+            )
+
         if len(from_objects) == 0:
             logger.debug("from_objects is not specified")
             logger.info(
                 "All the files and dirs in the current directory will be rsynced."
             )
-            local_current_dir = os.path.abspath(os.getcwd())
 
             if not (
                 self.client_machine.machine_type == "local"
@@ -87,6 +133,10 @@ class Data_transfer:
                 dryrun_flag=dryrun_flag,
                 delete_flag=delete_flag,
                 bwlimit=bwlimit_default,
+                verify_flag=verify_flag,
+                resend_flag=resend_flag,
+                strategy=strategy,
+                journal=journal,
             )
 
         else:
@@ -96,12 +146,17 @@ class Data_transfer:
             )
 
             for object in from_objects:
-                object_abs = os.path.abspath(object)
+                object_abs = os.path.abspath(
+                    os.path.join(local_current_dir, object)
+                )
                 if local_home not in object_abs:
                     logger.error(
                         "server-client_manager.py works only in the local_home dir."
                     )
                     raise ValueError
+                if journal is not None and journal.is_done(object_abs):
+                    logger.info(f"{object_abs} has already been transferred.")
+                    continue
                 from_object = object_abs.replace(local_home, client_home)
                 to_object = object_abs.replace(local_home, server_home)
                 if self.client_machine.is_file(file_name=from_object):
@@ -113,6 +168,9 @@ class Data_transfer:
                         dryrun_flag=dryrun_flag,
                         delete_flag=delete_flag,
                         bwlimit=bwlimit_default,
+                        verify_flag=verify_flag,
+                        resend_flag=resend_flag,
+                        strategy=strategy,
                     )
                 else:  # isdir(from_object)
                     self.machine_handler.put_dir(
@@ -123,7 +181,16 @@ class Data_transfer:
                         dryrun_flag=dryrun_flag,
                         delete_flag=delete_flag,
                         bwlimit=bwlimit_default,
+                        verify_flag=verify_flag,
+                        resend_flag=resend_flag,
+                        strategy=strategy,
+                        journal=journal,
                     )
+                if journal is not None:
+                    journal.mark_done(object_abs)
+
+        if journal is not None:
+            journal.close()
 
     def get_objects(
         self,
@@ -132,6 +199,10 @@ class Data_transfer:
         exclude_list=[],
         dryrun_flag=False,
         delete_flag=False,
+        verify_flag=False,
+        resend_flag=False,
+        strategy="auto",
+        local_dir=None,
     ):
 
         local_home = self.local_machine.file_manager_root
@@ -152,7 +223,9 @@ class Data_transfer:
         logger.info(f"client_dir_root={client_home}")
         logger.info(f"server_dir_root={server_home}")
 
-        local_current_dir = os.path.abspath(os.getcwd())
+        if local_dir is None:
+            local_dir = os.getcwd()
+        local_current_dir = os.path.abspath(local_dir)
         if not (
             self.client_machine.machine_type == "local"
             and self.server_machine.machine_type == "local"
@@ -166,6 +239,19 @@ class Data_transfer:
                 client_dir = local_current_dir.replace(local_home, client_home)
                 server_dir = local_current_dir.replace(local_home, server_home)
 
+                # completed objects and shards are skipped when the operation is rerun.
+                journal = None
+                if not dryrun_flag:
+                    journal = self.get_journal(
+                        operation="get",
+                        local_dir=local_current_dir,
+                        from_objects=from_objects,
+                        include_list=include_list,
+                        exclude_list=exclude_list,
+                        delete_flag=delete_flag,
+                        strategy=strategy,
+                    )
+
                 if len(from_objects) == 0:
                     logger.info("from objects is not specified")
                     logger.info(
@@ -179,6 +265,10 @@ class Data_transfer:
                         dryrun_flag=dryrun_flag,
                         delete_flag=delete_flag,
                         bwlimit=bwlimit_default,
+                        verify_flag=verify_flag,
+                        resend_flag=resend_flag,
+                        strategy=strategy,
+                        journal=journal,
                     )
 
                 else:
@@ -189,6 +279,13 @@ class Data_transfer:
 
                     for object in from_objects:
                         from_object = os.path.join(server_dir, object)
+                        if journal is not None and journal.is_done(
+                            from_object
+                        ):
+                            logger.info(
+                                f"{from_object} has already been transferred."
+                            )
+                            continue
                         if not self.server_machine.exist(
                             object_name=from_object
                         ):
@@ -208,6 +305,9 @@ class Data_transfer:
                                 dryrun_flag=dryrun_flag,
                                 delete_flag=delete_flag,
                                 bwlimit=bwlimit_default,
+                                verify_flag=verify_flag,
+                                resend_flag=resend_flag,
+                                strategy=strategy,
                             )
                         else:  # mysftp.is_dir(remote_dir=from_object):
                             self.machine_handler.get_dir(
@@ -218,7 +318,16 @@ class Data_transfer:
                                 dryrun_flag=dryrun_flag,
                                 delete_flag=delete_flag,
                                 bwlimit=bwlimit_default,
+                                verify_flag=verify_flag,
+                                resend_flag=resend_flag,
+                                strategy=strategy,
+                                journal=journal,
                             )
+                        if journal is not None:
+                            journal.mark_done(from_object)
+
+                if journal is not None:
+                    journal.close()
 
 
 if __name__ == "__main__":
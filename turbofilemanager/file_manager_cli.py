@@ -18,6 +18,7 @@ from turbofilemanager.file_manager_env import (
     machine_handler_env_template_dir,
 )
 from turbofilemanager.data_transfer_manager import Data_transfer
+from turbofilemanager.transfer_journal import Transfer_journal
 
 try:
     from turbofilemanager._version import (
@@ -53,7 +54,7 @@ def file_manager_cli():
         else:
             raise FileNotFoundError
 
-    job_list = ["put", "get", "medit"]
+    job_list = ["put", "get", "medit", "resume"]
 
     # define the parser
     parser = argparse.ArgumentParser(
@@ -101,14 +102,14 @@ def file_manager_cli():
     parser.add_argument(
         "-inc",
         "--include",
-        help="specify an rsync include list",
+        help="specify an rsync include list (rsync-like patterns)",
         default=[],
         nargs="*",
     )
     parser.add_argument(
         "-exc",
         "--exclude",
-        help="specify an rsync exclude list",
+        help="specify an rsync exclude list (default is read from exclude_list.txt in the current dir.). .turboignore files are also read.",
         default=[],
         nargs="*",
     )
@@ -126,6 +127,27 @@ def file_manager_cli():
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "-verify",
+        "--verify",
+        help="verify the transferred files with checksums",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-resend",
+        "--resend",
+        help="re-send the files whose checksums do not match (with -verify)",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-strategy",
+        "--strategy",
+        help="transfer strategy of a directory (auto chooses one from the tree shape)",
+        choices=["auto", "rsync", "tar", "sharded", "pack"],
+        default="auto",
+    )
     parser.add_argument(
         "-safe",
         "--safe_mode",
@@ -181,6 +203,9 @@ def file_manager_cli():
     logger.debug(f"rysnc exclude_list = {args.exclude}")
     logger.debug(f"dryrun flag = {args.dryrun}")
     logger.debug(f"delele flag = {args.delete}")
+    logger.debug(f"verify flag = {args.verify}")
+    logger.debug(f"resend flag = {args.resend}")
+    logger.debug(f"strategy = {args.strategy}")
     logger.debug(f"safe_mode flag = {args.safe_mode}")
     logger.info("")
 
@@ -216,6 +241,9 @@ def file_manager_cli():
             exclude_list=args.exclude,
             dryrun_flag=args.dryrun,
             delete_flag=args.delete,
+            verify_flag=args.verify,
+            resend_flag=args.resend,
+            strategy=args.strategy,
         )
 
     elif args.job == "get":
@@ -230,8 +258,44 @@ def file_manager_cli():
             exclude_list=args.exclude,
             dryrun_flag=args.dryrun,
             delete_flag=args.delete,
+            verify_flag=args.verify,
+            resend_flag=args.resend,
+            strategy=args.strategy,
         )
 
+    elif args.job == "resume":
+        journals = Transfer_journal.get_pending_journals()
+        if len(journals) == 0:
+            logger.info("No interrupted operation is found.")
+        for journal in journals:
+            logger.info(journal)
+            parameters = journal.parameters
+            if journal.operation not in {"put", "get"}:
+                logger.info(
+                    f"Rerun {journal.operation} in {parameters['local_dir']} to resume it."
+                )
+                continue
+            transfer = Data_transfer(
+                local_machine_name=parameters["local_machine_name"],
+                client_machine_name=parameters["client_machine_name"],
+                server_machine_name=parameters["server_machine_name"],
+            )
+            if journal.operation == "put":
+                transfer_objects = transfer.put_objects
+            else:
+                transfer_objects = transfer.get_objects
+            transfer_objects(
+                from_objects=parameters["from_objects"],
+                include_list=parameters["include_list"],
+                exclude_list=parameters["exclude_list"],
+                dryrun_flag=False,
+                delete_flag=parameters["delete_flag"],
+                verify_flag=args.verify,
+                resend_flag=args.resend,
+                strategy=parameters["strategy"],
+                local_dir=parameters["local_dir"],
+            )
+
     else:
         logger.error(f"job = {args.job} is not implemented.")
 
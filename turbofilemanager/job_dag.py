@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import pickle
+from typing import Optional
+
+import yaml
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_manager import Job_submission
+from turbofilemanager.job_index import Job_index
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def sort_nodes(nodes: dict):
+    # {name: [names of the predecessors]} -> names in a topological order
+    order = []
+    state = {}  # name -> "visiting" or "done"
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            logger.error(f"the pipeline has a cycle: {' -> '.join(path + [name])}")
+            raise ValueError
+        if name not in nodes:
+            logger.error(f"{name} in after of {path[-1]} is not a job of the pipeline.")
+            raise KeyError
+        state[name] = "visiting"
+        for after in nodes[name]:
+            visit(after, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in nodes:
+        visit(name, [])
+    return order
+
+
+class Job_dag:
+    # pipelines of jobs (e.g., prep -> main -> post). a job waits (state =
+    # waiting) until the jobs of its depends_on are done; a running predecessor
+    # on the same pbs/slurm server is left to the scheduler (afterany).
+    # the waiting jobs are advanced by "check --all" and "watch".
+    def __init__(
+        self,
+        root_dir: Optional[str] = None,
+        server_machine_name: Optional[str] = None,
+    ):
+        self.root_dir = root_dir
+        self.server_machine_name = server_machine_name
+
+    @staticmethod
+    def read_yaml(yaml_file: str):
+        # name: {dir: ..., after: [names], other toss arguments}
+        # -> {name: {"dir", "after", "kwargs"}}; dirs are relative to the yaml file.
+        with open(yaml_file, "r") as f:
+            data = yaml.safe_load(f)
+        if not isinstance(data, dict) or len(data) == 0:
+            logger.error(f"{yaml_file} has no jobs.")
+            raise ValueError
+        base_dir = os.path.dirname(os.path.abspath(yaml_file))
+        nodes = {}
+        for name, value in data.items():
+            value = dict(value or {})
+            after = value.pop("after", [])
+            if isinstance(after, str):
+                after = [after]
+            nodes[str(name)] = {
+                "dir": os.path.join(base_dir, str(value.pop("dir", name))),
+                "after": [str(a) for a in after],
+                "kwargs": value,
+            }
+        return nodes
+
+    @staticmethod
+    def toss(
+        nodes: dict,
+        submission_kwargs: dict,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        dryrun_flag: bool = False,
+        delete_flag: bool = False,
+    ):
+        # the whole pipeline in one call, the predecessors first.
+        # returns {name: Job_submission}
+        order = sort_nodes({name: node["after"] for name, node in nodes.items()})
+        submissions = {}
+        current_dir = os.getcwd()
+        for name in order:
+            node = nodes[name]
+            kwargs = dict(submission_kwargs)
+            for key, value in node["kwargs"].items():
+                if key not in kwargs:
+                    logger.error(f"{key} of {name} is not an argument of toss.")
+                    raise KeyError
+                kwargs[key] = value
+            if not os.path.isdir(node["dir"]):
+                logger.error(f"{node['dir']} of {name} is not found.")
+                raise FileNotFoundError
+            # Job_submission reads the input file in the current dir.
+            os.chdir(node["dir"])
+            try:
+                submission = Job_submission(**kwargs)
+                submission.depends_on = [
+                    nodes[after]["dir"] for after in node["after"]
+                ]
+                submission.generate_script()
+                flag, job_number = submission.job_submit(
+                    include_list=include_list,
+                    exclude_list=exclude_list,
+                    dryrun_flag=dryrun_flag,
+                    delete_flag=delete_flag,
+                )
+            finally:
+                os.chdir(current_dir)
+            if flag:
+                logger.info(f"{name}: job {job_number} is submitted.")
+            elif getattr(submission, "job_waiting", False):
+                logger.info(f"{name}: waiting for {', '.join(node['after'])}.")
+            submissions[name] = submission
+        return submissions
+
+    def get_rows(self):
+        job_index = Job_index()
+        rows = job_index.query(
+            server_machine=self.server_machine_name,
+            state="waiting",
+            root_dir=self.root_dir,
+        )
+        job_index.close()
+        return rows
+
+    def advance(self):
+        # submits the waiting jobs whose predecessors are done (or running on
+        # the same scheduler). a job of a failed predecessor fails, and so do
+        # its successors in the next cycles. returns the submitted jobs.
+        submitted = []
+        for row in self.get_rows():
+            try:
+                submission = Job_submission.load(row["pkl_path"])
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"{row['pkl_path']} is not readable: {e}")
+                continue
+            flag, job_number = submission.job_submit()
+            if flag:
+                logger.info(
+                    f"job {job_number} is submitted from {submission.local_dir}."
+                )
+                submitted.append(submission)
+        if len(submitted) > 0:
+            logger.info(f"{len(submitted)} waiting jobs are submitted.")
+        return submitted
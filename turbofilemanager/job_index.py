@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def job_state(submission):
+    # a coarse state derived from the fields of Job_submission
+    if submission.job_status == "failed":
+        return "failed"
+    if submission.job_submit_date is None:
+        if getattr(submission, "job_waiting", False):
+            return "waiting"
+        if getattr(submission, "job_pending", False):
+            return "pending"
+        return "generated"
+    if submission.job_running:
+        return "running"
+    if submission.job_fetch_date is not None:
+        return "fetched"
+    return "done"
+
+
+def pending_since(submission):
+    # the time of the latest pending event of a pending job
+    if not getattr(submission, "job_pending", False):
+        return None
+    for event in reversed(getattr(submission, "events", None) or []):
+        if event.get("event") == "pending":
+            return event.get("time")
+    return None
+
+
+class Job_index:
+    # central job store. job_manager.json in each directory remains the full record.
+    index_file = os.path.join(file_manager_config_dir, "job_index.sqlite3")
+
+    columns = OrderedDict(
+        [
+            ("local_dir", "TEXT PRIMARY KEY"),
+            ("pkl_path", "TEXT"),
+            ("server_machine", "TEXT"),
+            ("job_number", "TEXT"),
+            ("state", "TEXT"),
+            ("job_running", "INTEGER"),
+            ("job_status", "TEXT"),
+            ("job_dir", "TEXT"),
+            ("package", "TEXT"),
+            ("binary", "TEXT"),
+            ("cores", "INTEGER"),
+            ("openmp", "INTEGER"),
+            ("queue", "TEXT"),
+            ("jobname", "TEXT"),
+            ("input_file", "TEXT"),
+            ("output_file", "TEXT"),
+            ("job_submit_date", "TEXT"),
+            ("job_check_last_time", "TEXT"),
+            ("job_fetch_date", "TEXT"),
+            ("priority", "INTEGER"),
+            ("array_job_number", "TEXT"),
+            ("pending_since", "TEXT"),  # the order of the pending queue
+            ("updated", "TEXT"),
+        ]
+    )
+    # finished jobs for the walltime prediction
+    runtime_columns = OrderedDict(
+        [
+            ("local_dir", "TEXT"),
+            ("job_number", "TEXT"),
+            ("server_machine", "TEXT"),
+            ("package", "TEXT"),
+            ("binary", "TEXT"),
+            ("cores", "INTEGER"),
+            ("openmp", "INTEGER"),
+            ("input_key", "TEXT"),
+            ("queue", "TEXT"),
+            ("runtime", "REAL"),
+            ("finished", "TEXT"),
+        ]
+    )
+    indexes = {
+        "idx_jobs_server": "server_machine",
+        "idx_jobs_state": "state",
+        "idx_jobs_job_number": "job_number",
+        "idx_jobs_server_state": "server_machine, state",
+    }
+
+    # the schema is created (or upgraded) once per process and index file.
+    schema_ready = set()
+    schema_lock = threading.Lock()
+
+    def __init__(self, index_file: Optional[str] = None):
+        if index_file is not None:
+            self.index_file = index_file
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        self.connection = sqlite3.connect(self.index_file, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        with self.schema_lock:
+            if self.index_file not in self.schema_ready:
+                self.create_schema()
+                self.schema_ready.add(self.index_file)
+
+    def create_schema(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ({})".format(
+                    ", ".join(
+                        f"{name} {sql_type}"
+                        for name, sql_type in self.columns.items()
+                    )
+                )
+            )
+            # columns added by newer versions
+            existing = {
+                row["name"]
+                for row in self.connection.execute("PRAGMA table_info(jobs)")
+            }
+            for name, sql_type in self.columns.items():
+                if name not in existing:
+                    self.connection.execute(
+                        f"ALTER TABLE jobs ADD COLUMN {name} {sql_type}"
+                    )
+            for index_name, index_columns in self.indexes.items():
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON jobs ({index_columns})"
+                )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runtimes ({}, PRIMARY KEY (local_dir, job_number))".format(
+                    ", ".join(
+                        f"{name} {sql_type}"
+                        for name, sql_type in self.runtime_columns.items()
+                    )
+                )
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_runtimes_job ON runtimes (server_machine, package, binary, cores, openmp)"
+            )
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def to_text(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def upsert(self, record: dict):
+        record = {
+            key: self.to_text(value)
+            for key, value in record.items()
+            if key in self.columns
+        }
+        record["updated"] = datetime.today().isoformat()
+        names = list(record.keys())
+        # UPDATE, then INSERT: ON CONFLICT needs SQLite >= 3.24 (e.g., not on CentOS 7).
+        update_names = [name for name in names if name != "local_dir"]
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET {} WHERE local_dir = ?".format(
+                    ", ".join(f"{name} = ?" for name in update_names)
+                ),
+                [record[name] for name in update_names] + [record["local_dir"]],
+            )
+            if cursor.rowcount == 0:
+                self.connection.execute(
+                    "INSERT INTO jobs ({}) VALUES ({})".format(
+                        ", ".join(names), ", ".join("?" for _ in names)
+                    ),
+                    [record[name] for name in names],
+                )
+
+    def update_submission(self, submission):
+        self.upsert(
+            {
+                "local_dir": submission.local_dir,
+                "pkl_path": submission.pkl_path,
+                "server_machine": submission.server_machine.name,
+                "job_number": submission.job_number,
+                "state": job_state(submission),
+                "job_running": int(bool(submission.job_running)),
+                "job_status": submission.job_status,
+                "job_dir": submission.job_dir,
+                "package": submission.package,
+                "binary": submission.binary,
+                "cores": submission.cores,
+                "openmp": submission.openmp,
+                "queue": submission.queue,
+                "jobname": submission.jobname,
+                "input_file": submission.input_file,
+                "output_file": submission.output_file,
+                "job_submit_date": submission.job_submit_date,
+                "job_check_last_time": submission.job_check_last_time,
+                "job_fetch_date": submission.job_fetch_date,
+                "priority": getattr(submission, "priority", 0),
+                "array_job_number": getattr(submission, "array_job_number", None),
+                "pending_since": pending_since(submission),
+            }
+        )
+
+    def delete(self, local_dir: str):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM jobs WHERE local_dir = ?", [local_dir]
+            )
+
+    def get(self, local_dir: str):
+        row = self.connection.execute(
+            "SELECT * FROM jobs WHERE local_dir = ?", [local_dir]
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+    def query(
+        self,
+        server_machine: Optional[str] = None,
+        state: Optional[str] = None,
+        job_number: Optional[str] = None,
+        root_dir: Optional[str] = None,
+    ):
+        conditions = []
+        values = []
+        if server_machine is not None:
+            conditions.append("server_machine = ?")
+            values.append(server_machine)
+        if state is not None:
+            conditions.append("state = ?")
+            values.append(state)
+        if job_number is not None:
+            conditions.append("job_number = ?")
+            values.append(str(job_number))
+        if root_dir is not None:
+            # the primary key index serves the range scan.
+            root_dir = os.path.abspath(root_dir)
+            conditions.append(
+                "(local_dir = ? OR (local_dir >= ? AND local_dir < ?))"
+            )
+            values += [root_dir, root_dir + "/", root_dir + "0"]
+        sql = "SELECT * FROM jobs"
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY local_dir"
+        return [dict(row) for row in self.connection.execute(sql, values)]
+
+    def add_runtime(self, record: dict):
+        record = {
+            key: self.to_text(record.get(key))
+            for key in self.runtime_columns.keys()
+        }
+        names = list(record.keys())
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runtimes ({}) VALUES ({})".format(
+                    ", ".join(names), ", ".join("?" for _ in names)
+                ),
+                [record[name] for name in names],
+            )
+
+    def get_runtimes(
+        self,
+        server_machine: str,
+        package: str,
+        binary: str,
+        cores: int,
+        openmp: int,
+        input_key: Optional[str] = None,
+    ):
+        sql = "SELECT runtime FROM runtimes WHERE server_machine = ? AND package = ? AND binary = ? AND cores = ? AND openmp = ?"
+        values = [server_machine, package, binary, cores, openmp]
+        if input_key is not None:
+            sql += " AND input_key = ?"
+            values.append(input_key)
+        return [row["runtime"] for row in self.connection.execute(sql, values)]
@@ -4,11 +4,8 @@ import os
 import pickle
 import shutil
 import yaml
-import pandas as pd
-import re
-import time
 from datetime import datetime
-from collections import OrderedDict
+from collections import OrderedDict, Counter
 from logging import getLogger, StreamHandler, Formatter
 from typing import Optional
 
@@ -19,6 +16,18 @@ from turbofilemanager.file_manager_env import (
     job_manager_env_template_dir,
 )
 from turbofilemanager.data_transfer_manager import Machine, Data_transfer
+from turbofilemanager.transfer_journal import Transfer_journal
+from turbofilemanager.job_record import Job_record, find_record
+from turbofilemanager.scheduler_adapter import get_scheduler
+from turbofilemanager.script_template import get_script_template
+from turbofilemanager.queue_table import Queue_table, max_time_seconds
+from turbofilemanager.walltime_predictor import (
+    Walltime_predictor,
+    get_input_key,
+    record_runtime,
+    format_walltime,
+)
+from turbofilemanager.queue_selector import select_queue
 
 yaml.add_constructor(
     yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
@@ -27,6 +36,14 @@ yaml.add_constructor(
 
 logger = getLogger("file-manager").getChild(__name__)
 
+machines = {}  # machine name -> Machine shared by the jobs of this process
+
+
+def get_machine(machine_name: str):
+    if machine_name not in machines:
+        machines[machine_name] = Machine(machine_name)
+    return machines[machine_name]
+
 
 class Job_submission:
     stat_time_sleep = 60  # sec.
@@ -53,14 +70,19 @@ class Job_submission:
         nompi: bool = False,
         # job information related
         jobname: str = "file-manager",
-        pkl_name: str = "job_manager.pkl",
+        pkl_name: str = Job_record.record_name,
         safe_mode: bool = False,
+        # walltime from the runtime history instead of MAX_TIME
+        predict_walltime: bool = False,
         # bwlimit=1000
     ):
 
-        self.local_machine = Machine(local_machine_name)
-        self.client_machine = Machine(client_machine_name)
-        self.server_machine = Machine(server_machine_name)
+        self.local_machine_name = local_machine_name
+        self.client_machine_name = client_machine_name
+        self.server_machine_name = server_machine_name
+        self.local_machine = get_machine(local_machine_name)
+        self.client_machine = get_machine(client_machine_name)
+        self.server_machine = get_machine(server_machine_name)
         # self.bwlimit = bwlimit
 
         self.data_transfer = Data_transfer(
@@ -156,50 +178,61 @@ class Job_submission:
                 )
                 raise FileNotFoundError
 
-            pd_info = pd.read_csv(queue_data_txt, delim_whitespace=True)
-            pd_core_omp = pd_info[
-                (pd_info["CORES"] == self.cores)
-                & (pd_info["OMP"] == self.openmp)
-            ]
-            pd_core_omp = pd_core_omp.reset_index(drop=True)
-            if len(pd_core_omp) == 0:
+            queue_table = Queue_table.load(queue_data_txt)
+            rows = queue_table.find(self.cores, self.openmp)
+            if len(rows) == 0:
                 logger.error(
                     "No corresponding line exists Plz. check queue_data.txt"
                 )
                 raise KeyError
 
+            walltime = None
+            self.walltime_prediction = None
+            if predict_walltime:
+                walltime, self.walltime_prediction = Walltime_predictor().predict(
+                    server_machine_name=self.server_machine.name,
+                    package=self.package,
+                    binary=self.binary,
+                    cores=self.cores,
+                    openmp=self.openmp,
+                    input_key=get_input_key(input_file, os.getcwd()),
+                )
+
             if queue is None:
-                self.queue = pd_core_omp["QUEUE"][0]
-                self.nodes = pd_core_omp["NODES"][0]
-                self.cpns = pd_core_omp["CPNS"][0]
-                self.mpi_per_node = pd_core_omp["MPI_PER_NODE"][0]
-                self.max_job_run = pd_core_omp["MAX_JOB_RUN"][0]
-                self.max_job_submit = pd_core_omp["MAX_JOB_SUBMIT"][0]
-                self.max_time = pd_core_omp["MAX_TIME"][0]
+                # the matching queue with the shortest expected wait
+                # (among the queues long enough for the predicted walltime)
+                row, self.queue_selection = select_queue(
+                    self.server_machine, rows, walltime=walltime
+                )
             else:
-                pd_core_omp_queue = pd_core_omp[
-                    (pd_core_omp["QUEUE"] == queue)
-                ]
-                pd_core_omp_queue = pd_core_omp_queue.reset_index(drop=True)
-                if len(pd_core_omp_queue) == 0:
+                self.queue_selection = None
+                rows = queue_table.find(self.cores, self.openmp, queue=queue)
+                if len(rows) == 0:
                     logger.error(
                         "No corresponding line exists Plz. check queue_data.txt"
                     )
                     raise KeyError
-                if len(pd_core_omp_queue) > 1:
+                if len(rows) > 1:
                     logger.error(
                         "There are more than two corresponding lines existing. Plz. check queue_data.txt"
                     )
                     raise KeyError
-                self.queue = queue
-                self.cpns = pd_core_omp_queue["CPNS"][0]
-                self.nodes = pd_core_omp_queue["NODES"][0]
-                self.mpi_per_node = pd_core_omp_queue["MPI_PER_NODE"][0]
-                self.max_job_run = pd_core_omp_queue["MAX_JOB_RUN"][0]
-                self.max_job_submit = pd_core_omp_queue["MAX_JOB_SUBMIT"][0]
-                self.max_time = pd_core_omp_queue["MAX_TIME"][0]
+                row = rows[0]
+            self.queue = row["QUEUE"]
+            self.nodes = row["NODES"]
+            self.cpns = row["CPNS"]
+            self.mpi_per_node = row["MPI_PER_NODE"]
+            self.max_job_run = row["MAX_JOB_RUN"]
+            self.max_job_submit = row["MAX_JOB_SUBMIT"]
+            self.max_time = row["MAX_TIME"]
+            if walltime is not None:
+                max_time = max_time_seconds(row["MAX_TIME"])
+                if max_time is None or walltime < max_time - 60:
+                    self.max_time = format_walltime(walltime)
 
         else:  # server_machine.queuing == False
+            self.walltime_prediction = None
+            self.queue_selection = None
             self.queue = None
             self.nodes = None
             self.cpns = None
@@ -218,6 +251,8 @@ class Job_submission:
         self.output_file = output_file
         self.nompi = nompi
         self.pkl_name = pkl_name
+        self.local_dir = os.path.abspath(os.getcwd())
+        self.input_key = get_input_key(input_file, self.local_dir)
         self.safe_mode = safe_mode
         self.input_redirect = input_redirect
 
@@ -231,92 +266,193 @@ class Job_submission:
         self.job_status = (
             "unknown"  # one can put any comment. e.g. success or failure
         )
-
-    def generate_script(self, submission_script: str = "submit.sh"):
-        def replaced_lines(lines, keyword, value):
-            buffer = [
-                line for line in lines if re.match(f".*{keyword}.*", line)
-            ]
-            if len(buffer) == 0:
-                return lines
-            else:
-                # assert len(buffer) == 1 # to be refactored.
-                # buffer = buffer[0]
-                for buf in buffer:
-                    buffer_index = lines.index(buf)
-                    lines[buffer_index] = lines[buffer_index].replace(
-                        keyword.replace("\\", ""), str(value)
-                    )
-                return lines
-
-        # mpi script or nompi script
-        if self.nompi:
-            submit_script = os.path.join(
-                job_manager_env_dir,
-                self.server_machine.name,
-                "submit_nompi.sh",
+        self.job_pending = False  # waiting for a free slot of the queue
+        self.priority = 0  # higher priority pending jobs are submitted first
+        self.array_job_number = None  # the array job of this task, if any
+        # seen running / finished by the polls (for the runtime history)
+        self.job_start_date = None
+        self.job_end_date = None
+        self.job_queued_date = None  # the last poll before seeing it running
+        # the lifecycle timeline, [{"event": ..., "time": ..., ...}]
+        self.events = []
+        # a job of a pipeline is submitted after the jobs in these local dirs.
+        self.depends_on = []
+        self.job_waiting = False  # waiting for the jobs of depends_on
+        # from_objects, include/exclude lists and delete_flag of the toss,
+        # reused by a deferred submission (pending queue, watch, pipelines).
+        self.staging_options = {}
+
+    @property
+    def pkl_path(self):
+        # the job record (job_manager.json)
+        pkl_name = self.pkl_name
+        if os.path.basename(pkl_name) == Job_record.legacy_name:
+            pkl_name = os.path.join(
+                os.path.dirname(pkl_name), Job_record.record_name
             )
-        else:
-            submit_script = os.path.join(
-                job_manager_env_dir, self.server_machine.name, "submit_mpi.sh"
+        if os.path.isabs(pkl_name):
+            return pkl_name
+        return os.path.join(self.local_dir, pkl_name)
+
+    def __getattr__(self, name):
+        # the machines and data_transfer of a loaded record are built on first use.
+        if name in {"local_machine", "client_machine", "server_machine"}:
+            machine_name = self.__dict__.get(f"{name}_name")
+            if machine_name is None:
+                raise AttributeError(name)
+            machine = get_machine(machine_name)
+            self.__dict__[name] = machine
+            return machine
+        if name == "data_transfer" and "server_machine_name" in self.__dict__:
+            data_transfer = Data_transfer(
+                local_machine_name=self.local_machine_name,
+                client_machine_name=self.client_machine_name,
+                server_machine_name=self.server_machine_name,
             )
+            self.__dict__[name] = data_transfer
+            return data_transfer
+        raise AttributeError(name)
+
+    @classmethod
+    def load(cls, pkl_path: str = Job_record.record_name):
+        # job_manager.json, or job_manager.pkl written by older versions
+        record_path = find_record(os.path.abspath(pkl_path))
+        record, text = Job_record.load(record_path)
+        submission = cls.__new__(cls)
+        submission.__dict__.update(record.to_dict())
+        # the job dir may have been moved.
+        submission.local_dir = os.path.dirname(record_path)
+        submission.pkl_name = os.path.join(
+            submission.local_dir, Job_record.record_name
+        )
+        submission.saved_record = (submission.pkl_path, text)
+        return submission
 
-        with open(submit_script, "r") as f:
-            lines = f.readlines()
-
-        # Replacing keywords in submit_script
-        # [NODES]
-        lines = replaced_lines(lines, "_NODES_", self.nodes)
-        # [CORE_PER_NODE]
-        lines = replaced_lines(lines, "_CORES_PER_NODE_", self.cpns)
-        # [MPI_PER_NODE]
-        lines = replaced_lines(lines, "_MPI_PER_NODE_", self.mpi_per_node)
-        # [MAX_TIME]
-        lines = replaced_lines(lines, "_MAX_TIME_", self.max_time)
-        # [JOB_NAME]
-        lines = replaced_lines(lines, "_JOBNAME_", self.jobname)
-        # [QUEUE]
-        lines = replaced_lines(lines, "_QUEUE_", self.queue)
-        # [OMP]
-        lines = replaced_lines(lines, "_OMP_NUM_THREADS_", self.openmp)
-        # [CORES]
-        lines = replaced_lines(lines, "_NUM_CORES_", self.cores)
-        # [BUDGET]
-        lines = replaced_lines(lines, "_BUDGET_", self.budget)
+    def save(self):
+        # written (and indexed) only when a field has changed.
+        text = Job_record.from_job(self).dumps()
+        if getattr(self, "saved_record", None) == (self.pkl_path, text):
+            return
+        Job_record.write(self.pkl_path, text)
+        self.saved_record = (self.pkl_path, text)
+        import sqlite3
+        from turbofilemanager.job_index import Job_index
+
+        try:
+            job_index = Job_index()
+            job_index.update_submission(self)
+            job_index.close()
+        except sqlite3.Error as e:
+            logger.warning(f"The job index is not updated: {e}")
+
+    def add_event(self, event: str, **data):
+        # script, staging_start/end, submitted, started, finished, fetch_start/end
+        if getattr(self, "events", None) is None:
+            self.events = []
+        self.events.append({"event": event, "time": datetime.today(), **data})
+
+    def dependency_state(self):
+        # ("ready", job ids for afterany), ("waiting", []) or ("failed", [])
+        # a predecessor is done when it is done or fetched. a running predecessor
+        # on the same server is left to the scheduler (afterany) if it can.
+        # the exit status of a finished job is not known here, so both ways are
+        # "afterany"; only a failed submission stops the pipeline. (afterok would
+        # hold a successor of a failed job in the queue forever.)
+        scheduler = None
+        jobs = None
+        if self.server_machine.queuing:
+            scheduler = get_scheduler(self.server_machine)
+        state = "ready"
+        after = []
+        from turbofilemanager.job_index import Job_index
+
+        job_index = Job_index()
+        for local_dir in getattr(self, "depends_on", None) or []:
+            row = job_index.get(local_dir)
+            if row is not None and row["state"] == "failed":
+                logger.info(f"the predecessor {local_dir} has failed.")
+                state = "failed"
+                break
+            if row is not None and row["state"] in {"done", "fetched"}:
+                continue
+            if (
+                row is not None
+                and row["state"] == "running"
+                and scheduler is not None
+                and scheduler.dependency_format is not None
+                and row["server_machine"] == self.server_machine.name
+                and row["array_job_number"] is None
+            ):
+                # the scheduler rejects afterany on a job it no longer knows.
+                if jobs is None:
+                    jobs = scheduler.query()
+                if scheduler.is_running(jobs, row["job_number"]):
+                    after.append(row["job_number"])
+                    continue
+            state = "waiting"
+        job_index.close()
+        if state != "ready":
+            after = []
+        return state, after
+
+    def transferred_bytes(self):
+        # bytes moved by the data transfer of this job so far
+        return self.data_transfer.machine_handler.transferred_bytes
+
+    def script_values(self):
+        # placeholder -> value for the submission script template
+        values = {
+            "_NODES_": self.nodes,
+            "_CORES_PER_NODE_": self.cpns,
+            "_MPI_PER_NODE_": self.mpi_per_node,
+            "_MAX_TIME_": self.max_time,
+            "_JOBNAME_": self.jobname,
+            "_QUEUE_": self.queue,
+            "_OMP_NUM_THREADS_": self.openmp,
+            "_NUM_CORES_": self.cores,
+            "_BUDGET_": self.budget,
+            "_OUTPUT_": self.output_file,
+            "_BINARY_": self.binary,
+        }
         # [input and output]
         if self.input_file is None:
-            lines = replaced_lines(lines, " < \$INPUT", "")
+            values[" < $INPUT"] = ""
         else:
-            lines = replaced_lines(lines, "_INPUT_", self.input_file)
+            values["_INPUT_"] = self.input_file
             if not self.input_redirect:
-                lines = replaced_lines(lines, " < \$INPUT", " $INPUT")
-        lines = replaced_lines(lines, "_OUTPUT_", self.output_file)
+                values[" < $INPUT"] = " $INPUT"
         # [preoption]
         if self.preoption is None:
-            lines = replaced_lines(lines, "\$PREOPTION", "")
+            values["$PREOPTION"] = ""
         else:
-            lines = replaced_lines(
-                lines, "_PREOPTION_", '"' + self.preoption + '"'
-            )
+            values["_PREOPTION_"] = '"' + self.preoption + '"'
         # [postoption]
         if self.postoption is None:
-            lines = replaced_lines(lines, "\$POSTOPTION", "")
+            values["$POSTOPTION"] = ""
         else:
-            lines = replaced_lines(
-                lines, "_POSTOPTION_", '"' + self.postoption + '"'
-            )
+            values["_POSTOPTION_"] = '"' + self.postoption + '"'
         # [BINARY_ROOT] and [BINARY]
         if self.binary_path is None:
-            lines = replaced_lines(lines, "_BINARY_ROOT_/", "")
+            values["_BINARY_ROOT_/"] = ""
         else:
-            lines = replaced_lines(lines, "_BINARY_ROOT_", self.binary_path)
-        lines = replaced_lines(lines, "_BINARY_", self.binary)
+            values["_BINARY_ROOT_/"] = self.binary_path + "/"
+            values["_BINARY_ROOT_"] = self.binary_path
+        return values
 
-        with open(submission_script, "w") as f:
-            f.writelines(lines)
+    def generate_script(
+        self, submission_script: str = "submit.sh", script: Optional[str] = None
+    ):
+        # script: the rendered script (e.g., by a batch rendering)
+        if script is None:
+            script = get_script_template(
+                self.server_machine.name, nompi=self.nompi
+            ).render(self.script_values())
 
-        with open(self.pkl_name, "wb") as f:
-            pickle.dump(self, f)
+        with open(os.path.join(self.local_dir, submission_script), "w") as f:
+            f.write(script)
+
+        self.add_event("script", script=submission_script)
+        self.save()
 
     def job_submit(
         self,
@@ -325,27 +461,90 @@ class Job_submission:
         include_list: Optional[list] = None,
         exclude_list: Optional[list] = None,
         dryrun_flag: bool = False,
-        delete_flag: bool = False,
+        delete_flag: Optional[bool] = None,
+        check_flag: bool = True,
     ):
+        # check_flag = False skips jobnum_check (the caller has counted the free slots).
+        # the staging options not given are those of the toss (staging_options).
+        staging_options = getattr(self, "staging_options", None) or {}
         if from_objects is None:
-            from_objects = []
+            from_objects = staging_options.get("from_objects", [])
         if include_list is None:
-            include_list = []
+            include_list = staging_options.get("include_list", [])
         if exclude_list is None:
-            exclude_list = []
-
-        if not self.jobnum_check():
+            exclude_list = staging_options.get("exclude_list", [])
+        if delete_flag is None:
+            delete_flag = staging_options.get("delete_flag", False)
+        self.staging_options = {
+            "from_objects": list(from_objects),
+            "include_list": list(include_list),
+            "exclude_list": list(exclude_list),
+            "delete_flag": delete_flag,
+        }
+
+        # a toss interrupted after the submission is not submitted twice.
+        journal = None
+        if not dryrun_flag:
+            journal = Transfer_journal(
+                operation="toss",
+                parameters={
+                    "local_dir": self.local_dir,
+                    "server_machine_name": self.server_machine.name,
+                    "submission_script": submission_script,
+                    "from_objects": list(from_objects),
+                    "include_list": list(include_list),
+                    "exclude_list": list(exclude_list),
+                },
+            )
+            if journal.is_done("submitted"):
+                logger.info("The job has already been submitted.")
+                submitted = journal.get_data("submitted")
+                self.job_number = submitted["job_number"]
+                self.job_running = submitted["job_running"]
+                self.job_dir = submitted["job_dir"]
+                self.job_submit_date = submitted["job_submit_date"]
+                self.save()
+                journal.close()
+                return True, self.job_number
+
+        # a job of a pipeline waits until its predecessors are done.
+        after = []
+        if len(getattr(self, "depends_on", None) or []) > 0 and not dryrun_flag:
+            state, after = self.dependency_state()
+            if state == "failed":
+                logger.error("A predecessor has failed. The job is not submitted.")
+                self.job_waiting = False
+                self.job_status = "failed"
+                self.add_event("dependency_failed")
+                self.save()
+                return False, None
+            if state == "waiting":
+                if not getattr(self, "job_waiting", False):
+                    self.add_event("waiting")
+                self.job_waiting = True
+                self.save()
+                logger.info("The job is waiting for its predecessors.")
+                return False, None
+            self.job_waiting = False
+
+        if check_flag and not self.jobnum_check():
             logger.info("The current num. job exceeds max")
             self.job_submit_date = None
             self.job_number = None
             self.job_running = False
+            if not dryrun_flag:
+                # submitted later by "pending -submit" or "watch -submit"
+                if not self.job_pending:
+                    self.add_event("pending")
+                self.job_pending = True
+                self.save()
+                logger.info("The job is pending.")
             return False, self.job_number
         else:
             try:
                 logger.debug("The computational node is available")
-                command = (
-                    f"{self.server_machine.jobsubmit} {submission_script}"
-                )
+                scheduler = get_scheduler(self.server_machine)
+                command = f"{self.server_machine.jobsubmit} {submission_script}"
 
                 local_home = self.local_machine.file_manager_root
                 client_home = self.client_machine.file_manager_root
@@ -360,7 +559,7 @@ class Job_submission:
                     if not self.server_machine.is_dir(server_home):
                         logger.error(f"{server_home} is not found.")
                         raise FileNotFoundError
-                local_current_dir = os.path.abspath(os.getcwd())
+                local_current_dir = self.local_dir
 
                 if not dryrun_flag:
                     if (
@@ -385,26 +584,38 @@ class Job_submission:
                             logger.debug(server_dir)
 
                             # data transfer
+                            # always staged again: the inputs may have been edited
+                            # since an interrupted toss, and rsync sends only the changes.
+                            self.add_event("staging_start")
+                            transferred_bytes = self.transferred_bytes()
                             self.data_transfer.put_objects(
                                 from_objects=from_objects,
                                 include_list=include_list,
                                 exclude_list=exclude_list,
                                 dryrun_flag=dryrun_flag,
                                 delete_flag=delete_flag,
+                                local_dir=self.local_dir,
+                            )
+                            self.add_event(
+                                "staging_end",
+                                bytes=self.transferred_bytes()
+                                - transferred_bytes,
                             )
                             logger.debug("data trasfer is ok")
 
                     if self.server_machine.queuing:
                         logger.debug("queueing system")
                         (stdout, stderr,) = self.server_machine.run_command(
-                            command=command, execute_dir=server_dir
+                            command=scheduler.submit_command(
+                                submission_script, after=after
+                            ),
+                            execute_dir=server_dir,
                         )
                         logger.debug("command done")
                         logger.debug(stdout.split())
                         logger.debug(stderr.split())
-                        self.job_number = stdout.split()[
-                            self.server_machine.jobnum_index
-                        ]
+                        scheduler.invalidate()
+                        self.job_number = scheduler.submitted_job_id(stdout)
                         self.job_running = True
                         self.job_dir = server_dir
                         self.job_submit_date = datetime.today()
@@ -418,9 +629,27 @@ class Job_submission:
                         self.job_submit_date = datetime.today()
 
                     logger.info("Job submission is successful.")
+                    self.add_event(
+                        "submitted",
+                        job_number=self.job_number,
+                        queue=self.queue,
+                        **({"after": after} if len(after) > 0 else {}),
+                    )
+                    self.job_pending = False
+                    self.job_start_date = None
+                    self.job_end_date = None
+                    journal.mark_done(
+                        "submitted",
+                        {
+                            "job_number": self.job_number,
+                            "job_running": self.job_running,
+                            "job_dir": self.job_dir,
+                            "job_submit_date": self.job_submit_date,
+                        },
+                    )
 
-                    with open(self.pkl_name, "wb") as f:
-                        pickle.dump(self, f)
+                    self.save()
+                    journal.close()
 
                     return True, self.job_number
 
@@ -432,93 +661,84 @@ class Job_submission:
                 self.job_number = None
                 self.job_running = False
                 logger.error("Something wrong in job_submit!!")
+                return False, self.job_number
 
-    def jobcheck(self):
+    def query_job_list(self, max_age: Optional[float] = None):
+        # {job id: {"state", "queue", "owner", "active"}} from one scheduler query
+        return get_scheduler(self.server_machine).query(max_age=max_age)
 
+    def update_job_running(self, jobs: Optional[dict]):
+        # jobs is None for a server without a queuing system.
+        last_check_time = self.job_check_last_time
         self.job_check_last_time = datetime.today()
-
-        if self.server_machine.queuing:
-            # if self.job_running:
-            trial_num = 10
-            jjj = 0
-            while True:
-                job_list = self.server_machine.get_job_list_as_text()
-                logger.debug(job_list)
-                if not job_list == "":
-                    break
-                if jjj > trial_num:
-                    break
-                logger.warning(
-                    f"{self.server_machine.jobcheck} command did not work."
-                )
-                logger.warning(
-                    f"The command will be retried after {self.stat_time_sleep}s sleep."
-                )
-                time.sleep(self.stat_time_sleep)
-                jjj += 1
-            if job_list == "" and jjj > trial_num:
-                logger.error("Something wrong in jobcheck!!")
-                raise ValueError
-            bool_list = [
-                True if re.match(f".*{self.job_number}.*", line) else False
-                for line in job_list
-            ]
-            if any(bool_list):
+        if jobs is None:
+            flag = False
+        else:
+            scheduler = get_scheduler(self.server_machine)
+            if scheduler.is_running(jobs, self.job_number):
                 logger.info(f"job {self.job_number} is running.")
+                if getattr(
+                    self, "job_start_date", None
+                ) is None and scheduler.is_started(jobs, self.job_number):
+                    self.job_start_date = self.job_check_last_time
+                    # the job started between this poll and the previous one.
+                    self.job_queued_date = last_check_time or self.job_submit_date
+                    self.add_event("started", time=self.job_start_date)
                 self.job_running = True
                 flag = True
             else:
                 logger.info(f"job {self.job_number} has done.")
+                if self.job_running and getattr(self, "job_start_date", None):
+                    self.job_end_date = self.job_check_last_time
+                    self.add_event("finished", time=self.job_end_date)
+                    record_runtime(self)
                 self.job_running = False
                 flag = False
-            # else:
-            #    flag = False
-        else:
-            flag = False
 
-        with open(self.pkl_name, "wb") as f:
-            pickle.dump(self, f)
+        self.save()
 
         return flag
 
-    def jobnum_check(self):
-        if self.server_machine.queuing:
-            job_list = self.server_machine.get_job_list_as_text()
-            logger.debug(job_list)
+    def jobcheck(self, max_age: Optional[float] = None):
+        # a check younger than max_age (scheduler_cache_ttl by default) is not repeated.
+        if max_age is None:
+            max_age = self.server_machine.scheduler_cache_ttl
+        if (
+            self.job_check_last_time is not None
+            and (datetime.today() - self.job_check_last_time).total_seconds()
+            < max_age
+        ):
             logger.debug(
-                [
-                    line
-                    for line in job_list
-                    if re.match(
-                        f".*{self.server_machine.username}.*\s{self.queue}\s.*",
-                        line,
-                    )
-                ]
+                f"job {self.job_number} was checked at {self.job_check_last_time}."
             )
-            bool_list = [
-                True
-                if re.match(
-                    f".*{self.server_machine.username}.*\s{self.queue}\s.*",
-                    line,
-                )
-                else False
-                for line in job_list
-            ]
-            num = bool_list.count(True)
-            logger.info(
-                f"{num} jobs are running on {self.server_machine.name}"
+            return bool(self.job_running)
+        if self.server_machine.queuing:
+            jobs = self.query_job_list(max_age=max_age)
+        else:
+            jobs = None
+        return self.update_job_running(jobs)
+
+    def jobnum_check(self):
+        # MAX_JOB_SUBMIT and MAX_JOB_RUN of the queue
+        if self.server_machine.queuing:
+            free_slots = get_scheduler(self.server_machine).free_slots(
+                self.query_job_list(),
+                self.queue,
+                self.max_job_submit,
+                self.max_job_run,
             )
-            if num < self.max_job_submit:
-                logger.info(f"{num} < max_job_submit:{self.max_job_submit}")
+            if free_slots is None or free_slots > 0:
+                logger.info(f"{free_slots} slots are free.")
                 flag = True
             else:
-                logger.info(f"{num} >= max_job_submit:{self.max_job_submit}")
+                logger.info(
+                    f"No free slot (max_job_submit:{self.max_job_submit}, max_job_run:{self.max_job_run})"
+                )
                 flag = False
         else:
             flag = True
 
-        with open(self.pkl_name, "wb") as f:
-            pickle.dump(self, f)
+        self.save()
 
         return flag
 
@@ -529,7 +749,9 @@ class Job_submission:
         exclude_list: Optional[list] = None,
         dryrun_flag: bool = False,
         delete_flag: bool = False,
+        strategy: str = "auto",
     ):
+        # strategy: auto packs many changed files on the server (pack_threshold)
         if from_objects is None:
             from_objects = []
         if include_list is None:
@@ -549,7 +771,7 @@ class Job_submission:
             if not self.server_machine.is_dir(server_home):
                 logger.error(f"{server_home} is not found.")
                 raise FileNotFoundError
-        local_current_dir = os.path.abspath(os.getcwd())
+        local_current_dir = self.local_dir
 
         if not dryrun_flag:
             if (
@@ -577,29 +799,98 @@ class Job_submission:
                     logger.info(server_dir)
 
                     # data transfer
+                    self.add_event("fetch_start")
+                    transferred_bytes = self.transferred_bytes()
                     self.data_transfer.get_objects(
                         from_objects=from_objects,
                         include_list=include_list,
                         exclude_list=exclude_list,
                         dryrun_flag=dryrun_flag,
                         delete_flag=delete_flag,
+                        strategy=strategy,
+                        local_dir=self.local_dir,
+                    )
+                    self.add_event(
+                        "fetch_end",
+                        bytes=self.transferred_bytes() - transferred_bytes,
                     )
 
             self.job_fetch_date = datetime.today()
-            with open(self.pkl_name, "wb") as f:
-                pickle.dump(self, f)
+            self.save()
 
         else:
             logger.info("This is a dry-run")
 
     def delete_job(self):
         # job delete
-        self.server_machine.delete_job(jobid=self.job_number)
+        scheduler = get_scheduler(self.server_machine)
+        self.server_machine.delete_job(
+            jobid=scheduler.native_job_id(self.job_number)
+        )
+        # the cached status still lists the job.
+        scheduler.invalidate()
         self.job_running = False
         self.job_status = "failed"
 
-        with open(self.pkl_name, "wb") as f:
-            pickle.dump(self, f)
+        self.save()
+
+
+def check_jobs(
+    root_dir: Optional[str] = None,
+    server_machine_name: Optional[str] = None,
+):
+    # one scheduler query per server for all the running jobs in the job index
+    from concurrent.futures import ThreadPoolExecutor
+    from turbofilemanager.job_index import Job_index
+
+    job_index = Job_index()
+    rows = job_index.query(
+        server_machine=server_machine_name, state="running", root_dir=root_dir
+    )
+    server_submissions = {}
+    for row in rows:
+        try:
+            submission = Job_submission.load(row["pkl_path"])
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            logger.warning(f"{row['pkl_path']} is not readable: {e}")
+            continue
+        server_submissions.setdefault(
+            submission.server_machine.name, []
+        ).append(submission)
+
+    def check_server(submissions):
+        server_machine = submissions[0].server_machine
+        try:
+            if server_machine.queuing:
+                jobs = submissions[0].query_job_list()
+            else:
+                jobs = None
+        except ValueError:
+            logger.error(f"jobcheck failed on {server_machine.name}.")
+            return len(submissions)
+        for submission in submissions:
+            submission.update_job_running(jobs)
+        return 0
+
+    unknown = 0
+    if len(server_submissions) > 0:
+        logger.info(
+            f"Checking {sum(len(v) for v in server_submissions.values())} jobs on {len(server_submissions)} servers."
+        )
+        with ThreadPoolExecutor(max_workers=len(server_submissions)) as executor:
+            unknown = sum(
+                executor.map(check_server, server_submissions.values())
+            )
+
+    summary = Counter(
+        row["state"]
+        for row in job_index.query(
+            server_machine=server_machine_name, root_dir=root_dir
+        )
+    )
+    job_index.close()
+    summary["unknown"] = unknown
+    return summary
 
 
 if __name__ == "__main__":
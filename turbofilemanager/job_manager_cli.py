@@ -6,7 +6,7 @@ import shutil
 from datetime import datetime
 import pickle
 import pathlib
-import glob
+from collections import Counter
 import yaml
 
 # define logger
@@ -21,7 +21,9 @@ from turbofilemanager.file_manager_env import (
     job_manager_env_template_dir,
 )
 from turbofilemanager.machine_handler import Machine
-from turbofilemanager.job_manager import Job_submission
+from turbofilemanager.job_manager import Job_submission, check_jobs
+from turbofilemanager.scheduler_adapter import get_scheduler
+from turbofilemanager.job_record import Job_record
 
 logger = getLogger("file-manager").getChild(__name__)
 
@@ -34,22 +36,30 @@ except (ModuleNotFoundError, ImportError):
 
 
 class Monitor:
+    # job_manager.pkl is the record written by older versions
+    record_names = [Job_record.record_name, Job_record.legacy_name]
+    cache_name = ".jobmonitor.tmp"
+    num_threads = 16
+
     def __init__(self, root_dir: str):
         self.root_dir = root_dir
-        self.job_list_conter = 0
-        self.job_pkl_list = []
+        self.job_pkl_list = []  # indexed by job id
         self.job_dir_list = []
+        self.job_ids = {}  # job dir -> job id
+        self.dir_cache = {}  # dir -> (mtime, sub dir names, file names)
+        self.job_summaries = {}  # job dir -> (pkl mtime, summary)
+        self.root = None
+        self.updated = True
 
     def show_dir_jobdir(self, jobid: int):
         logger.info(
-            f"jobid({jobid}) = {pathlib.Path(self.job_dir_list[jobid]).relative_to(os.getcwd())}"
+            f"jobid({jobid}) = {pathlib.Path(self.job_dir_list[int(jobid)]).relative_to(os.getcwd())}"
         )
         # umm it does not work
 
     def show_detail(self, id: int):
         id = int(id)
-        with open(os.path.join(self.job_pkl_list[id]), "rb") as f:
-            job_handler = pickle.load(f)
+        job_handler = Job_submission.load(self.job_pkl_list[id])
 
         logger.info(f"--Detail of the jobID = {id}--")
 
@@ -80,164 +90,370 @@ class Monitor:
         logger.info("==Job info.==")
         logger.info(f" - package = {job_handler.package}")
         logger.info(
-            f" - binary = {os.path.join(job_handler.binary_path, job_handler.binary)}"
+            f" - binary = {os.path.join(job_handler.binary_path or '', job_handler.binary)}"
         )
         logger.info(f" - cores = {job_handler.cores}")
         logger.info(f" - openmp = {job_handler.openmp}")
         logger.info(f" - queue = {job_handler.queue}")
+        queue_selection = getattr(job_handler, "queue_selection", None)
+        if queue_selection is not None:
+            logger.info(
+                f"   selected: {queue_selection['reason']} ({queue_selection['time']})"
+            )
+            for candidate in queue_selection["candidates"]:
+                logger.info(
+                    "   {queue}: {active} submitted, {running} running, expected wait = {expected_wait:.0f} s".format(
+                        **candidate
+                    )
+                )
         logger.info(f" - cpns = {job_handler.cpns}")
         logger.info(f" - mpi_per_node = {job_handler.mpi_per_node}")
         logger.info(f" - max_job_run = {job_handler.max_job_run}")
         logger.info(f" - max_job_submit = {job_handler.max_job_submit}")
         logger.info(f" - max_time = {job_handler.max_time}")
+        walltime_prediction = getattr(job_handler, "walltime_prediction", None)
+        if walltime_prediction is not None:
+            logger.info(
+                "   predicted from {samples} runs (input = {input_key}, max runtime = {max_runtime} s)".format(
+                    **walltime_prediction
+                )
+            )
         logger.info(f" - jobname = {job_handler.jobname}")
         logger.info(f" - input_file = {job_handler.input_file}")
         logger.info(f" - output_file = {job_handler.output_file}")
 
+    @classmethod
+    def load(cls, root_dir: str):
+        # the index of the previous invocation, revalidated by refresh().
+        try:
+            with open(os.path.join(root_dir, cls.cache_name), "rb") as f:
+                monitor = pickle.load(f)
+            if not hasattr(monitor, "dir_cache"):
+                raise AttributeError  # written by an older version
+        except (OSError, EOFError, AttributeError, pickle.UnpicklingError):
+            monitor = cls(root_dir=root_dir)
+        monitor.root_dir = root_dir
+        return monitor
+
+    def __getstate__(self):
+        # the rendered tree is rebuilt on every refresh.
+        state = self.__dict__.copy()
+        state["root"] = None
+        return state
+
+    def save(self):
+        if not self.updated:
+            return
+        cache_file = os.path.join(self.root_dir, self.cache_name)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        self.updated = False
+        with open(tmp_file, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_file, cache_file)
+
+    def refresh(self):
+        # one stat per directory and per pkl; only changed directories are
+        # listed again and only changed pkls are read again.
+        visited = {}
+        self.root = self.scan(
+            str(pathlib.Path(self.root_dir).resolve()), visited=visited
+        )
+        # forget removed directories
+        scanned_dirs = set(visited.values())
+        for path in list(self.dir_cache.keys()):
+            if path not in scanned_dirs:
+                del self.dir_cache[path]
+                self.updated = True
+        self.update_job_summaries(self.root)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node["is_job"] and node["path"] not in self.job_ids:
+                # ids are never reused, so they stay valid across refreshes.
+                self.job_ids[node["path"]] = len(self.job_pkl_list)
+                self.job_dir_list.append(node["path"])
+                self.job_pkl_list.append(
+                    os.path.join(node["path"], node["record"])
+                )
+                self.updated = True
+            stack += node["dirs"][::-1]
+
     def show_tree(self, show_files: bool = False):
-        self.job_list_conter = 0
-        self.job_dir_list = []
-        self.tree(path=self.root_dir, show_files=show_files)
+        self.refresh()
+        self.tree(self.root, show_files=show_files)
+
+    def scan(self, path: str, visited=None):
+        # each node records whether its subtree has jobs.
+        if visited is None:
+            visited = {}  # (device, inode) -> path
+        node = {
+            "path": path,
+            "name": os.path.basename(path),
+            "is_job": False,
+            "record": None,
+            "has_job": False,
+            "dirs": [],
+            "files": [],
+        }
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.dir_cache.pop(path, None)
+            return node
+        if (stat.st_dev, stat.st_ino) in visited:
+            return node
+        visited[(stat.st_dev, stat.st_ino)] = path
+
+        cached = self.dir_cache.get(path)
+        if cached is not None and cached[0] == stat.st_mtime_ns:
+            dir_names, file_names = cached[1], cached[2]
+        else:
+            dir_names = []
+            file_names = []
+            try:
+                entries = sorted(os.scandir(path), key=lambda e: e.name)
+            except OSError:
+                entries = []
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir():
+                        dir_names.append(entry.name)
+                    else:
+                        file_names.append(entry.name)
+                except OSError:
+                    continue
+            self.dir_cache[path] = (stat.st_mtime_ns, dir_names, file_names)
+            self.updated = True
+
+        for dir_name in dir_names:
+            child = self.scan(os.path.join(path, dir_name), visited=visited)
+            if child["has_job"]:
+                node["dirs"].append(child)
+        for record_name in self.record_names:
+            if record_name in file_names:
+                node["record"] = record_name
+                break
+        node["is_job"] = node["record"] is not None
+        node["files"] = file_names
+        node["has_job"] = node["is_job"] or len(node["dirs"]) > 0
+        return node
+
+    def update_job_summaries(self, root: dict):
+        # only the fields shown in the tree, read with a thread pool.
+        pkl_mtimes = {}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node["is_job"]:
+                try:
+                    pkl_mtimes[node["path"]] = os.stat(
+                        os.path.join(node["path"], node["record"])
+                    ).st_mtime_ns
+                except OSError:
+                    pass
+            stack += node["dirs"]
+        # the job index (sqlite3) is opened only when a job record has
+        # appeared, changed or disappeared since the last show.
+        prune_flag = len(self.job_summaries) == 0
+        for path in list(self.job_summaries.keys()):
+            if path not in pkl_mtimes:
+                del self.job_summaries[path]
+                self.updated = True
+                prune_flag = True
+        if prune_flag:
+            self.prune_index(set(pkl_mtimes))
+        changed_dirs = [
+            path
+            for path, mtime in pkl_mtimes.items()
+            if path not in self.job_summaries
+            or self.job_summaries[path][0] != mtime
+        ]
+
+        def load_summary(path):
+            try:
+                job_handler = Job_submission.load(path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"The job record in {path} is not readable: {e}")
+                return None
+            return job_handler
+
+        if len(changed_dirs) > 0:
+            from concurrent.futures import ThreadPoolExecutor
+            from turbofilemanager.job_index import Job_index
+
+            job_index = Job_index()
+            with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                for path, job_handler in zip(
+                    changed_dirs, executor.map(load_summary, changed_dirs)
+                ):
+                    summary = None
+                    if job_handler is not None:
+                        summary = (
+                            job_handler.server_machine.name,
+                            job_handler.job_number,
+                            job_handler.job_running,
+                            getattr(job_handler, "job_pending", False),
+                            getattr(job_handler, "job_waiting", False),
+                        )
+                        # jobs submitted by older versions are not indexed yet.
+                        if job_index.get(path) is None:
+                            job_index.update_submission(job_handler)
+                    self.job_summaries[path] = (pkl_mtimes[path], summary)
+            job_index.close()
+            self.updated = True
+        logger.debug(f"{len(changed_dirs)} job records are read.")
+
+    def prune_index(self, job_dirs: set):
+        # the index rows under the root whose job record has disappeared
+        # (e.g., a removed or moved job dir) are deleted.
+        from turbofilemanager.job_index import Job_index
+
+        job_index = Job_index()
+        removed = [
+            row["local_dir"]
+            for row in job_index.query(root_dir=self.root_dir)
+            if row["local_dir"] not in job_dirs
+            and not any(
+                os.path.isfile(os.path.join(row["local_dir"], record_name))
+                for record_name in self.record_names
+            )
+        ]
+        for local_dir in removed:
+            logger.debug(f"{local_dir} is removed from the job index.")
+            job_index.delete(local_dir)
+        job_index.close()
+
+    def job_line(self, node: dict):
+        summary = self.job_summaries.get(node["path"], (None, None))[1]
+        if summary is None:
+            return None
+        server_machine_name, job_number, job_running = summary[:3]
+        if job_running:
+            job_comment = "is running"
+        elif len(summary) > 3 and summary[3]:
+            job_comment = "is pending"
+        elif len(summary) > 4 and summary[4]:
+            job_comment = "is waiting"
+        else:
+            job_comment = "is done"
+        return "{job_number} {job_comment} on {server_machine_name} (id:{job_index})".format(
+            job_comment=job_comment,
+            server_machine_name=server_machine_name,
+            job_number=job_number,
+            job_index=self.job_ids[node["path"]],
+        )
 
     def tree(
         self,
-        path: str,
+        node: dict,
         layer: int = 0,
         is_last: bool = False,
         indent_current: str = " ",
         show_files: bool = False,
     ):
-        if not pathlib.Path(path).is_absolute():
-            path = str(pathlib.Path(path).resolve())
-
-        def is_job_path(path):
-            return os.path.isfile(os.path.join(path, "job_manager.pkl"))
-
-        current = os.path.basename(path)
+        # renders the scanned tree; no file system access.
+        current = node["name"]
+        job_line = None
+        if node["is_job"]:
+            job_line = self.job_line(node)
         if layer == 0:
-            if not is_job_path(path):
+            if job_line is None:
                 logger.info("<" + current + "> <--- current dir")
             else:
-                with open(os.path.join(path, "job_manager.pkl"), "rb") as f:
-                    job_handler = pickle.load(f)
-                    server_machine_name = job_handler.server_machine.name
-                    job_number = job_handler.job_number
-                    job_running = job_handler.job_running
-                    if job_running:
-                        job_comment = "is running"
-                    else:
-                        job_comment = "is done"
-                    logger.info(
-                        "<{dirname}, current dir>-{job_number} {job_comment} on {server_machine_name} (id:{job_index})".format(
-                            dirname=current,
-                            job_comment=job_comment,
-                            server_machine_name=server_machine_name,
-                            job_number=job_number,
-                            job_index=self.job_list_conter,
-                        )
-                    )
-
-                    self.job_list_conter += 1
-                    self.job_dir_list.append(path)
-                    self.job_pkl_list.append(
-                        os.path.join(path, "job_manager.pkl")
-                    )
-
+                logger.info(f"<{current}, current dir>-{job_line}")
         else:
             branch = "└" if is_last else "├"
-            if not is_job_path(path):
-                job_files = glob.glob(
-                    f"{path}/**/job_manager.pkl", recursive=True
-                )
-                if len(job_files) != 0:
-                    logger.info(
-                        "{indent}{branch}<{dirname}>".format(
-                            indent=indent_current,
-                            branch=branch,
-                            dirname=current,
-                        )
+            if job_line is None:
+                logger.info(
+                    "{indent}{branch}<{dirname}>".format(
+                        indent=indent_current,
+                        branch=branch,
+                        dirname=current,
                     )
+                )
             else:
-                with open(os.path.join(path, "job_manager.pkl"), "rb") as f:
-                    job_handler = pickle.load(f)
-                    server_machine_name = job_handler.server_machine.name
-                    job_number = job_handler.job_number
-                    job_running = job_handler.job_running
-                    if job_running:
-                        job_comment = "is running"
-                    else:
-                        job_comment = "is done"
-                    logger.info(
-                        "{indent}{branch}<{dirname}>-{job_number} {job_comment} on {server_machine_name} (id:{job_index})".format(
-                            indent=indent_current,
-                            branch=branch,
-                            dirname=current,
-                            job_comment=job_comment,
-                            server_machine_name=server_machine_name,
-                            job_number=job_number,
-                            job_index=self.job_list_conter,
-                        )
-                    )
-
-                    self.job_list_conter += 1
-                    self.job_dir_list.append(path)
-                    self.job_pkl_list.append(
-                        os.path.join(path, "job_manager.pkl")
+                logger.info(
+                    "{indent}{branch}<{dirname}>-{job_line}".format(
+                        indent=indent_current,
+                        branch=branch,
+                        dirname=current,
+                        job_line=job_line,
                     )
+                )
 
-        paths = sorted(
-            [
-                p
-                for p in glob.glob(path + "/*")
-                if os.path.isdir(p) or os.path.isfile(p)
-            ]
-        )
+        children = [(child["name"], child) for child in node["dirs"]]
         if show_files:
-            paths = [
-                p
-                for p in paths
-                if glob.glob(f"{p}/**/job_manager.pkl", recursive=True)
-                or os.path.isfile(p)
-            ]
-        else:
-            paths = [
-                p
-                for p in paths
-                if glob.glob(f"{p}/**/job_manager.pkl", recursive=True)
-            ]
-
-        def is_last_path(i):
-            return i == len(paths) - 1
-
-        for i, p in enumerate(paths):
-
-            indent_lower = indent_current
-            if layer != 0:
-                indent_lower += "　　" if is_last else "│　"
-
-            if os.path.isfile(p):
-                if show_files:
-                    branch = "└" if is_last_path(i) else "├"
-                    logger.info(
-                        "{indent}{branch}{filename}".format(
-                            indent=indent_lower,
-                            branch=branch,
-                            filename=p.split("/")[::-1][0],
-                        )
+            children += [(file_name, None) for file_name in node["files"]]
+        children.sort(key=lambda child: child[0])
+
+        indent_lower = indent_current
+        if layer != 0:
+            indent_lower += "　　" if is_last else "│　"
+
+        for i, (name, child) in enumerate(children):
+            is_last_child = i == len(children) - 1
+            if child is None:
+                branch = "└" if is_last_child else "├"
+                logger.info(
+                    "{indent}{branch}{filename}".format(
+                        indent=indent_lower,
+                        branch=branch,
+                        filename=name,
                     )
-            if os.path.isdir(p):
+                )
+            else:
                 self.tree(
-                    p,
+                    child,
                     layer=layer + 1,
-                    is_last=is_last_path(i),
+                    is_last=is_last_child,
                     indent_current=indent_lower,
+                    show_files=show_files,
                 )
 
 
+def get_pkl_paths(args, root_dir: str, state: str):
+    # the jobs of the state under root_dir (--all) or the jobs of the ids of show
+    from turbofilemanager.bulk_fetch import parse_job_ids
+    from turbofilemanager.job_index import Job_index
+
+    if args.all:
+        job_index = Job_index()
+        rows = job_index.query(
+            server_machine=args.filter_server, state=state, root_dir=root_dir
+        )
+        job_index.close()
+        return [row["pkl_path"] for row in rows]
+    monitor = Monitor.load(root_dir=root_dir)
+    monitor.refresh()
+    monitor.save()
+    pkl_paths = []
+    for job_id in parse_job_ids(args.jobid):
+        if job_id >= len(monitor.job_pkl_list):
+            logger.warning(f"job id {job_id} is not found.")
+            continue
+        pkl_paths.append(monitor.job_pkl_list[job_id])
+    return pkl_paths
+
+
 def job_manager_cli():
     root_dir = os.getcwd()
 
-    job_list = ["toss", "fetch", "show", "dir", "del", "check", "stat"]
+    job_list = [
+        "toss",
+        "fetch",
+        "show",
+        "dir",
+        "del",
+        "check",
+        "stat",
+        "list",
+        "watch",
+        "pending",
+        "report",
+        "tail",
+    ]
 
     # check if machine info file exists
     machine_info_yaml = os.path.join(
@@ -295,7 +511,12 @@ def job_manager_cli():
         "job", help=f"Choose job type from {job_list}", choices=job_list
     )
     # Job ID:
-    parser.add_argument("-id", "--jobid", help="Specify jobid", default=-1)
+    parser.add_argument(
+        "-id",
+        "--jobid",
+        help="Specify jobid (fetch and tail: ids and ranges, e.g., 3-120 or 3,5,7-9)",
+        default=-1,
+    )
     # files
     parser.add_argument(
         "-f", "--files", help="show files", action="store_true", default=False
@@ -325,6 +546,135 @@ def job_manager_cli():
         choices=machine_list,
         default="localhost",
     )
+    # all jobs (for check)
+    parser.add_argument(
+        "-all",
+        "--all",
+        help="check all the jobs under the current dir with one query per server (fetch: fetch all the finished jobs concurrently, tail: all the running jobs)",
+        action="store_true",
+        default=False,
+    )
+    # bulk toss
+    parser.add_argument(
+        "-dirs",
+        "--dirs",
+        help="toss all these job directories (glob patterns are allowed) with the same settings",
+        default=[],
+        nargs="*",
+    )
+    parser.add_argument(
+        "-array",
+        "--array",
+        help="toss the job directories of -dirs as one array job (pbs and slurm)",
+        action="store_true",
+        default=False,
+    )
+    # walltime
+    parser.add_argument(
+        "-predict",
+        "--predict_walltime",
+        help="request a walltime predicted from the runtimes of the same jobs (and the shortest queue that fits) instead of MAX_TIME",
+        action="store_true",
+        default=False,
+    )
+    # pending jobs (over MAX_JOB_SUBMIT/MAX_JOB_RUN) are submitted in the order of priority
+    parser.add_argument(
+        "-priority",
+        "--priority",
+        help="priority of the job when it waits in the local pending queue",
+        default=0,
+        type=int,
+    )
+    # pipelines; a job waits until the jobs of the dirs are done (check --all/watch submit it)
+    parser.add_argument(
+        "-after",
+        "--after",
+        help="the job is submitted after the jobs in these dirs are done (afterany)",
+        nargs="*",
+        default=[],
+    )
+    parser.add_argument(
+        "-dag",
+        "--dag",
+        help="toss a pipeline in a yaml file (name: {dir, after: [names], toss arguments}); the other toss options are the defaults",
+        type=str,
+        default=None,
+    )
+    # watch
+    parser.add_argument(
+        "-submit",
+        "--submit",
+        help="watch also submits the generated and pending jobs when the queue has room (pending: submit the pending jobs now)",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-nofetch",
+        "--nofetch",
+        help="watch does not fetch the finished jobs",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-once",
+        "--once",
+        help="watch polls each server only once",
+        action="store_true",
+        default=False,
+    )
+    # tail
+    parser.add_argument(
+        "-tf",
+        "--tail_files",
+        help="files in the job dir read by tail (default: output_file)",
+        nargs="*",
+        default=None,
+    )
+    parser.add_argument(
+        "-follow",
+        "--follow",
+        help="tail polls until the jobs are done",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-interval",
+        "--interval",
+        help="seconds between the polls of tail -follow",
+        type=float,
+        default=10,
+    )
+    parser.add_argument(
+        "-save",
+        "--save",
+        help="tail appends the new bytes to the local copies of the files instead of printing them",
+        action="store_true",
+        default=False,
+    )
+    # filters for list, check --all, fetch --all, tail --all, watch and report
+    parser.add_argument(
+        "-fs",
+        "--filter_server",
+        help="list only jobs on this server machine",
+        type=str,
+        choices=machine_list,
+        default=None,
+    )
+    parser.add_argument(
+        "-status",
+        "--status",
+        help="list only jobs in this state",
+        choices=[
+            "generated",
+            "waiting",
+            "pending",
+            "running",
+            "done",
+            "fetched",
+            "failed",
+        ],
+        default=None,
+    )
     # logger
     parser.add_argument(
         "-log", "--log_level", choices=["DEBUG", "INFO"], default="INFO"
@@ -361,7 +711,7 @@ def job_manager_cli():
     parser.add_argument(
         "-exc",
         "--exclude",
-        help="specify an resync exclude list (default is read from exclude_list.txt in the current dir.)",
+        help="specify an resync exclude list (default is read from exclude_list.txt in the current dir.). .turboignore files are also read.",
         default=[],
         nargs="*",
     )
@@ -379,6 +729,13 @@ def job_manager_cli():
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "-strategy",
+        "--strategy",
+        help="transfer strategy of fetch (auto packs many changed files on the server, see pack_threshold)",
+        choices=["auto", "rsync", "tar", "sharded", "pack"],
+        default="auto",
+    )
 
     # parse the input values
     args = parser.parse_args()
@@ -410,7 +767,7 @@ def job_manager_cli():
             postoption = " ".join(args.postoption)
         else:
             postoption = None
-        submission = Job_submission(
+        submission_kwargs = dict(
             local_machine_name=args.local_machine,
             client_machine_name=args.client_machine,
             server_machine_name=args.server_machine,
@@ -426,31 +783,97 @@ def job_manager_cli():
             postoption=postoption,
             nompi=args.nompi,
             output_file=args.outputfile,
-            pkl_name="job_manager.pkl",
+            pkl_name=Job_record.record_name,
+            predict_walltime=args.predict_walltime,
         )
-        submission.generate_script()
 
         if len(args.include) > 0:
             args.include.append("submit.sh")
-            args.include.append(args.inputfile)
+            if args.inputfile is not None:
+                args.include.append(args.inputfile)
 
-        # job submission
-        job_flag = submission.job_submit(
-            from_objects=[],
+        depends_on = [os.path.abspath(after) for after in args.after]
+
+        if args.dag is not None:
+            # the whole pipeline in one call
+            from turbofilemanager.job_dag import Job_dag
+
+            submissions = Job_dag.toss(
+                Job_dag.read_yaml(args.dag),
+                submission_kwargs,
+                include_list=args.include,
+                exclude_list=args.exclude,
+                dryrun_flag=args.dryrun,
+                delete_flag=args.delete,
+            )
+            logger.info(
+                f"{sum(s.job_submit_date is not None for s in submissions.values())}/{len(submissions)} jobs of the pipeline are submitted."
+            )
+
+        elif len(args.dirs) > 0:
+            # bulk submission
+            from turbofilemanager.bulk_submission import (
+                Bulk_submission,
+                Array_submission,
+                expand_job_dirs,
+            )
+
+            job_dirs = expand_job_dirs(args.dirs)
+            logger.info(f"{len(job_dirs)} job directories are tossed.")
+            if args.array and len(job_dirs) > 1:
+                bulk_submission = Array_submission(
+                    job_dirs=job_dirs, **submission_kwargs
+                )
+            else:
+                bulk_submission = Bulk_submission(
+                    job_dirs=job_dirs, **submission_kwargs
+                )
+            bulk_submission.template.priority = args.priority
+            bulk_submission.template.depends_on = depends_on
+            submitted = bulk_submission.toss(
+                include_list=args.include,
+                exclude_list=args.exclude,
+                dryrun_flag=args.dryrun,
+                delete_flag=args.delete,
+            )
+            logger.info(
+                f"{len(submitted)}/{len(job_dirs)} jobs are submitted."
+            )
+        else:
+            submission = Job_submission(**submission_kwargs)
+            submission.priority = args.priority
+            submission.depends_on = depends_on
+            submission.generate_script()
+
+            # job submission
+            job_flag, job_number = submission.job_submit(
+                from_objects=[],
+                include_list=args.include,
+                exclude_list=args.exclude,
+                dryrun_flag=args.dryrun,
+                delete_flag=args.delete,
+            )
+
+            if job_flag:
+                logger.error("job submission is successful")
+            else:
+                logger.error("job submission is failure")
+
+    if args.job == "fetch" and (args.all or args.jobid != -1):
+        # the finished jobs under the current dir, or the jobs of the ids (e.g., 3-120)
+        from turbofilemanager.bulk_fetch import Bulk_fetch
+
+        Bulk_fetch(
+            get_pkl_paths(args, root_dir=root_dir, state="done"),
             include_list=args.include,
             exclude_list=args.exclude,
             dryrun_flag=args.dryrun,
             delete_flag=args.delete,
-        )
-
-        if job_flag:
-            logger.error("job submission is successful")
-        else:
-            logger.error("job submission is failure")
+            strategy=args.strategy,
+        ).run()
 
-    if args.job == "fetch":
-        with open("job_manager.pkl", mode="rb") as f:
-            submission = pickle.load(f)
+    elif args.job == "fetch":
+        submission = Job_submission.load(Job_record.record_name)
         logger.info(f"Fetching from {submission.server_machine.name}.")
         submission.fetch_job(
             from_objects=[],
@@ -458,32 +881,146 @@ def job_manager_cli():
             exclude_list=args.exclude,
             dryrun_flag=args.dryrun,
             delete_flag=args.delete,
+            strategy=args.strategy,
         )
 
     elif args.job == "show":
+        monitor = Monitor.load(root_dir=root_dir)
         if args.jobid == -1:
-            monitor = Monitor(root_dir=root_dir)
             monitor.show_tree(show_files=args.files)
-            with open(os.path.join(root_dir, ".jobmonitor.tmp"), "wb") as f:
-                pickle.dump(monitor, f)
+            monitor.save()
         else:
-            try:
-                with open(
-                    os.path.join(root_dir, ".jobmonitor.tmp"), "rb"
-                ) as f:
-                    monitor = pickle.load(f)
-            except FileNotFoundError:
-                monitor = Monitor(root_dir=root_dir)
+            if len(monitor.dir_cache) == 0:
                 monitor.show_tree(show_files=args.files)
-                with open(
-                    os.path.join(root_dir, ".jobmonitor.tmp"), "wb"
-                ) as f:
-                    pickle.dump(monitor, f)
+            else:
+                monitor.refresh()
+            monitor.save()
 
             monitor.show_detail(id=args.jobid)
 
             # monitor.chdir_jobdir(jobid=19)
 
+    elif args.job == "list":
+        # read from the job index instead of walking the job records
+        from turbofilemanager.job_index import Job_index
+
+        job_index = Job_index()
+        rows = job_index.query(
+            root_dir=root_dir,
+            server_machine=args.filter_server,
+            state=args.status,
+        )
+        job_index.close()
+        for row in rows:
+            logger.info(
+                "{local_dir}: {job_number} {state} on {server_machine} ({jobname})".format(
+                    local_dir=os.path.relpath(row["local_dir"], root_dir),
+                    job_number=row["job_number"],
+                    state=row["state"],
+                    server_machine=row["server_machine"],
+                    jobname=row["jobname"],
+                )
+            )
+        logger.info(f"{len(rows)} jobs.")
+
+    elif args.job == "pending":
+        from turbofilemanager.pending_queue import Pending_queue
+
+        pending_queue = Pending_queue(
+            root_dir=root_dir, server_machine_name=args.filter_server
+        )
+        if args.submit:
+            pending_queue.submit()
+        rows = pending_queue.get_rows()
+        for row in rows:
+            logger.info(
+                "{local_dir}: priority {priority} on {server_machine} ({queue})".format(
+                    local_dir=os.path.relpath(row["local_dir"], root_dir),
+                    priority=row["priority"],
+                    server_machine=row["server_machine"],
+                    queue=row["queue"],
+                )
+            )
+        logger.info(f"{len(rows)} jobs are pending.")
+
+    elif args.job == "tail":
+        # the new bytes of output_file (or -tf files) of the job in the current dir,
+        # of the running jobs under it (--all) or of the jobs of the ids
+        if args.all or args.jobid != -1:
+            pkl_paths = get_pkl_paths(args, root_dir=root_dir, state="running")
+        else:
+            pkl_paths = [Job_record.record_name]
+        from turbofilemanager.job_tail import Job_tail
+
+        job_tail = Job_tail(
+            pkl_paths, file_names=args.tail_files, save_flag=args.save
+        )
+        if args.follow:
+            job_tail.interval = args.interval
+            try:
+                job_tail.follow()
+            except KeyboardInterrupt:
+                job_tail.flush()
+                logger.info("follow is stopped.")
+        else:
+            job_tail.poll()
+            job_tail.flush()
+
+    elif args.job == "report":
+        # queue wait, run time, staging and fetch time per server, queue and package
+        from turbofilemanager.job_report import Job_report
+
+        Job_report(root_dir=root_dir, server_machine_name=args.filter_server).show()
+
+    elif args.job == "watch":
+        # asyncio is imported only by watch
+        from turbofilemanager.job_watcher import Job_watcher
+
+        job_watcher = Job_watcher(
+            root_dir=root_dir,
+            server_machine_name=args.filter_server,
+            fetch_flag=not args.nofetch,
+            submit_flag=args.submit,
+        )
+        try:
+            job_watcher.run(once=args.once)
+        except KeyboardInterrupt:
+            logger.info("watch is stopped.")
+
+    elif args.job == "check" and args.all:
+        # from the job index; the job records are not walked (see list).
+        summary = check_jobs(
+            root_dir=root_dir, server_machine_name=args.filter_server
+        )
+        if summary["waiting"] > 0:
+            # the waiting jobs whose predecessors have finished are submitted
+            # (or fail with them); the states are counted again.
+            from turbofilemanager.job_dag import Job_dag
+            from turbofilemanager.job_index import Job_index
+
+            Job_dag(
+                root_dir=root_dir, server_machine_name=args.filter_server
+            ).advance()
+            job_index = Job_index()
+            summary = Counter(
+                row["state"]
+                for row in job_index.query(
+                    server_machine=args.filter_server, root_dir=root_dir
+                )
+            ) + Counter(unknown=summary["unknown"])
+            job_index.close()
+        if summary["waiting"] > 0:
+            logger.info(f"waiting  = {summary['waiting']}")
+        logger.info(f"running  = {summary['running']}")
+        logger.info(
+            f"finished = {summary['done'] + summary['fetched']} ({summary['fetched']} fetched)"
+        )
+        logger.info(f"failed   = {summary['failed']}")
+        if summary["unknown"] > 0:
+            logger.warning(
+                f"unknown  = {summary['unknown']} (the scheduler query failed)"
+            )
+
     elif args.job == "stat":
         if args.server_machine is None:
             logger.warning("Choose a machine for qstat by '-m' or '--machine'")
@@ -498,14 +1035,12 @@ def job_manager_cli():
                     logger.info("  ".join(job.split()))
                     i += 1
     else:
-        try:
-            with open(os.path.join(root_dir, ".jobmonitor.tmp"), "rb") as f:
-                monitor = pickle.load(f)
-        except FileNotFoundError:
-            monitor = Monitor(root_dir=root_dir)
+        monitor = Monitor.load(root_dir=root_dir)
+        if len(monitor.dir_cache) == 0:
             monitor.show_tree(show_files=args.files)
-            with open(os.path.join(root_dir, ".jobmonitor.tmp"), "wb") as f:
-                pickle.dump(monitor, f)
+        else:
+            monitor.refresh()
+        monitor.save()
 
         if args.job == "dir":
             if args.jobid == -1:
@@ -517,15 +1052,15 @@ def job_manager_cli():
                 machine = Machine(args.server_machine)
                 logger.info(f"delite job = {args.jobid} on {machine.name}.")
                 machine.delete_job(jobid=args.jobid)
+                if machine.queuing:
+                    get_scheduler(machine).invalidate()
             else:
                 if args.jobid != -1:
-                    with open(
-                        os.path.join(monitor.job_pkl_list[args.jobid]), "rb"
-                    ) as f:
-                        submission = pickle.load(f)
+                    submission = Job_submission.load(
+                        monitor.job_pkl_list[int(args.jobid)]
+                    )
                 else:
-                    with open("job_manager.pkl", mode="rb") as f:
-                        submission = pickle.load(f)
+                    submission = Job_submission.load(Job_record.record_name)
                 logger.info(
                     f"delite job = {submission.job_number} on {submission.server_machine.name}."
                 )
@@ -533,13 +1068,11 @@ def job_manager_cli():
 
         elif args.job == "check":
             if args.jobid != -1:
-                with open(
-                    os.path.join(monitor.job_pkl_list[args.jobid]), "rb"
-                ) as f:
-                    submission = pickle.load(f)
+                submission = Job_submission.load(
+                    monitor.job_pkl_list[int(args.jobid)]
+                )
             else:
-                with open("job_manager.pkl", mode="rb") as f:
-                    submission = pickle.load(f)
+                submission = Job_submission.load(Job_record.record_name)
 
             if submission.jobcheck():
                 logger.info(
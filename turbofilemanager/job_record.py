@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import json
+import pickle
+from datetime import datetime
+
+# define logger
+from logging import getLogger
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def encode(value):
+    # json with tagged datetimes
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        return {str(key): encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if hasattr(value, "item"):
+        # numpy scalars in records written by older versions
+        return value.item()
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def find_record(path: str):
+    # a job dir or a record path -> the json record, or the legacy pickle.
+    if os.path.isdir(path):
+        job_dir = path
+    else:
+        job_dir = os.path.dirname(os.path.abspath(path))
+    for name in [Job_record.record_name, Job_record.legacy_name]:
+        record_path = os.path.join(job_dir, name)
+        if os.path.isfile(record_path):
+            return record_path
+    raise FileNotFoundError(
+        f"No {Job_record.record_name} or {Job_record.legacy_name} in {job_dir}"
+    )
+
+
+class Job_record:
+    # the persistent state of a job: the job fields and machine names only.
+    # a field unknown to this version is ignored and a missing field gets
+    # its default, so records survive upgrades and downgrades.
+    record_version = 1
+    record_name = "job_manager.json"
+    legacy_name = "job_manager.pkl"  # pickled Job_submission (<= version 0)
+    defaults = {
+        "local_machine_name": None,
+        "client_machine_name": None,
+        "server_machine_name": None,
+        "package": None,
+        "version": None,
+        "binary": None,
+        "binary_path": None,
+        "cores": 1,
+        "openmp": 1,
+        "nompi": False,
+        "queue": None,
+        "nodes": None,
+        "cpns": None,
+        "mpi_per_node": None,
+        "max_job_run": None,
+        "max_job_submit": None,
+        "max_time": None,
+        "budget": None,
+        "jobname": None,
+        "preoption": None,
+        "postoption": None,
+        "input_file": None,
+        "output_file": None,
+        "input_redirect": True,
+        "input_key": None,
+        "safe_mode": False,
+        "job_number": None,
+        "array_job_number": None,
+        "job_dir": None,
+        "job_running": False,
+        "job_status": "unknown",
+        "job_pending": False,
+        "priority": 0,
+        "job_submit_date": None,
+        "job_check_last_time": None,
+        "job_fetch_date": None,
+        "job_start_date": None,
+        "job_end_date": None,
+        "job_queued_date": None,
+        "queue_selection": None,
+        "walltime_prediction": None,
+        "events": [],  # the lifecycle timeline, [{"event", "time", ...}]
+        "tail_offsets": {},  # file name -> bytes already read by tail
+        "depends_on": [],  # local dirs of the predecessors in a pipeline
+        "job_waiting": False,
+        "staging_options": {},  # include/exclude lists etc. of the toss
+    }
+    __slots__ = tuple(defaults.keys())
+
+    def __init__(self, **values):
+        for name, default in self.defaults.items():
+            value = values.get(name, default)
+            if value is default and isinstance(default, (list, dict)):
+                value = type(default)()
+            setattr(self, name, value)
+
+    @classmethod
+    def from_job(cls, job):
+        # from Job_submission (or a legacy pickled one)
+        values = {
+            name: getattr(job, name) for name in cls.defaults if hasattr(job, name)
+        }
+        for role in ["local", "client", "server"]:
+            if values.get(f"{role}_machine_name") is None:
+                values[f"{role}_machine_name"] = getattr(
+                    job, f"{role}_machine"
+                ).name
+        return cls(**values)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def dumps(self):
+        return json.dumps(
+            {
+                "version": self.record_version,
+                "job": encode(self.to_dict()),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def loads(cls, text: str):
+        data = json.loads(text)
+        if data.get("version", 0) > cls.record_version:
+            logger.debug(
+                f"a record of version {data['version']} is read by version {cls.record_version}."
+            )
+        return cls(**decode(data["job"]))
+
+    @classmethod
+    def load(cls, path: str):
+        # returns (record, text); text tells whether a later save changes anything.
+        record_path = find_record(path)
+        if record_path.endswith(cls.legacy_name):
+            return cls.migrate(record_path)
+        with open(record_path, "r") as f:
+            text = f.read()
+        return cls.loads(text), text
+
+    @classmethod
+    def migrate(cls, legacy_path: str):
+        # a legacy pickle is rewritten once as the json record next to it.
+        try:
+            with open(legacy_path, "rb") as f:
+                record = cls.from_job(pickle.load(f))
+        except ImportError as e:
+            # e.g., numpy scalars of the pandas rows of older versions
+            module = (e.name or "numpy").split(".")[0]
+            logger.error(
+                f"{legacy_path} needs {module} to be read. Plz. install it once and run turbo-jobmanager show to convert it to {cls.record_name}."
+            )
+            raise ValueError
+        text = record.dumps()
+        record_path = os.path.join(os.path.dirname(legacy_path), cls.record_name)
+        try:
+            cls.write(record_path, text)
+            logger.info(f"{legacy_path} is converted to {record_path}.")
+        except OSError as e:
+            logger.warning(f"{legacy_path} is not converted: {e}")
+            return record, None
+        return record, text
+
+    @staticmethod
+    def write(path: str, text: str):
+        # a reader never sees a partial record.
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            f.write(text)
+        os.replace(tmp_file, path)
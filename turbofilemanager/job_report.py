@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import math
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_index import Job_index
+from turbofilemanager.job_record import Job_record
+
+logger = getLogger("file-manager").getChild(__name__)
+
+# metric -> (from event, to event) of the job timeline
+metrics = [
+    ("pending", "pending", "submitted"),  # in the local pending queue
+    ("staging", "staging_start", "staging_end"),
+    ("queue_wait", "submitted", "started"),
+    ("run_time", "started", "finished"),
+    ("fetch", "fetch_start", "fetch_end"),
+    ("turnaround", "script", "fetch_end"),
+]
+
+
+def percentile(values: list, q: float):
+    # nearest rank; values are sorted
+    if len(values) == 0:
+        return None
+    rank = max(int(math.ceil(q / 100 * len(values))), 1)
+    return values[rank - 1]
+
+
+def format_seconds(seconds: Optional[float]):
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def get_durations(events: list):
+    # metric -> seconds of a job. the last submission counts (a resubmitted
+    # job starts a new timeline), and an interrupted interval is skipped.
+    times = {}
+    for event in events:
+        times[event["event"]] = event["time"]
+    durations = {}
+    for name, start, end in metrics:
+        if start in times and end in times and times[end] >= times[start]:
+            durations[name] = (times[end] - times[start]).total_seconds()
+    return durations
+
+
+class Job_report:
+    # percentiles of the job timelines per (server, queue, package)
+    def __init__(
+        self,
+        root_dir: Optional[str] = None,
+        server_machine_name: Optional[str] = None,
+    ):
+        self.root_dir = root_dir
+        self.server_machine_name = server_machine_name
+
+    def get_groups(self):
+        # (server, queue, package) -> {metric: [seconds]}
+        job_index = Job_index()
+        rows = job_index.query(
+            server_machine=self.server_machine_name, root_dir=self.root_dir
+        )
+        job_index.close()
+        groups = {}
+        for row in rows:
+            try:
+                record, text = Job_record.load(row["pkl_path"])
+            except (OSError, EOFError, ValueError) as e:
+                logger.debug(f"{row['pkl_path']} is not readable: {e}")
+                continue
+            durations = get_durations(record.events)
+            if len(durations) == 0:
+                continue
+            key = (
+                record.server_machine_name,
+                str(record.queue),
+                str(record.package),
+            )
+            group = groups.setdefault(key, {name: [] for name, _, _ in metrics})
+            for name, seconds in durations.items():
+                group[name].append(seconds)
+        return groups
+
+    def show(self):
+        groups = self.get_groups()
+        if len(groups) == 0:
+            logger.info("No job has a recorded timeline.")
+            return groups
+        logger.info(
+            f"{'server':15s} {'queue':12s} {'package':12s} {'metric':11s} {'jobs':>5s} {'p50':>10s} {'p90':>10s} {'max':>10s}"
+        )
+        for (server, queue, package), group in sorted(groups.items()):
+            for name, _, _ in metrics:
+                values = sorted(group[name])
+                if len(values) == 0:
+                    continue
+                logger.info(
+                    f"{server:15s} {queue:12s} {package:12s} {name:11s} {len(values):5d} {format_seconds(percentile(values, 50)):>10s} {format_seconds(percentile(values, 90)):>10s} {format_seconds(values[-1]):>10s}"
+                )
+        return groups
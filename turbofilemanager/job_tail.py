@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import time
+import base64
+import pickle
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_manager import Job_submission
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+class Job_tail:
+    # the bytes appended to the output files of jobs since the last read.
+    # the offsets are kept in the job records (tail_offsets, set in the records
+    # reloaded from the disk), and the new bytes of all the files of a server
+    # are read by one remote command.
+    job_marker = "__turbo_tail__"
+    max_command_length = 100000
+    max_bytes = 1024**2  # per file and poll
+    initial_bytes = 2048  # the first read of a file starts this much before its end
+    interval = 10  # sec. between the polls of follow
+    check_every = 6  # polls between the job status checks of follow
+
+    def __init__(
+        self,
+        pkl_paths: list,
+        file_names: Optional[list] = None,
+        save_flag: bool = False,
+    ):
+        # file_names: files in the job dirs (the output_file by default)
+        # save_flag: the new bytes are appended to the local copies of the files.
+        self.file_names = file_names if file_names is not None else []
+        self.save_flag = save_flag
+        self.submissions = []
+        for pkl_path in pkl_paths:
+            try:
+                submission = Job_submission.load(pkl_path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"{pkl_path} is not readable: {e}")
+                continue
+            if submission.job_dir is None:
+                logger.warning(f"{submission.local_dir} has not been submitted.")
+                continue
+            if len(self.get_file_names(submission)) == 0:
+                logger.warning(
+                    f"{submission.local_dir} has no output_file. Plz. specify the files."
+                )
+                continue
+            self.submissions.append(submission)
+        self.partial_lines = {}  # (local dir, file) -> a line without its newline
+
+    def get_file_names(self, submission: Job_submission):
+        if len(self.file_names) > 0:
+            return self.file_names
+        if submission.output_file is None:
+            return []
+        return [submission.output_file]
+
+    def get_offset(self, submission: Job_submission, file_name: str):
+        # None: the first read
+        if self.save_flag:
+            local_file = os.path.join(submission.local_dir, file_name)
+            if os.path.isfile(local_file):
+                return os.path.getsize(local_file)
+            return 0
+        offsets = getattr(submission, "tail_offsets", None) or {}
+        return offsets.get(file_name)
+
+    def read_command(self, i: int, path: str, offset: Optional[int]):
+        # prints "marker i size offset" and the base64 of the new bytes.
+        # a missing file has the size -1. no single quotes (see run_command).
+        if offset is None:
+            offset = f"$((S > {self.initial_bytes} ? S - {self.initial_bytes} : 0))"
+        return (
+            f"S=$({{ wc -c < {path}; }} 2>/dev/null || echo -1); O={offset}; "
+            f"echo {self.job_marker} {i} $S $O; "
+            f"if [ $S -gt $O ]; then N=$((S - O)); [ $N -gt {self.max_bytes} ] && N={self.max_bytes}; "
+            f'tail -c +$((O + 1)) {path} 2>/dev/null | head -c $N | base64 | tr -d "\\n"; fi; echo'
+        )
+
+    def read_server(self, items: list):
+        # items: [(submission, file name)] on one server -> [(size, offset, bytes)]
+        server_machine = items[0][0].server_machine
+        commands = [
+            self.read_command(
+                i,
+                os.path.join(submission.job_dir, file_name),
+                self.get_offset(submission, file_name),
+            )
+            for i, (submission, file_name) in enumerate(items)
+        ]
+        batches = [[]]
+        length = 0
+        for command in commands:
+            if length + len(command) > self.max_command_length:
+                batches.append([])
+                length = 0
+            batches[-1].append(command)
+            length += len(command) + 2
+        results = [None] * len(items)
+        for batch in batches:
+            stdout, stderr = server_machine.run_command("; ".join(batch))
+            lines = stdout.split("\n")
+            for j, line in enumerate(lines[:-1]):
+                # the marker line is followed by the data line
+                fields = line.split()
+                if len(fields) != 4 or fields[0] != self.job_marker:
+                    continue
+                results[int(fields[1])] = (
+                    int(fields[2]),
+                    int(fields[3]),
+                    base64.b64decode(lines[j + 1]),
+                )
+        return results
+
+    def poll(self):
+        # one remote command per server; returns the number of new bytes.
+        server_items = {}
+        for submission in self.submissions:
+            for file_name in self.get_file_names(submission):
+                server_items.setdefault(
+                    submission.server_machine.name, []
+                ).append((submission, file_name))
+        new_bytes = 0
+        for server_name, items in server_items.items():
+            try:
+                results = self.read_server(items)
+            except Exception as e:
+                logger.warning(f"tail on {server_name} failed: {e}")
+                continue
+            for (submission, file_name), result in zip(items, results):
+                if result is None:
+                    continue
+                size, offset, data = result
+                if size < 0:
+                    logger.debug(f"{file_name} of {submission.local_dir} is not found.")
+                    continue
+                if size < offset:
+                    # truncated or rewritten; read from the beginning next time.
+                    logger.info(f"{file_name} of {submission.local_dir} is truncated.")
+                    offset = 0
+                self.write(submission, file_name, data)
+                if not self.save_flag:
+                    offsets = getattr(submission, "tail_offsets", None) or {}
+                    offsets[file_name] = offset + len(data)
+                    submission.tail_offsets = offsets
+                new_bytes += len(data)
+        if not self.save_flag:
+            self.submissions = [
+                self.reload(submission) for submission in self.submissions
+            ]
+            for submission in self.submissions:
+                submission.save()
+        return new_bytes
+
+    def reload(self, submission: Job_submission):
+        # check/watch may have updated the record since it was read; the fresh
+        # record with the offsets of this tail (the only field tail writes).
+        try:
+            record = Job_submission.load(submission.pkl_path)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            logger.warning(f"{submission.pkl_path} is not readable: {e}")
+            return submission
+        record.tail_offsets = dict(getattr(submission, "tail_offsets", None) or {})
+        return record
+
+    def write(self, submission: Job_submission, file_name: str, data: bytes):
+        if len(data) == 0:
+            return
+        if self.save_flag:
+            with open(os.path.join(submission.local_dir, file_name), "ab") as f:
+                f.write(data)
+            return
+        # complete lines only; the rest is printed with the next bytes.
+        key = (submission.local_dir, file_name)
+        text = self.partial_lines.pop(key, "") + data.decode(errors="replace")
+        lines = text.split("\n")
+        if lines[-1] != "":
+            self.partial_lines[key] = lines[-1]
+        prefix = self.get_prefix(submission.local_dir, file_name)
+        for line in lines[:-1]:
+            logger.info(f"{prefix}{line}")
+
+    def get_prefix(self, local_dir: str, file_name: str):
+        # the lines of several files are labeled by the file
+        if len(self.submissions) == 1 and len(self.file_names) <= 1:
+            return ""
+        return f"[{os.path.relpath(os.path.join(local_dir, file_name))}] "
+
+    def flush(self):
+        for (local_dir, file_name), line in sorted(self.partial_lines.items()):
+            logger.info(f"{self.get_prefix(local_dir, file_name)}{line}")
+        self.partial_lines = {}
+
+    def update_running(self):
+        # one scheduler query per server
+        self.submissions = [self.reload(submission) for submission in self.submissions]
+        server_submissions = {}
+        for submission in self.submissions:
+            server_submissions.setdefault(
+                submission.server_machine.name, []
+            ).append(submission)
+        for submissions in server_submissions.values():
+            if submissions[0].server_machine.queuing:
+                try:
+                    jobs = submissions[0].query_job_list()
+                except ValueError:
+                    continue
+            else:
+                jobs = None
+            for submission in submissions:
+                if submission.job_running:
+                    submission.update_job_running(jobs)
+        return any(submission.job_running for submission in self.submissions)
+
+    def follow(self):
+        # until all the jobs are done (one more read after that) or Ctrl-C
+        if len(self.submissions) == 0:
+            logger.info("No job to follow.")
+            return
+        num_polls = 0
+        running = any(submission.job_running for submission in self.submissions)
+        while True:
+            self.poll()
+            num_polls += 1
+            if not running:
+                break
+            time.sleep(self.interval)
+            if num_polls % self.check_every == 0:
+                running = self.update_running()
+        self.flush()
+        logger.info("All the jobs are done.")
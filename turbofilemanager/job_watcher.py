@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import fcntl
+import pickle
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+from turbofilemanager.machine_handler import Machine
+from turbofilemanager.job_manager import Job_submission
+from turbofilemanager.job_index import Job_index
+from turbofilemanager.pending_queue import Pending_queue
+from turbofilemanager.job_dag import Job_dag
+from turbofilemanager.scheduler_adapter import get_scheduler
+from turbofilemanager.queue_table import max_time_seconds
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+class Job_watcher:
+    # polls the servers of the indexed jobs, fetches finished jobs and
+    # optionally submits generated jobs. all the state is in the job index
+    # and the job records, so the watcher can be stopped and restarted anytime.
+    min_interval = 60  # sec.
+    max_interval = 1800  # sec.
+    rescan_interval = 60  # sec. for jobs tossed while watching
+    lock_file = os.path.join(file_manager_config_dir, "watch.lock")
+
+    def __init__(
+        self,
+        root_dir: Optional[str] = None,
+        server_machine_name: Optional[str] = None,
+        fetch_flag: bool = True,
+        submit_flag: bool = False,
+    ):
+        self.root_dir = root_dir
+        self.server_machine_name = server_machine_name
+        self.fetch_flag = fetch_flag
+        self.submit_flag = submit_flag
+        self.semaphores = {}  # server machine name -> asyncio.Semaphore
+        self.executor = None
+
+    def run(self, once: bool = False):
+        # only one watcher per user
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        with open(self.lock_file, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                logger.error(f"Another watch is running ({self.lock_file}).")
+                raise RuntimeError
+            try:
+                asyncio.run(self.watch(once=once))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    async def in_thread(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def get_rows(self, server_machine_name: Optional[str] = None):
+        # a connection per call; sqlite connections are not shared by threads.
+        job_index = Job_index()
+        rows = job_index.query(
+            server_machine=server_machine_name, root_dir=self.root_dir
+        )
+        job_index.close()
+        return rows
+
+    def is_watched(self, row: dict):
+        if row["state"] in {"running", "waiting"}:
+            return True
+        if row["state"] == "done" and self.fetch_flag:
+            return True
+        if row["state"] in {"generated", "pending"} and self.submit_flag:
+            return True
+        return False
+
+    async def watch(self, once: bool = False):
+        self.executor = ThreadPoolExecutor(max_workers=32)
+        tasks = {}  # server machine name -> task
+        try:
+            while True:
+                rows = await self.in_thread(
+                    self.get_rows, self.server_machine_name
+                )
+                server_names = sorted(
+                    {row["server_machine"] for row in rows if self.is_watched(row)}
+                )
+                for server_name in server_names:
+                    if server_name not in tasks or tasks[server_name].done():
+                        tasks[server_name] = asyncio.ensure_future(
+                            self.watch_server(server_name, once=once)
+                        )
+                if once:
+                    await asyncio.gather(*tasks.values())
+                    break
+                if len(server_names) == 0:
+                    logger.info("No jobs to watch.")
+                await asyncio.sleep(self.rescan_interval)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self.executor.shutdown(wait=True)
+
+    async def watch_server(self, server_name: str, once: bool = False):
+        if server_name not in self.semaphores:
+            machine = Machine(server_name)
+            self.semaphores[server_name] = asyncio.Semaphore(
+                machine.watch_concurrency
+            )
+        while True:
+            try:
+                interval = await self.poll_server(server_name)
+            except Exception as e:
+                # a daemon should survive a temporary failure of a server.
+                logger.error(f"watch of {server_name} failed: {e}")
+                interval = self.max_interval
+            if once or interval is None:
+                return
+            logger.info(f"Next poll of {server_name} in {interval:.0f}s.")
+            await asyncio.sleep(interval)
+
+    def load_submissions(self, rows: list):
+        submissions = []
+        for row in rows:
+            try:
+                submissions.append(Job_submission.load(row["pkl_path"]))
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"{row['pkl_path']} is not readable: {e}")
+        return submissions
+
+    async def poll_server(self, server_name: str):
+        # one cycle; returns the next interval, or None if nothing is left.
+        rows = await self.in_thread(self.get_rows, server_name)
+        running = await self.in_thread(
+            self.load_submissions,
+            [row for row in rows if row["state"] == "running"],
+        )
+
+        still_running = []
+        if len(running) > 0:
+            server_machine = running[0].server_machine
+            if server_machine.queuing:
+                jobs = await self.in_thread(
+                    get_scheduler(server_machine).query
+                )
+            else:
+                jobs = None
+            for submission in running:
+                if await self.in_thread(submission.update_job_running, jobs):
+                    still_running.append(submission)
+            logger.info(
+                f"{len(still_running)}/{len(running)} jobs are running on {server_name}."
+            )
+
+        if self.fetch_flag:
+            rows = await self.in_thread(self.get_rows, server_name)
+            finished = await self.in_thread(
+                self.load_submissions,
+                [row for row in rows if row["state"] == "done"],
+            )
+            await asyncio.gather(
+                *[self.fetch(submission) for submission in finished]
+            )
+
+        # pipelines; the waiting jobs whose predecessors have finished.
+        job_dag = Job_dag(root_dir=self.root_dir, server_machine_name=server_name)
+        async with self.semaphores[server_name]:
+            still_running += await self.in_thread(job_dag.advance)
+        waiting = await self.in_thread(job_dag.get_rows)
+
+        pending = []
+        if self.submit_flag:
+            rows = await self.in_thread(self.get_rows, server_name)
+            generated = await self.in_thread(
+                self.load_submissions,
+                [row for row in rows if row["state"] == "generated"],
+            )
+            for submission in generated:
+                submitted = await self.submit(submission)
+                if submitted:
+                    still_running.append(submission)
+            # jobs over MAX_JOB_SUBMIT/MAX_JOB_RUN are tried in the next cycle.
+            pending_queue = Pending_queue(
+                root_dir=self.root_dir, server_machine_name=server_name
+            )
+            async with self.semaphores[server_name]:
+                still_running += await self.in_thread(pending_queue.submit)
+            pending = await self.in_thread(pending_queue.get_rows)
+
+        if len(still_running) == 0 and len(pending) == 0 and len(waiting) == 0:
+            return None
+        return self.poll_interval(still_running)
+
+    async def fetch(self, submission: Job_submission):
+        async with self.semaphores[submission.server_machine.name]:
+            logger.info(
+                f"Fetching job {submission.job_number} to {submission.local_dir}."
+            )
+            try:
+                await self.in_thread(submission.fetch_job)
+            except Exception as e:
+                logger.error(f"fetch to {submission.local_dir} failed: {e}")
+
+    async def submit(self, submission: Job_submission):
+        async with self.semaphores[submission.server_machine.name]:
+            try:
+                submitted, job_number = await self.in_thread(
+                    submission.job_submit
+                )
+            except Exception as e:
+                logger.error(
+                    f"submission from {submission.local_dir} failed: {e}"
+                )
+                return False
+            if submitted:
+                logger.info(
+                    f"job {job_number} is submitted from {submission.local_dir}."
+                )
+            return submitted
+
+    def poll_interval(self, submissions: list):
+        # young jobs and jobs close to their max_time are polled often.
+        if len(submissions) == 0:
+            return self.min_interval
+        now = datetime.today()
+        intervals = []
+        for submission in submissions:
+            if submission.job_submit_date is None:
+                intervals.append(self.min_interval)
+                continue
+            age = (now - submission.job_submit_date).total_seconds()
+            interval = age / 4
+            max_time = max_time_seconds(submission.max_time)
+            if max_time is not None:
+                interval = min(interval, max(max_time - age, 0))
+            intervals.append(interval)
+        return min(max(min(intervals), self.min_interval), self.max_interval)
@@ -3,6 +3,10 @@
 # import python modules
 import os
 import time
+import stat
+import heapq
+import hashlib
+import tempfile
 from typing import Optional
 
 import yaml
@@ -20,6 +24,14 @@ from file_manager_env import (
     file_manager_config_dir,
     machine_handler_env_template_dir,
 )
+from turbofilemanager.checksum_handler import Checksum_cache, get_checksums
+from turbofilemanager.transfer_filter import Transfer_filter, escape_pattern
+from turbofilemanager.transfer_planner import (
+    Transfer_plan,
+    Transfer_planner,
+    Transfer_stats,
+)
+from turbofilemanager.transfer_journal import Transfer_journal
 
 logger = getLogger("file-manager").getChild(__name__)
 
@@ -28,6 +40,8 @@ class Machine:
 
     ssh_retry_time = 3600
     ssh_retry_max_num = 10
+    pipe_block_size = 64 * 1024  # bytes relayed at once by local_run_pipe
+    pack_prefix = ".turbo-pack-"  # the archives of pack_transfer, never listed
 
     def __init__(self, machine: str):
         self.machine_info_yaml = os.path.join(
@@ -84,6 +98,14 @@ class Machine:
             logger.error(self.machine_info_yaml)
             raise KeyError
 
+    def get_optional_value(self, key: str, default=None):
+        # "None" in machine_data.yaml is read as a string by yaml; it means None
+        # as it does for username.
+        value = self.data.get(key, default)
+        if isinstance(value, str) and value.strip().lower() in {"none", "null"}:
+            return None
+        return value
+
     @property
     def name(self):
         return self.__name
@@ -164,6 +186,144 @@ class Machine:
         key = "jobnum_index"
         return self.get_value(key=key)
 
+    @property
+    def scheduler(self):
+        key = "scheduler"
+        # optional key. pbs, slurm, ps or generic. inferred from jobcheck by default.
+        value = self.data.get(key)
+        if value is None:
+            jobcheck = str(self.data.get("jobcheck", "")).split()
+            command = os.path.basename(jobcheck[0]) if jobcheck else ""
+            value = {"squeue": "slurm", "ps": "ps"}.get(command, "generic")
+        return value
+
+    @property
+    def scheduler_cache_ttl(self):
+        key = "scheduler_cache_ttl"
+        # optional key. seconds for which a job status query is reused.
+        value = self.data.get(key, 30)
+        if value is None:
+            return 0
+        return float(value)
+
+    @property
+    def watch_concurrency(self):
+        key = "watch_concurrency"
+        # optional key. concurrent fetches and submissions of turbo-jobmanager watch.
+        value = self.data.get(key, 2)
+        if value is None:
+            return 1
+        return max(int(value), 1)
+
+    @property
+    def scheduler_columns(self):
+        key = "scheduler_columns"
+        # optional key for the generic scheduler. e.g. {id: 0, owner: 2, state: 4, queue: 5}
+        value = self.data.get(key, {})
+        if value is None:
+            return {}
+        return dict(value)
+
+    @property
+    def scheduler_finished_states(self):
+        key = "scheduler_finished_states"
+        # optional key for the generic scheduler. e.g. [C, F]
+        value = self.data.get(key, [])
+        if value is None:
+            return []
+        return [str(v) for v in value]
+
+    @property
+    def scheduler_running_states(self):
+        key = "scheduler_running_states"
+        # optional key for the generic scheduler. e.g. [R]
+        value = self.data.get(key, [])
+        if value is None:
+            return []
+        return [str(v) for v in value]
+
+    @property
+    def exclude_list(self):
+        key = "exclude_list"
+        # optional key. default exclude patterns of this machine.
+        value = self.data.get(key, [])
+        if value is None:
+            return []
+        return list(value)
+
+    @property
+    def chunked_threshold(self):
+        key = "chunked_threshold"
+        # optional key [bytes]. A larger file is transferred in chunks.
+        # None switches off the chunked transfer.
+        return self.get_optional_value(key, 10 * 1024**3)
+
+    @property
+    def chunk_streams(self):
+        key = "chunk_streams"
+        # optional key. the number of concurrent streams of a chunked transfer.
+        return self.data.get(key, 4)
+
+    @property
+    def transfer_streams(self):
+        key = "transfer_streams"
+        # optional key. the number of concurrent rsync streams of a sharded transfer.
+        return self.data.get(key, 4)
+
+    @property
+    def transfer_strategy(self):
+        key = "transfer_strategy"
+        # optional key. the strategy of the directory transfers with this machine.
+        # auto lists the tree to plan it; rsync skips the listing.
+        return self.data.get(key, "auto")
+
+    @property
+    def ssh_control_persist(self):
+        key = "ssh_control_persist"
+        # optional key [sec.]. the ssh connections to this machine share a master
+        # connection (ControlMaster) kept open for this time after the last use.
+        # None switches it off.
+        return self.get_optional_value(key, 600)
+
+    @property
+    def ssh_command(self):
+        # ssh with the connection sharing options (also given to rsync -e)
+        if self.ssh_control_persist is None:
+            return "ssh"
+        # the sockets are in the user's config dir, not in a shared /tmp.
+        control_dir = os.path.join(file_manager_config_dir, "ssh")
+        os.makedirs(control_dir, mode=0o700, exist_ok=True)
+        os.chmod(control_dir, 0o700)
+        return f"ssh -o ControlMaster=auto -o ControlPath={control_dir}/%C -o ControlPersist={int(self.ssh_control_persist)}"
+
+    @property
+    def rsync_ssh_option(self):
+        if self.ssh_control_persist is None:
+            return ""
+        return f' -e "{self.ssh_command}"'
+
+    @property
+    def fetch_concurrency(self):
+        key = "fetch_concurrency"
+        # optional key. concurrent fetches from this machine of fetch --all / -id.
+        value = self.get_optional_value(key, 4)
+        if value is None:
+            return 1
+        return max(int(value), 1)
+
+    @property
+    def pack_threshold(self):
+        key = "pack_threshold"
+        # optional key. when so many files are fetched from this machine, they
+        # are packed into one archive on it first. None switches it off.
+        return self.get_optional_value(key, 1000)
+
+    @property
+    def checksum(self):
+        key = "checksum"
+        # optional key. md5 (md5sum) is available almost everywhere.
+        return self.data.get(key, "md5")
+
     def get_job_list(self):
         command = f"{self.jobcheck}"
         stdout, stderr = self.run_command(command)
@@ -178,6 +338,118 @@ class Machine:
         stdout, stderr = self.run_command(command)
         return stdout.split("\n")
 
+    def list_files(
+        self,
+        object_name: str,
+        dir_listing: bool = True,
+        transfer_filter: Optional[Transfer_filter] = None,
+        dir_list: Optional[list] = None,
+    ):
+        # {relative path: (size, mtime)} of the regular files in object_name.
+        # if dir_listing is False, object_name is a file and the key is its basename.
+        # the relative paths of the dirs are appended to dir_list if it is given.
+        assert pathlib.Path(object_name).is_absolute()
+        file_stats = {}
+        if self.machine_type == "local":
+            if dir_listing:
+                if transfer_filter is None:
+                    transfer_filter = Transfer_filter()
+                for rel_dir, dir_entries, file_entries in transfer_filter.walk(
+                    object_name
+                ):
+                    if dir_list is not None and rel_dir:
+                        dir_list.append(rel_dir)
+                    for entry in file_entries:
+                        if entry.name.startswith(self.pack_prefix):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                        if stat.S_ISREG(st.st_mode):
+                            file_stats[os.path.join(rel_dir, entry.name)] = (
+                                st.st_size,
+                                st.st_mtime,
+                            )
+            else:
+                st = os.stat(object_name)
+                file_stats[os.path.basename(object_name)] = (
+                    st.st_size,
+                    st.st_mtime,
+                )
+        else:
+            if dir_listing and dir_list is not None:
+                # the dirs are printed with the size "d".
+                command = f'cd {object_name} 2>/dev/null && find . \\( -type f -printf "%s %T@ %p\\n" \\) -o \\( -type d -printf "d 0 %p\\n" \\) 2>/dev/null'
+            elif dir_listing:
+                command = f'cd {object_name} 2>/dev/null && find . -type f -printf "%s %T@ %p\\n" 2>/dev/null'
+            else:
+                command = f'find {object_name} -maxdepth 0 -type f -printf "%s %T@ %f\\n" 2>/dev/null'
+            stdout, stderr = self.run_command(command)
+            for line in stdout.split("\n"):
+                buf = line.split(" ", 2)
+                if len(buf) != 3:
+                    continue
+                size, mtime, path = buf
+                if path.startswith("./"):
+                    path = path[2:]
+                if os.path.basename(path).startswith(self.pack_prefix):
+                    continue
+                if size == "d":
+                    if path != "." and (
+                        transfer_filter is None
+                        or transfer_filter.is_included(path, is_dir=True)
+                    ):
+                        dir_list.append(path)
+                    continue
+                if dir_listing and transfer_filter is not None:
+                    if not transfer_filter.is_included(path):
+                        continue
+                file_stats[path] = (int(size), float(mtime))
+        logger.debug(f"{len(file_stats)} files are found in {object_name}.")
+        return file_stats
+
+    def get_checksums(
+        self,
+        dir_name: str,
+        rel_paths: list,
+        checksum_command: str = "md5sum",
+        whole_tree: bool = False,
+        max_command_length: int = 100000,
+    ):
+        # batched checksum command(s) executed in dir_name.
+        assert pathlib.Path(dir_name).is_absolute()
+        if whole_tree:
+            commands = [
+                f"find . -type f -exec {checksum_command} {{}} + 2>/dev/null"
+            ]
+        else:
+            commands = []
+            batch = []
+            length = 0
+            for rel_path in rel_paths:
+                batch.append(f'"{rel_path}"')
+                length += len(rel_path) + 3
+                if length > max_command_length:
+                    commands.append(f"{checksum_command} {' '.join(batch)}")
+                    batch = []
+                    length = 0
+            if len(batch) > 0:
+                commands.append(f"{checksum_command} {' '.join(batch)}")
+
+        checksums = {}
+        for command in commands:
+            stdout, stderr = self.run_command(command, execute_dir=dir_name)
+            for line in stdout.split("\n"):
+                buf = line.split(None, 1)
+                if len(buf) != 2:
+                    continue
+                digest, path = buf
+                path = path.lstrip("*")
+                if path.startswith("./"):
+                    path = path[2:]
+                if os.path.basename(path).startswith(self.pack_prefix):
+                    continue
+                checksums[path] = digest
+        return checksums
+
     @staticmethod
     def local_run_command(command, execute_dir: Optional[str] = None):
         if execute_dir is None:
@@ -193,19 +465,81 @@ class Machine:
         )
         return proc.stdout, proc.stderr
 
+    @staticmethod
+    def local_run_pipe(
+        from_command: str,
+        to_command: str,
+        bwlimit: Optional[int] = None,
+        stdin_file: Optional[str] = None,
+    ):
+        # from_command | to_command, the bytes between them are relayed here at
+        # most bwlimit KB/s (as rsync --bwlimit). returns (bytes, stderr of both).
+        logger.debug(f"command = {from_command} | {to_command}")
+        rate = bwlimit * 1024 if bwlimit else None
+        copied = 0
+        with tempfile.TemporaryFile() as from_err, tempfile.TemporaryFile() as to_err:
+            stdin = subprocess.DEVNULL
+            if stdin_file is not None:
+                stdin = open(stdin_file, "rb")
+            to_proc = subprocess.Popen(
+                to_command,
+                shell=True,
+                stdin=PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=to_err,
+            )
+            from_proc = subprocess.Popen(
+                from_command,
+                shell=True,
+                stdin=stdin,
+                stdout=PIPE,
+                stderr=from_err,
+            )
+            start_time = time.time()
+            try:
+                while True:
+                    data = from_proc.stdout.read(Machine.pipe_block_size)
+                    if not data:
+                        break
+                    to_proc.stdin.write(data)
+                    copied += len(data)
+                    if rate is not None:
+                        delay = copied / rate - (time.time() - start_time)
+                        if delay > 0:
+                            time.sleep(delay)
+            except BrokenPipeError:
+                logger.debug(f"{to_command} exited before the end of the data.")
+            finally:
+                from_proc.stdout.close()
+                try:
+                    to_proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                from_proc.wait()
+                to_proc.wait()
+                if stdin_file is not None:
+                    stdin.close()
+            from_err.seek(0)
+            to_err.seek(0)
+            stderr = (from_err.read() + to_err.read()).decode(errors="replace")
+        for command, proc in [(from_command, from_proc), (to_command, to_proc)]:
+            if proc.returncode != 0 and not stderr:
+                stderr = f"{command} exited with {proc.returncode}."
+        return copied, stderr
+
     def run_command(self, command, execute_dir: Optional[str] = None):
         trial_num = 10
         jjj = 0
         while True:
             if execute_dir is None:
                 if self.machine_type == "remote":
-                    command_r = f"ssh {self.username}@{self.ip} '{command}'"
+                    command_r = f"{self.ssh_command} {self.username}@{self.ip} '{command}'"
                 else:
                     command_r = f"{command}"
             else:
                 if self.machine_type == "remote":
                     assert pathlib.Path(execute_dir).is_absolute()
-                    command_r = f"ssh {self.username}@{self.ip} 'cd {execute_dir}; {command}'"
+                    command_r = f"{self.ssh_command} {self.username}@{self.ip} 'cd {execute_dir}; {command}'"
                 else:
                     if not os.path.isdir(execute_dir):
                         logger.error(f"{execute_dir} is not found.")
@@ -320,7 +654,7 @@ class Machine:
                 logger.debug(
                     f"is_alive trial {tt + 1}/{self.ssh_retry_max_num}"
                 )
-                command = f"ssh {self.username}@{self.ip} 'ls -la > /dev/null'; echo $?"
+                command = f"{self.ssh_command} {self.username}@{self.ip} 'ls -la > /dev/null'; echo $?"
                 # command = f"ssh nazo-computer 'ls -la > /dev/null'; echo $?"
                 logger.debug(f"command = {command}")
                 proc = subprocess.run(
@@ -344,6 +678,10 @@ class Machine:
 
 
 class Machines_handler:
+
+    chunk_block_size = 1024**2  # bytes
+    chunk_retry_max_num = 3
+
     def __init__(
         self,
         client_machine_name: str,
@@ -354,6 +692,7 @@ class Machines_handler:
         self.client_machine = Machine(client_machine_name)
         self.server_machine = Machine(server_machine_name)
         self.safe_mode = safe_mode
+        self.transferred_bytes = 0  # by the planned transfers of this handler
         logger.debug(self.client_machine)
         logger.debug(self.server_machine)
 
@@ -374,6 +713,10 @@ class Machines_handler:
         dryrun_flag: bool = False,
         delete_flag: bool = False,
         bwlimit: int = 1000,
+        verify_flag: bool = False,
+        resend_flag: bool = False,
+        strategy: str = "auto",
+        journal: Optional[Transfer_journal] = None,
     ):
         if include_list is None:
             include_list = []
@@ -390,6 +733,10 @@ class Machines_handler:
             dryrun_flag=dryrun_flag,
             delete_flag=delete_flag,
             bwlimit=bwlimit,
+            verify_flag=verify_flag,
+            resend_flag=resend_flag,
+            strategy=strategy,
+            journal=journal,
         )
 
     def put_dir(
@@ -401,6 +748,10 @@ class Machines_handler:
         dryrun_flag: bool = False,
         delete_flag: bool = False,
         bwlimit: int = 1000,
+        verify_flag: bool = False,
+        resend_flag: bool = False,
+        strategy: str = "auto",
+        journal: Optional[Transfer_journal] = None,
     ):
         if include_list is None:
             include_list = []
@@ -417,6 +768,10 @@ class Machines_handler:
             dryrun_flag=dryrun_flag,
             delete_flag=delete_flag,
             bwlimit=bwlimit,
+            verify_flag=verify_flag,
+            resend_flag=resend_flag,
+            strategy=strategy,
+            journal=journal,
         )
 
     def get(
@@ -428,6 +783,10 @@ class Machines_handler:
         dryrun_flag: bool = False,
         delete_flag: bool = False,
         bwlimit: int = 1000,
+        verify_flag: bool = False,
+        resend_flag: bool = False,
+        strategy: str = "auto",
+        journal: Optional[Transfer_journal] = None,
     ):
         if include_list is None:
             include_list = []
@@ -444,6 +803,10 @@ class Machines_handler:
             dryrun_flag=dryrun_flag,
             delete_flag=delete_flag,
             bwlimit=bwlimit,
+            verify_flag=verify_flag,
+            resend_flag=resend_flag,
+            strategy=strategy,
+            journal=journal,
         )
 
     def get_dir(
@@ -455,6 +818,10 @@ class Machines_handler:
         dryrun_flag: bool = False,
         delete_flag: bool = False,
         bwlimit: int = 1000,
+        verify_flag: bool = False,
+        resend_flag: bool = False,
+        strategy: str = "auto",
+        journal: Optional[Transfer_journal] = None,
     ):
         if include_list is None:
             include_list = []
@@ -471,6 +838,10 @@ class Machines_handler:
             dryrun_flag=dryrun_flag,
             delete_flag=delete_flag,
             bwlimit=bwlimit,
+            verify_flag=verify_flag,
+            resend_flag=resend_flag,
+            strategy=strategy,
+            journal=journal,
         )
 
     # core object transfer method
@@ -486,6 +857,10 @@ class Machines_handler:
         dryrun_flag: bool = False,
         delete_flag: bool = False,
         bwlimit: int = 1000,
+        verify_flag: bool = False,
+        resend_flag: bool = False,
+        strategy: str = "auto",
+        journal: Optional[Transfer_journal] = None,
     ):
         if include_list is None:
             include_list = []
@@ -506,11 +881,14 @@ class Machines_handler:
             f"makedir {os.path.dirname(to_object)} on {to_machine.name}"
         )
         to_dir = os.path.dirname(to_object)
-        command = f"mkdir -p {to_dir}"
-        to_machine.run_command(command)
-        if not to_machine.is_dir(dir_name=to_dir):
+        # one round trip; it also tells whether the dest dir exists (transfer plan).
+        command = f"mkdir -p {to_dir} 2>/dev/null; test -d {to_dir} && echo to_dir; test -d {to_object} && echo to_object"
+        stdout, stderr = to_machine.run_command(command)
+        if "to_dir" not in stdout.split():
             logger.error(f"{to_dir} is not created.")
             raise FileNotFoundError
+        dest_exists = "to_object" in stdout.split()
+        transfer_filter = None
 
         if (
             from_machine.machine_type == "local"
@@ -524,6 +902,92 @@ class Machines_handler:
             from_machine.machine_type == "remote"
             and to_machine.machine_type == "local"
         ):
+            if from_machine.machine_type == "remote":
+                remote_machine = from_machine
+            else:
+                remote_machine = to_machine
+            # chunked transfer of a huge file
+            if not dir_transfer and not dryrun_flag:
+                chunked_threshold = remote_machine.chunked_threshold
+                if chunked_threshold is not None:
+                    file_stats = from_machine.list_files(
+                        object_name=from_object, dir_listing=False
+                    )
+                    if len(file_stats) == 1:
+                        file_size, mtime = list(file_stats.values())[0]
+                        if file_size >= chunked_threshold:
+                            self.chunked_transfer(
+                                from_machine=from_machine,
+                                from_object=from_object,
+                                to_machine=to_machine,
+                                to_object=to_object,
+                                file_size=file_size,
+                                mtime=mtime,
+                                bwlimit=bwlimit,
+                            )
+                            return
+
+            transfer_filter = self.get_transfer_filter(
+                from_machine=from_machine,
+                from_object=from_object,
+                to_machine=to_machine,
+                to_object=to_object,
+                dir_transfer=dir_transfer,
+                include_list=include_list,
+                exclude_list=exclude_list,
+            )
+
+            # transfer strategy of a directory
+            if strategy == "auto":
+                strategy = remote_machine.transfer_strategy
+            plan = None
+            if dir_transfer and strategy != "rsync":
+                plan = self.plan_transfer(
+                    from_machine=from_machine,
+                    from_object=from_object,
+                    to_machine=to_machine,
+                    to_object=to_object,
+                    transfer_filter=transfer_filter,
+                    delete_flag=delete_flag,
+                    strategy=strategy,
+                    dest_exists=dest_exists,
+                )
+                logger.info(plan)
+                if dryrun_flag:
+                    logger.info("The plan is not executed in a dry run.")
+                elif plan.strategy != "rsync" and self.execute_plan(
+                    plan=plan,
+                    from_machine=from_machine,
+                    from_object=from_object,
+                    to_machine=to_machine,
+                    to_object=to_object,
+                    bwlimit=bwlimit,
+                    journal=journal,
+                ):
+                    if verify_flag:
+                        self.verify_transfer(
+                            from_machine=from_machine,
+                            from_object=from_object,
+                            to_machine=to_machine,
+                            to_object=to_object,
+                            dir_transfer=dir_transfer,
+                            include_list=include_list,
+                            exclude_list=exclude_list,
+                            resend_flag=resend_flag,
+                            bwlimit=bwlimit,
+                            transfer_filter=transfer_filter,
+                        )
+                    return
+                else:
+                    if plan.strategy != "rsync":
+                        # rsync completes what the failed strategy has left.
+                        logger.warning(
+                            f"{plan.strategy} transfer failed; falling back to rsync."
+                        )
+                    for rel_path in plan.large_file_stats:
+                        transfer_filter.add_exclude(f"/{escape_pattern(rel_path)}")
+            start_time = time.time()
+
             # rsync
             if (
                 from_machine.machine_type == "local"
@@ -533,68 +997,89 @@ class Machines_handler:
                     f"Transfer data from local machine ({from_machine.name}) to remote machine ({to_machine.name}) using rsync."
                 )
                 if dir_transfer:  # dir
-                    rsync_command = f"rsync --bwlimit {bwlimit} -avz {from_object}/ {to_machine.username}@{to_machine.ip}:{to_object}"
+                    rsync_command = f"rsync --bwlimit {bwlimit} -avz{to_machine.rsync_ssh_option} {from_object}/ {to_machine.username}@{to_machine.ip}:{to_object}"
                 else:  # file
-                    rsync_command = f"rsync --bwlimit {bwlimit} -avz {from_object} {to_machine.username}@{to_machine.ip}:{to_object}"
+                    rsync_command = f"rsync --bwlimit {bwlimit} -avz{to_machine.rsync_ssh_option} {from_object} {to_machine.username}@{to_machine.ip}:{to_object}"
             else:
                 logger.info(
                     f"Transfer data from remote machine ({from_machine.name}) to local machine ({to_machine.name}) using rsync."
                 )
                 if dir_transfer:  # dir
-                    rsync_command = f"rsync --bwlimit {bwlimit} -avz {from_machine.username}@{from_machine.ip}:{from_object}/ {to_object}"
+                    rsync_command = f"rsync --bwlimit {bwlimit} -avz{from_machine.rsync_ssh_option} {from_machine.username}@{from_machine.ip}:{from_object}/ {to_object}"
                 else:  # file
-                    rsync_command = f"rsync --bwlimit {bwlimit} -avz {from_machine.username}@{from_machine.ip}:{from_object} {to_object}"
+                    rsync_command = f"rsync --bwlimit {bwlimit} -avz{from_machine.rsync_ssh_option} {from_machine.username}@{from_machine.ip}:{from_object} {to_object}"
 
             logger.info(f"From:: {from_object}")
             logger.info(f"To:: {to_object}")
             if dryrun_flag:
                 rsync_command += " -n"
-            if len(include_list) > 0:
-                # rsync_command += f" --include='*/'"
-                for include in include_list:
-                    rsync_command += f" --include='{include}'"
-                    rsync_command += f" --include='{include}/*'"
-                if len(exclude_list) == 0:
-                    rsync_command += " --exclude='*'"
-            if len(exclude_list) > 0:
-                for exclude in exclude_list:
-                    rsync_command += f" --exclude='{exclude}'"
+            filter_file = None
+            if not transfer_filter.is_empty:
+                filter_file = transfer_filter.write_rsync_filter()
+                rsync_command += f" --filter='merge {filter_file}'"
+                if transfer_filter.prune_empty_dirs:
+                    rsync_command += " --prune-empty-dirs"
             if delete_flag:
                 rsync_command += " --delete"
             logger.info(f"rsync_command = {rsync_command}")
-            stdout, stderr = Machine.local_run_command(command=rsync_command)
-            logger.info("")
-            logger.info("==Start:: stdout of the rsync command==")
-            logger.info(stdout)
-            logger.info("==End:: stdout of the rsync command==")
-            logger.info("")
+            try:
+                stdout, stderr = Machine.local_run_command(command=rsync_command)
+                logger.info("")
+                logger.info("==Start:: stdout of the rsync command==")
+                logger.info(stdout)
+                logger.info("==End:: stdout of the rsync command==")
+                logger.info("")
 
-            # special treatment for remote-to-local transfer because it sometimes fails.
-            if (
-                from_machine.machine_type == "remote"
-                and to_machine.machine_type == "local"
-            ):
-                for tt in range(from_machine.ssh_retry_max_num):
-                    logger.debug(
-                        f"exist trial {tt + 1}/{from_machine.ssh_retry_max_num}"
-                    )
-                    if to_machine.exist(object_name=to_object):
-                        return
-                    logger.error(f"{to_object} is not found!!")
-                    logger.info(
-                        f"Waiting for {from_machine.ssh_retry_time} sec..."
-                    )
-                    time.sleep(from_machine.ssh_retry_time)
-                    stdout, stderr = Machine.local_run_command(
-                        command=rsync_command
-                    )
-                    logger.info("")
-                    logger.info("==Start:: stdout of the rsync command==")
-                    logger.info(stdout)
-                    logger.info("==End:: stdout of the rsync command==")
-                    logger.info("")
-                logger.warning(
-                    f"Trial exceeds the max num = {from_machine.ssh_retry_max_num}"
+                # special treatment for remote-to-local transfer because it sometimes fails.
+                if (
+                    from_machine.machine_type == "remote"
+                    and to_machine.machine_type == "local"
+                ):
+                    for tt in range(from_machine.ssh_retry_max_num):
+                        logger.debug(
+                            f"exist trial {tt + 1}/{from_machine.ssh_retry_max_num}"
+                        )
+                        if to_machine.exist(object_name=to_object):
+                            break
+                        logger.error(f"{to_object} is not found!!")
+                        logger.info(
+                            f"Waiting for {from_machine.ssh_retry_time} sec..."
+                        )
+                        time.sleep(from_machine.ssh_retry_time)
+                        stdout, stderr = Machine.local_run_command(
+                            command=rsync_command
+                        )
+                        logger.info("")
+                        logger.info("==Start:: stdout of the rsync command==")
+                        logger.info(stdout)
+                        logger.info("==End:: stdout of the rsync command==")
+                        logger.info("")
+                    else:
+                        logger.warning(
+                            f"Trial exceeds the max num = {from_machine.ssh_retry_max_num}"
+                        )
+            finally:
+                if filter_file is not None:
+                    os.remove(filter_file)
+
+            if plan is not None and not dryrun_flag:
+                self.transferred_bytes += plan.total_size
+                Transfer_stats().record(
+                    from_name=from_machine.name,
+                    to_name=to_machine.name,
+                    strategy="rsync",
+                    file_count=plan.file_count,
+                    total_size=plan.total_size,
+                    duration=time.time() - start_time,
+                )
+                self.transfer_large_files(
+                    plan=plan,
+                    from_machine=from_machine,
+                    from_object=from_object,
+                    to_machine=to_machine,
+                    to_object=to_object,
+                    bwlimit=bwlimit,
+                    journal=journal,
                 )
 
         elif (
@@ -635,6 +1120,719 @@ class Machines_handler:
         else:
             raise NotImplementedError
 
+        if verify_flag and not dryrun_flag:
+            if (
+                from_machine.machine_type == "local"
+                and to_machine.machine_type == "local"
+            ):
+                logger.debug("No verification is needed.")
+            else:
+                self.verify_transfer(
+                    from_machine=from_machine,
+                    from_object=from_object,
+                    to_machine=to_machine,
+                    to_object=to_object,
+                    dir_transfer=dir_transfer,
+                    include_list=include_list,
+                    exclude_list=exclude_list,
+                    resend_flag=resend_flag,
+                    bwlimit=bwlimit,
+                    transfer_filter=transfer_filter,
+                )
+
+    def get_transfer_filter(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        dir_transfer: bool = False,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+    ):
+        # .turboignore files are read on the local side of the transfer.
+        local_root = None
+        if dir_transfer:
+            if from_machine.machine_type == "local":
+                local_root = from_object
+            elif to_machine.machine_type == "local":
+                local_root = to_object
+        return Transfer_filter(
+            include_list=include_list,
+            exclude_list=exclude_list,
+            default_exclude_list=from_machine.exclude_list
+            + to_machine.exclude_list
+            + [f"{Machine.pack_prefix}*"],
+            local_root=local_root,
+        )
+
+    def plan_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        transfer_filter: Optional[Transfer_filter] = None,
+        delete_flag: bool = False,
+        strategy: str = "auto",
+        dest_exists: Optional[bool] = None,
+    ):
+        # the source tree is listed once (one find command on a remote machine).
+        if strategy in {"tar", "sharded"} and delete_flag:
+            logger.error(f"{strategy} cannot delete files; use rsync with -delete.")
+            raise ValueError
+        if from_machine.machine_type == "remote":
+            remote_machine = from_machine
+        else:
+            remote_machine = to_machine
+        dir_list = []
+        file_stats = from_machine.list_files(
+            object_name=from_object,
+            dir_listing=True,
+            transfer_filter=transfer_filter,
+            dir_list=dir_list,
+        )
+        planner = Transfer_planner(
+            from_machine=from_machine,
+            to_machine=to_machine,
+            num_streams=remote_machine.transfer_streams,
+        )
+        if dest_exists is None:
+            dest_exists = to_machine.is_dir(dir_name=to_object)
+        # pack is for a fetch; the local dest is listed to pack only the changed files.
+        pack_flag = (
+            from_machine.machine_type == "remote"
+            and to_machine.machine_type == "local"
+        )
+        dest_stats = None
+        if pack_flag and dest_exists:
+            dest_stats = to_machine.list_files(
+                object_name=to_object, dir_listing=True
+            )
+        pack_threshold = None
+        if pack_flag:
+            pack_threshold = 0 if strategy == "pack" else from_machine.pack_threshold
+        plan = planner.plan(
+            file_stats=file_stats,
+            dest_exists=dest_exists,
+            delete_flag=delete_flag,
+            chunked_threshold=remote_machine.chunked_threshold,
+            pack_threshold=pack_threshold,
+            dest_stats=dest_stats,
+        )
+        if strategy == "pack":
+            if plan.strategy != "pack":
+                logger.error(
+                    "pack is possible only from a remote machine to the local machine without -delete."
+                )
+                raise ValueError
+            plan.reason = f"pack is requested ({plan.file_count} changed files)"
+        if strategy not in {"auto", plan.strategy}:
+            plan.reason = f"{strategy} is requested (auto: {plan.reason})"
+            plan.strategy = strategy
+            if strategy == "sharded":
+                plan.num_streams = planner.num_streams
+            else:
+                plan.num_streams = 1
+        # tar and sharded send only the listed files; the empty dirs are added
+        # unless rsync would prune them (an include list).
+        if transfer_filter is None or not transfer_filter.prune_empty_dirs:
+            parent_dirs = {os.path.dirname(path) for path in file_stats}
+            parent_dirs |= {os.path.dirname(path) for path in dir_list}
+            plan.empty_dirs = [path for path in dir_list if path not in parent_dirs]
+        return plan
+
+    def execute_plan(
+        self,
+        plan: Transfer_plan,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        bwlimit: int = 1000,
+        journal: Optional[Transfer_journal] = None,
+    ):
+        # returns False if the strategy failed; the stats are not recorded then.
+        start_time = time.time()
+        if plan.strategy == "tar":
+            success = self.tar_transfer(
+                from_machine=from_machine,
+                from_object=from_object,
+                to_machine=to_machine,
+                to_object=to_object,
+                rel_paths=list(plan.file_stats),
+                bwlimit=bwlimit,
+                empty_dirs=plan.empty_dirs,
+            )
+        elif plan.strategy == "pack":
+            self.pack_transfer(
+                from_machine=from_machine,
+                from_object=from_object,
+                to_machine=to_machine,
+                to_object=to_object,
+                rel_paths=list(plan.file_stats),
+                bwlimit=bwlimit,
+                journal=journal,
+            )
+            success = True
+        elif plan.strategy == "sharded":
+            success = self.sharded_transfer(
+                from_machine=from_machine,
+                from_object=from_object,
+                to_machine=to_machine,
+                to_object=to_object,
+                file_stats=plan.file_stats,
+                num_streams=plan.num_streams,
+                bwlimit=bwlimit,
+                journal=journal,
+                empty_dirs=plan.empty_dirs,
+            )
+        else:
+            logger.error(f"strategy={plan.strategy} is not implemented.")
+            raise NotImplementedError
+        if not success:
+            return False
+        self.transferred_bytes += plan.total_size
+        Transfer_stats().record(
+            from_name=from_machine.name,
+            to_name=to_machine.name,
+            strategy=plan.strategy,
+            file_count=plan.file_count,
+            total_size=plan.total_size,
+            duration=time.time() - start_time,
+            num_streams=plan.num_streams,
+        )
+        self.transfer_large_files(
+            plan=plan,
+            from_machine=from_machine,
+            from_object=from_object,
+            to_machine=to_machine,
+            to_object=to_object,
+            bwlimit=bwlimit,
+            journal=journal,
+        )
+        return True
+
+    def transfer_large_files(
+        self,
+        plan: Transfer_plan,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        bwlimit: int = 1000,
+        journal: Optional[Transfer_journal] = None,
+    ):
+        for rel_path, (file_size, mtime) in plan.large_file_stats.items():
+            item = f"chunked:{os.path.join(to_object, rel_path)}:{file_size}:{mtime}"
+            if journal is not None and journal.is_done(item):
+                logger.info(f"{rel_path} has already been transferred.")
+                continue
+            self.chunked_transfer(
+                from_machine=from_machine,
+                from_object=os.path.join(from_object, rel_path),
+                to_machine=to_machine,
+                to_object=os.path.join(to_object, rel_path),
+                file_size=file_size,
+                mtime=mtime,
+                bwlimit=bwlimit,
+            )
+            if journal is not None:
+                journal.mark_done(item)
+
+    # a tar stream through ssh. no per-file round trips but no incremental update.
+    def tar_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        rel_paths: list,
+        bwlimit: int = 1000,
+        empty_dirs: Optional[list] = None,
+    ):
+        # returns False if tar reported errors.
+        # the empty dirs are listed too; --no-recursion keeps tar from
+        # adding the contents of a listed dir.
+        if empty_dirs is None:
+            empty_dirs = []
+        fd, list_file = tempfile.mkstemp(prefix="turbo-", suffix=".list")
+        with os.fdopen(fd, "w") as f:
+            for rel_path in list(rel_paths) + list(empty_dirs):
+                f.write(rel_path + "\n")
+        to_machine.run_command(f"mkdir -p {to_object}")
+        stdin_file = None
+        if (
+            from_machine.machine_type == "local"
+            and to_machine.machine_type == "remote"
+        ):
+            pack_command = f"tar czf - --no-recursion -C {from_object} -T {list_file}"
+            unpack_command = f'{to_machine.ssh_command} {to_machine.username}@{to_machine.ip} "tar xzf - -C {to_object}"'
+        elif (
+            from_machine.machine_type == "remote"
+            and to_machine.machine_type == "local"
+        ):
+            pack_command = f'{from_machine.ssh_command} {from_machine.username}@{from_machine.ip} "tar czf - --no-recursion -C {from_object} -T -"'
+            unpack_command = f"tar xzf - -C {to_object}"
+            stdin_file = list_file
+        else:
+            os.remove(list_file)
+            raise NotImplementedError
+        logger.info(
+            f"Transfer data from {from_machine.name} to {to_machine.name} using a tar stream."
+        )
+        logger.info(f"tar_command = {pack_command} | {unpack_command}")
+        try:
+            copied, stderr = Machine.local_run_pipe(
+                from_command=pack_command,
+                to_command=unpack_command,
+                bwlimit=bwlimit,
+                stdin_file=stdin_file,
+            )
+        finally:
+            os.remove(list_file)
+        if stderr:
+            logger.warning(f"stderr of the tar command = {stderr}")
+            return False
+        return True
+
+    # the files are packed into one archive on the remote machine (niced), which
+    # is pulled, unpacked and removed on both sides. one round trip per archive.
+    def pack_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        rel_paths: list,
+        bwlimit: int = 1000,
+        journal: Optional[Transfer_journal] = None,
+    ):
+        if len(rel_paths) == 0:
+            logger.info("No file is changed; nothing is packed.")
+            return
+        digest = hashlib.sha1(
+            "\n".join([to_object] + sorted(rel_paths)).encode()
+        ).hexdigest()
+        item = f"pack:{to_object}:{digest}"
+        if journal is not None and journal.is_done(item):
+            logger.info(f"the {len(rel_paths)} packed files are already unpacked.")
+            return
+        archive_name = f"{Machine.pack_prefix}{digest[:16]}.tar.gz"
+        remote_archive = os.path.join(from_object, archive_name)
+        local_archive = os.path.join(to_object, archive_name)
+        fd, list_file = tempfile.mkstemp(prefix="turbo-", suffix=".list")
+        with os.fdopen(fd, "w") as f:
+            for rel_path in rel_paths:
+                f.write(rel_path + "\n")
+        logger.info(
+            f"Transfer data from {from_machine.name} to {to_machine.name} packing {len(rel_paths)} files into {archive_name}."
+        )
+        try:
+            pack_command = f'{from_machine.ssh_command} {from_machine.username}@{from_machine.ip} "cd {from_object} && nice -n 19 tar czf {archive_name} -T - 2>&1" < {list_file}'
+            logger.debug(f"pack_command = {pack_command}")
+            stdout, stderr = Machine.local_run_command(command=pack_command)
+            if stdout.strip():
+                # e.g., a file vanished or is not readable; the archive is incomplete.
+                logger.error(f"{archive_name} is not packed: {stdout}")
+                raise ValueError
+            if stderr:
+                logger.warning(f"stderr of the pack command = {stderr}")
+            rsync_command = f"rsync --bwlimit {bwlimit} -av --partial{from_machine.rsync_ssh_option} {from_machine.username}@{from_machine.ip}:{remote_archive} {local_archive}"
+            logger.debug(f"rsync_command = {rsync_command}")
+            stdout, stderr = Machine.local_run_command(command=rsync_command)
+            if not os.path.isfile(local_archive):
+                logger.error(f"{archive_name} is not fetched: {stderr}")
+                raise FileNotFoundError
+            stdout, stderr = Machine.local_run_command(
+                command=f"tar xzf {local_archive} -C {to_object}"
+            )
+            if stderr:
+                logger.error(f"{archive_name} is not unpacked: {stderr}")
+                raise ValueError
+            if journal is not None:
+                journal.mark_done(item)
+        finally:
+            # the archives are removed even if the transfer failed.
+            os.remove(list_file)
+            if os.path.isfile(local_archive):
+                os.remove(local_archive)
+            from_machine.run_command(f"rm -f {remote_archive} 2>/dev/null")
+
+    # rsync streams over disjoint file lists balanced by size
+    def sharded_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        file_stats: dict,
+        num_streams: int = 4,
+        bwlimit: int = 1000,
+        journal: Optional[Transfer_journal] = None,
+        empty_dirs: Optional[list] = None,
+    ):
+        shards = [[] for _ in range(num_streams)]
+        heap = [(0, i) for i in range(num_streams)]
+        for rel_path, (size, mtime) in sorted(
+            file_stats.items(), key=lambda item: -item[1][0]
+        ):
+            load, i = heapq.heappop(heap)
+            shards[i].append(rel_path)
+            heapq.heappush(heap, (load + size, i))
+        # a dir listed in --files-from is created, not recursed into.
+        shards[0] += list(empty_dirs or [])
+        shards = [shard for shard in shards if len(shard) > 0]
+        if len(shards) == 0:
+            logger.info("No file to transfer.")
+            return True
+
+        if (
+            from_machine.machine_type == "local"
+            and to_machine.machine_type == "remote"
+        ):
+            source = f"{from_object}/"
+            destination = f"{to_machine.username}@{to_machine.ip}:{to_object}"
+            rsync_ssh_option = to_machine.rsync_ssh_option
+        elif (
+            from_machine.machine_type == "remote"
+            and to_machine.machine_type == "local"
+        ):
+            source = f"{from_machine.username}@{from_machine.ip}:{from_object}/"
+            destination = to_object
+            rsync_ssh_option = from_machine.rsync_ssh_option
+        else:
+            raise NotImplementedError
+        logger.info(
+            f"Transfer data from {from_machine.name} to {to_machine.name} using {len(shards)} rsync streams."
+        )
+
+        def transfer_shard(shard):
+            item = "shard:{}:{}".format(
+                to_object,
+                hashlib.sha1("\n".join(sorted(shard)).encode()).hexdigest(),
+            )
+            if journal is not None and journal.is_done(item):
+                logger.info(f"a shard of {len(shard)} files is already done.")
+                return "", ""
+            fd, list_file = tempfile.mkstemp(prefix="turbo-", suffix=".list")
+            with os.fdopen(fd, "w") as f:
+                for rel_path in shard:
+                    f.write(rel_path + "\n")
+            rsync_command = f"rsync --bwlimit {max(1, bwlimit // len(shards))} -avz{rsync_ssh_option} --files-from={list_file} {source} {destination}"
+            logger.debug(f"rsync_command = {rsync_command}")
+            stdout, stderr = Machine.local_run_command(command=rsync_command)
+            os.remove(list_file)
+            if stderr:
+                logger.warning(f"stderr of the rsync command = {stderr}")
+            elif journal is not None:
+                journal.mark_done(item)
+            return stdout, stderr
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # returns False if a shard failed.
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            results = list(executor.map(transfer_shard, shards))
+        for stdout, stderr in results:
+            logger.debug(stdout)
+        return all(not stderr for stdout, stderr in results)
+
+    # a huge file is split into byte ranges transferred by concurrent streams.
+    def chunked_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        file_size: Optional[int] = None,
+        mtime: Optional[float] = None,
+        bwlimit: int = 1000,
+    ):
+        if (
+            from_machine.machine_type == "local"
+            and to_machine.machine_type == "remote"
+        ):
+            remote_machine = to_machine
+        elif (
+            from_machine.machine_type == "remote"
+            and to_machine.machine_type == "local"
+        ):
+            remote_machine = from_machine
+        else:
+            raise NotImplementedError
+
+        if file_size is None or mtime is None:
+            file_stats = from_machine.list_files(
+                object_name=from_object, dir_listing=False
+            )
+            if len(file_stats) != 1:
+                logger.error(f"{from_object} is not found.")
+                raise FileNotFoundError
+            file_size, mtime = list(file_stats.values())[0]
+
+        # an unchanged file (the same size and mtime, as rsync) is not sent again.
+        if to_machine.machine_type == "local" and not os.path.isfile(to_object):
+            dest_stats = {}
+        else:
+            dest_stats = to_machine.list_files(
+                object_name=to_object, dir_listing=False
+            )
+        if len(dest_stats) == 1:
+            dest_size, dest_mtime = list(dest_stats.values())[0]
+            if dest_size == file_size and int(dest_mtime) == int(mtime):
+                logger.info(f"{to_object} is up to date; not transferred.")
+                return
+
+        # byte ranges in units of dd blocks
+        block_size = self.chunk_block_size
+        num_blocks = max(1, -(-file_size // block_size))
+        num_streams = max(1, min(remote_machine.chunk_streams, num_blocks))
+        blocks_per_stream = -(-num_blocks // num_streams)
+        chunk_list = [
+            (start, min(blocks_per_stream, num_blocks - start))
+            for start in range(0, num_blocks, blocks_per_stream)
+        ]
+
+        logger.info(
+            f"Transfer data from {from_machine.name} to {to_machine.name} in {len(chunk_list)} concurrent chunks."
+        )
+        logger.info(f"From:: {from_object} ({file_size} bytes)")
+        logger.info(f"To:: {to_object}")
+
+        # the chunks are written into a partial file in place.
+        partial_object = f"{to_object}.turbo-partial"
+        to_machine.run_command(
+            f"mkdir -p {os.path.dirname(to_object)} && rm -f {partial_object}"
+        )
+        ssh_command = f"{remote_machine.ssh_command} {remote_machine.username}@{remote_machine.ip}"
+        # the streams share bwlimit
+        stream_bwlimit = max(1, bwlimit // len(chunk_list))
+
+        def transfer_chunk(chunk):
+            start, count = chunk
+            read_command = f"dd if={from_object} bs={block_size} skip={start} count={count} 2>/dev/null"
+            write_command = f"dd of={partial_object} bs={block_size} seek={start} conv=notrunc 2>/dev/null"
+            if from_machine.machine_type == "local":
+                write_command = f'{ssh_command} "{write_command}"'
+            else:
+                read_command = f'{ssh_command} "{read_command}"'
+            for tt in range(self.chunk_retry_max_num):
+                logger.debug(
+                    f"chunk {start} trial {tt + 1}/{self.chunk_retry_max_num}"
+                )
+                copied, stderr = Machine.local_run_pipe(
+                    from_command=read_command,
+                    to_command=write_command,
+                    bwlimit=stream_bwlimit,
+                )
+                if not stderr:
+                    return True
+                logger.warning(
+                    f"chunk of blocks {start}-{start + count - 1} failed."
+                )
+                logger.debug(f"stderr = {stderr}")
+            return False
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=len(chunk_list)) as executor:
+            results = list(executor.map(transfer_chunk, chunk_list))
+        if not all(results):
+            logger.error("Some chunks were not transferred.")
+            raise ConnectionError
+
+        # the reassembled file is verified before it replaces to_object.
+        algorithm = remote_machine.checksum
+        cache = Checksum_cache()
+
+        def file_checksum(machine, object_name, file_cache):
+            file_stats = machine.list_files(
+                object_name=object_name, dir_listing=False
+            )
+            checksums = get_checksums(
+                machine=machine,
+                root_dir=os.path.dirname(object_name),
+                file_stats=file_stats,
+                cache=file_cache,
+                algorithm=algorithm,
+            )
+            return list(checksums.values())
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            from_future = executor.submit(
+                file_checksum, from_machine, from_object, cache
+            )
+            to_future = executor.submit(
+                file_checksum, to_machine, partial_object, None
+            )
+            from_checksum = from_future.result()
+            to_checksum = to_future.result()
+        cache.save()
+        if len(from_checksum) != 1 or from_checksum != to_checksum:
+            logger.error(f"checksum mismatch: {from_object} and {to_object}")
+            to_machine.run_command(f"rm -f {partial_object}")
+            raise ValueError
+        logger.info(f"{to_object} is verified ({algorithm}).")
+
+        if to_machine.machine_type == "local":
+            os.replace(partial_object, to_object)
+            os.utime(to_object, (mtime, mtime))
+        else:
+            to_machine.run_command(
+                f"mv -f {partial_object} {to_object} && touch -d @{int(mtime)} {to_object}"
+            )
+
+    # post-transfer verification
+    def verify_transfer(
+        self,
+        from_machine: str,
+        from_object: str,
+        to_machine: str,
+        to_object: str,
+        dir_transfer: bool = False,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        resend_flag: bool = False,
+        bwlimit: int = 1000,
+        transfer_filter: Optional[Transfer_filter] = None,
+    ):
+        if include_list is None:
+            include_list = []
+        if exclude_list is None:
+            exclude_list = []
+        if transfer_filter is None:
+            transfer_filter = self.get_transfer_filter(
+                from_machine=from_machine,
+                from_object=from_object,
+                to_machine=to_machine,
+                to_object=to_object,
+                dir_transfer=dir_transfer,
+                include_list=include_list,
+                exclude_list=exclude_list,
+            )
+
+        # both ends should compute the same kind of checksum
+        algorithms = {
+            machine.checksum
+            for machine in (from_machine, to_machine)
+            if machine.machine_type == "remote"
+        }
+        if len(algorithms) > 1:
+            logger.error(
+                f"checksum algorithms {algorithms} are different between {from_machine.name} and {to_machine.name}."
+            )
+            raise ValueError
+        algorithm = algorithms.pop() if len(algorithms) == 1 else "md5"
+
+        logger.info(f"Verifying the transferred files ({algorithm}).")
+        cache = Checksum_cache()
+
+        def tree_checksums(machine, object_name, side_filter, side_cache):
+            file_stats = machine.list_files(
+                object_name=object_name,
+                dir_listing=dir_transfer,
+                transfer_filter=side_filter,
+            )
+            if dir_transfer:
+                root_dir = object_name
+            else:
+                root_dir = os.path.dirname(object_name)
+            checksums = get_checksums(
+                machine=machine,
+                root_dir=root_dir,
+                file_stats=file_stats,
+                cache=side_cache,
+                algorithm=algorithm,
+                whole_tree=dir_transfer,
+            )
+            if not dir_transfer:
+                # the file may be renamed by the transfer
+                checksums = {
+                    os.path.basename(to_object): digest
+                    for digest in checksums.values()
+                }
+            return checksums
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # source and destination are hashed concurrently, with a filter each.
+        # the destination is never read from the cache (see Checksum_cache).
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            from_future = executor.submit(
+                tree_checksums,
+                from_machine,
+                from_object,
+                transfer_filter.copy(),
+                cache,
+            )
+            to_future = executor.submit(
+                tree_checksums, to_machine, to_object, transfer_filter.copy(), None
+            )
+            from_checksums = from_future.result()
+            to_checksums = to_future.result()
+        cache.save()
+
+        mismatched_list = [
+            rel_path
+            for rel_path, digest in from_checksums.items()
+            if rel_path in to_checksums and to_checksums[rel_path] != digest
+        ]
+        missing_list = [
+            rel_path
+            for rel_path in from_checksums
+            if rel_path not in to_checksums
+        ]
+        logger.info(
+            f"{len(from_checksums)} files verified: {len(mismatched_list)} mismatched, {len(missing_list)} missing."
+        )
+        for rel_path in mismatched_list:
+            logger.warning(f"checksum mismatch: {rel_path}")
+        for rel_path in missing_list:
+            logger.warning(f"missing on {to_machine.name}: {rel_path}")
+
+        if len(mismatched_list) == 0 and len(missing_list) == 0:
+            return True
+        if not resend_flag:
+            logger.error("Verification failed.")
+            return False
+
+        logger.info("The mismatched and missing files will be re-sent.")
+        for rel_path in mismatched_list + missing_list:
+            if dir_transfer:
+                from_file = os.path.join(from_object, rel_path)
+                to_file = os.path.join(to_object, rel_path)
+            else:
+                from_file = from_object
+                to_file = to_object
+            # rsync skips a corrupted file having the same size and mtime.
+            to_machine.run_command(f"rm -f {to_file}")
+            cache.drop(from_machine.name, from_file)
+            cache.drop(to_machine.name, to_file)
+            self.object_transfer(
+                from_machine=from_machine,
+                from_object=from_file,
+                to_machine=to_machine,
+                to_object=to_file,
+                dir_transfer=False,
+                bwlimit=bwlimit,
+            )
+        cache.save()
+        return self.verify_transfer(
+            from_machine=from_machine,
+            from_object=from_object,
+            to_machine=to_machine,
+            to_object=to_object,
+            dir_transfer=dir_transfer,
+            include_list=include_list,
+            exclude_list=exclude_list,
+            resend_flag=False,
+            bwlimit=bwlimit,
+            transfer_filter=transfer_filter,
+        )
+
 
 if __name__ == "__main__":
     from logging import getLogger
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import pickle
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.job_manager import Job_submission
+from turbofilemanager.job_index import Job_index
+from turbofilemanager.scheduler_adapter import get_scheduler
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+class Pending_queue:
+    # jobs blocked by MAX_JOB_SUBMIT/MAX_JOB_RUN wait in the job index
+    # (state = pending) and are submitted in the order of
+    # (higher priority, older) when the queue has room.
+    def __init__(
+        self,
+        root_dir: Optional[str] = None,
+        server_machine_name: Optional[str] = None,
+    ):
+        self.root_dir = root_dir
+        self.server_machine_name = server_machine_name
+
+    @staticmethod
+    def add(submission: Job_submission, priority: Optional[int] = None):
+        if not getattr(submission, "job_pending", False):
+            submission.add_event("pending")
+        submission.job_pending = True
+        if priority is not None:
+            submission.priority = priority
+        submission.save()
+        logger.info(
+            f"The job in {submission.local_dir} is pending (priority = {getattr(submission, 'priority', 0)})."
+        )
+
+    def get_rows(self):
+        job_index = Job_index()
+        rows = job_index.query(
+            server_machine=self.server_machine_name,
+            state="pending",
+            root_dir=self.root_dir,
+        )
+        job_index.close()
+        # updated changes on every save; it only orders the rows indexed by
+        # older versions (without pending_since).
+        return sorted(
+            rows,
+            key=lambda row: (
+                -(row["priority"] or 0),
+                row["pending_since"] or row["updated"],
+            ),
+        )
+
+    def submit(self):
+        # one cycle: one scheduler query per server, then as many submissions
+        # as the free slots of each queue allow.
+        server_submissions = {}
+        for row in self.get_rows():
+            try:
+                submission = Job_submission.load(row["pkl_path"])
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                logger.warning(f"{row['pkl_path']} is not readable: {e}")
+                continue
+            server_submissions.setdefault(
+                submission.server_machine.name, []
+            ).append(submission)
+
+        submitted = []
+        for server_name, submissions in server_submissions.items():
+            server_machine = submissions[0].server_machine
+            if server_machine.queuing:
+                jobs = get_scheduler(server_machine).query(max_age=0)
+            else:
+                jobs = None
+            free_slots = {}  # queue -> free slots
+            for submission in submissions:
+                if submission.queue not in free_slots:
+                    free_slots[submission.queue] = get_scheduler(
+                        server_machine
+                    ).free_slots(
+                        jobs,
+                        submission.queue,
+                        submission.max_job_submit,
+                        submission.max_job_run,
+                    )
+                    logger.info(
+                        f"free slots of {submission.queue} on {server_name} = {free_slots[submission.queue]}"
+                    )
+                if free_slots[submission.queue] == 0:
+                    continue
+                flag, job_number = submission.job_submit(check_flag=False)
+                if flag:
+                    submitted.append(submission)
+                    if free_slots[submission.queue] is not None:
+                        free_slots[submission.queue] -= 1
+        logger.info(f"{len(submitted)} pending jobs are submitted.")
+        return submitted
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import math
+from datetime import datetime
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.queue_table import max_time_seconds
+from turbofilemanager.scheduler_adapter import get_scheduler
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def expected_wait(active: int, running: int, row: dict):
+    # a rough wait (sec.) for a new job in the queue from our own jobs in it.
+    # MAX_JOB_RUN/MAX_JOB_SUBMIT are per user, so our jobs decide the wait:
+    # a full queue frees one run slot per MAX_TIME/MAX_JOB_RUN at the latest.
+    max_job_run = row.get("MAX_JOB_RUN")
+    max_job_submit = row.get("MAX_JOB_SUBMIT")
+    if max_job_submit is not None and active >= max_job_submit:
+        return math.inf  # held in the local pending queue
+    if max_job_run is None or running < max_job_run:
+        if active == running:
+            return 0.0
+    max_time = max_time_seconds(row.get("MAX_TIME"))
+    if max_time is None or not max_job_run:
+        return math.inf
+    waiting = active - running
+    return (waiting + 1) * max_time / max_job_run
+
+
+def select_queue(server_machine, rows: list, walltime: Optional[int] = None):
+    # rows: the queue_data rows matching CORES and OMP.
+    # walltime (sec.): queues with a shorter MAX_TIME are not candidates.
+    # returns (row, decision); the decision is kept in the job record.
+    decision = {
+        "time": datetime.today(),
+        "walltime": walltime,
+        "candidates": [],
+        "queue": None,
+        "reason": None,
+    }
+    if walltime is not None:
+        fitting = [
+            row
+            for row in rows
+            if max_time_seconds(row.get("MAX_TIME")) is None
+            or max_time_seconds(row.get("MAX_TIME")) >= walltime
+        ]
+        if len(fitting) == 0:
+            logger.warning(
+                f"No queue has MAX_TIME >= {walltime} s. All queues are candidates."
+            )
+        else:
+            rows = fitting
+    if len(rows) == 1:
+        decision["queue"] = rows[0]["QUEUE"]
+        decision["reason"] = "only one queue matches"
+        return rows[0], decision
+
+    try:
+        scheduler = get_scheduler(server_machine)
+        jobs = scheduler.query()
+    except Exception as e:
+        # e.g., a scheduler without a parser; the first row as before.
+        logger.warning(f"The queues are not ranked: {e}")
+        decision["queue"] = rows[0]["QUEUE"]
+        decision["reason"] = "the scheduler query failed; the first row"
+        return rows[0], decision
+
+    owner = server_machine.username
+    ranked = []
+    for order, row in enumerate(rows):
+        active = scheduler.count_jobs(jobs, owner=owner, queue=row["QUEUE"])
+        running = scheduler.count_jobs(
+            jobs, owner=owner, queue=row["QUEUE"], running_only=True
+        )
+        if scheduler.running_states is None:
+            # the running jobs are not told from the queued ones, so only
+            # a full queue (MAX_JOB_SUBMIT) is avoided.
+            max_job_submit = row.get("MAX_JOB_SUBMIT")
+            full = max_job_submit is not None and active >= max_job_submit
+            wait = math.inf if full else 0.0
+        else:
+            wait = expected_wait(active, running, row)
+        decision["candidates"].append(
+            {
+                "queue": row["QUEUE"],
+                "active": active,
+                "running": running,
+                "max_job_run": row.get("MAX_JOB_RUN"),
+                "max_job_submit": row.get("MAX_JOB_SUBMIT"),
+                "max_time": row.get("MAX_TIME"),
+                "expected_wait": wait,
+            }
+        )
+        # the shortest wait, then the tightest MAX_TIME that fits the predicted
+        # walltime, then the file order (without a walltime, the file order).
+        max_time = max_time_seconds(row.get("MAX_TIME"))
+        if walltime is None or max_time is None:
+            max_time = math.inf
+        ranked.append((wait, max_time, order, row))
+    wait, max_time, order, row = min(ranked, key=lambda item: item[:3])
+    decision["queue"] = row["QUEUE"]
+    decision["reason"] = "the shortest expected wait"
+    for candidate in decision["candidates"]:
+        logger.info(
+            "queue {queue}: {active} submitted, {running} running, expected wait = {expected_wait:.0f} s".format(
+                **candidate
+            )
+        )
+    logger.info(f"queue {row['QUEUE']} is selected.")
+    return row, decision
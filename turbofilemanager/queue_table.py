@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import threading
+
+# define logger
+from logging import getLogger
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def max_time_seconds(max_time):
+    # [[DD:]HH:]MM:SS in queue_data.txt -> seconds
+    if max_time is None:
+        return None
+    try:
+        values = [int(v) for v in str(max_time).split(":")]
+    except ValueError:
+        return None
+    seconds = 0
+    for value, unit in zip(values[::-1], [1, 60, 3600, 86400]):
+        seconds += value * unit
+    return seconds
+
+
+class Queue_table:
+    # queue_data.txt (whitespace separated, the first line is the header)
+    # as {(CORES, OMP): [rows]}. numbers are int, QUEUE and MAX_TIME are str.
+    cache = {}  # path -> (mtime_ns, Queue_table)
+    cache_lock = threading.Lock()
+    text_columns = {"QUEUE", "MAX_TIME"}
+
+    def __init__(self, lines: list):
+        self.rows = {}
+        header = None
+        for line in lines:
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            if header is None:
+                header = fields
+                continue
+            row = {
+                name: self.to_value(name, value)
+                for name, value in zip(header, fields)
+            }
+            key = (row.get("CORES"), row.get("OMP"))
+            self.rows.setdefault(key, []).append(row)
+
+    def to_value(self, name: str, value: str):
+        if name in self.text_columns:
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    @classmethod
+    def load(cls, path: str):
+        # parsed once per process; reparsed only when the file is modified.
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            logger.error(f"{path} is not found!!")
+            raise FileNotFoundError
+        with cls.cache_lock:
+            cached = cls.cache.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                return cached[1]
+        with open(path, "r") as f:
+            table = cls(f.readlines())
+        with cls.cache_lock:
+            cls.cache[path] = (mtime_ns, table)
+        return table
+
+    def find(self, cores: int, openmp: int, queue=None):
+        # the rows of cores and openmp (and queue if given)
+        rows = self.rows.get((cores, openmp), [])
+        if queue is not None:
+            rows = [row for row in rows if row["QUEUE"] == str(queue)]
+        return rows
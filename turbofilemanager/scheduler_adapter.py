@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import re
+import json
+import time
+import fcntl
+import pickle
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def normalize_job_id(job_id):
+    # 1234.pbsserver, 1234.pbsserv* (truncated by qstat) and 1234 are the same job.
+    # array jobs: 1234[].pbsserver -> 1234, 1234[5].pbsserver and 1234_5 -> 1234_5
+    if job_id is None:
+        return None
+    job_id = str(job_id).strip().split(".")[0]
+    match = re.match(r"^(\d+)\[(\d*)\]$", job_id)
+    if match:
+        if match.group(2) == "":
+            return match.group(1)
+        return f"{match.group(1)}_{match.group(2)}"
+    return job_id
+
+
+def array_parent(job_id):
+    # 1234_5 -> 1234, None for a job that is not an array task
+    match = re.match(r"^(\d+)_\d+$", str(job_id))
+    if match:
+        return match.group(1)
+    return None
+
+
+def expand_array_range(array_range: str):
+    # 0-3,7,10-20:5%4 -> [0, 1, 2, 3, 7, 10, 15, 20]
+    tasks = []
+    for item in array_range.split("%")[0].split(","):
+        step = 1
+        if ":" in item:
+            item, step = item.split(":")
+            step = int(step)
+        if "-" in item:
+            start, end = item.split("-")
+            tasks += list(range(int(start), int(end) + 1, step))
+        elif item != "":
+            tasks.append(int(item))
+    return tasks
+
+
+class Scheduler:
+    # the parsed status is {normalized job id: {"state", "queue", "owner", "active", "running"}}
+    name = "generic"
+    finished_states = set()
+    running_states = None  # None: all the active jobs are counted as running
+    # array jobs (None: not supported)
+    directive_prefix = None
+    array_index_variable = None
+    workdir_variable = None
+    # afterany dependencies (None: resolved locally by Job_dag)
+    dependency_format = None
+    # the last query result of each server is shared by all the processes.
+    cache_dir = os.path.join(file_manager_config_dir, "scheduler_cache")
+
+    def __init__(self, machine):
+        self.machine = machine
+
+    def status_command(self):
+        return f"{self.machine.jobcheck}"
+
+    def submit_command(self, submission_script: str, after: Optional[list] = None):
+        # after: job ids that must finish first (afterany, as Job_dag)
+        return f"{self.machine.jobsubmit}{self.dependency_option(after)} {submission_script}"
+
+    def dependency_option(self, after: Optional[list] = None):
+        if not after:
+            return ""
+        if self.dependency_format is None:
+            logger.error(f"{self.name} does not support job dependencies.")
+            raise NotImplementedError
+        return " " + self.dependency_format.format(
+            ":".join(str(self.native_job_id(job_id)) for job_id in after)
+        )
+
+    def parse_job_id(self, stdout: str):
+        return stdout.split()[self.machine.jobnum_index]
+
+    def submitted_job_id(self, stdout: str):
+        # the job id printed by jobsubmit. a rejected submission (e.g., an
+        # error message instead of the id) raises ValueError.
+        try:
+            job_id = self.parse_job_id(stdout)
+        except IndexError:
+            job_id = None
+        if job_id is None or not re.match(r"^\d+", normalize_job_id(job_id)):
+            logger.error(
+                f"No job id in the output of {self.machine.jobsubmit}: {stdout.strip()}"
+            )
+            raise ValueError
+        return job_id
+
+    def parse_status(self, stdout: str):
+        raise NotImplementedError
+
+    def array_directive(self, num_tasks: int, max_run=None):
+        raise NotImplementedError
+
+    def native_job_id(self, job_id):
+        # the job id accepted by jobdel
+        return job_id
+
+    def job_entry(self, state=None, queue=None, owner=None):
+        active = state not in self.finished_states
+        if self.running_states is None:
+            running = active
+        else:
+            running = state in self.running_states
+        return {
+            "state": state,
+            "queue": queue,
+            "owner": owner,
+            "active": active,
+            "running": running,
+        }
+
+    def query(self, max_age: Optional[float] = None):
+        # a result younger than max_age (scheduler_cache_ttl by default) is reused.
+        # concurrent callers wait for the one running the query.
+        if max_age is None:
+            max_age = self.machine.scheduler_cache_ttl
+        cache_file = os.path.join(self.cache_dir, f"{self.machine.name}.pkl")
+        jobs = self.read_cache(cache_file, max_age)
+        if jobs is not None:
+            return jobs
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(f"{cache_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                jobs = self.read_cache(cache_file, max_age)
+                if jobs is not None:
+                    return jobs
+                stdout, stderr = self.machine.run_command(
+                    self.status_command()
+                )
+                jobs = self.parse_status(stdout)
+                logger.debug(f"{len(jobs)} jobs on {self.machine.name}.")
+                tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+                with open(tmp_file, "wb") as f:
+                    pickle.dump(
+                        {
+                            "time": time.time(),
+                            "status_command": self.status_command(),
+                            "jobs": jobs,
+                        },
+                        f,
+                    )
+                os.replace(tmp_file, cache_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return jobs
+
+    def invalidate(self):
+        # e.g., after a submission
+        cache_file = os.path.join(self.cache_dir, f"{self.machine.name}.pkl")
+        if os.path.isfile(cache_file):
+            os.remove(cache_file)
+
+    def read_cache(self, cache_file: str, max_age: float):
+        if max_age <= 0:
+            return None
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if cached["status_command"] != self.status_command():
+            return None
+        age = time.time() - cached["time"]
+        if age > max_age:
+            return None
+        logger.debug(
+            f"The job status of {self.machine.name} queried {age:.1f}s ago is used."
+        )
+        return cached["jobs"]
+
+    def is_running(self, jobs: dict, job_number):
+        job = jobs.get(normalize_job_id(job_number))
+        return job is not None and job["active"]
+
+    def is_started(self, jobs: dict, job_number):
+        # running, not waiting in the queue
+        job = jobs.get(normalize_job_id(job_number))
+        return job is not None and job["running"]
+
+    def count_jobs(
+        self, jobs: dict, owner=None, queue=None, running_only: bool = False
+    ):
+        # an array job is one submission but each running task is one run.
+        key = "running" if running_only else "active"
+        return len(
+            {
+                job_id if running_only else array_parent(job_id) or job_id
+                for job_id, job in jobs.items()
+                if job[key]
+                and (owner is None or job["owner"] == owner)
+                # jobs without a queue (e.g., ps) are counted for any queue.
+                and (queue is None or job["queue"] in {None, queue})
+            }
+        )
+
+    def free_slots(self, jobs: Optional[dict], queue, max_job_submit, max_job_run):
+        # the number of jobs that can be submitted to the queue now (None: no limit).
+        if jobs is None:
+            return None
+        owner = self.machine.username
+        free_slots = None
+        if max_job_submit is not None:
+            num = self.count_jobs(jobs, owner=owner, queue=queue)
+            logger.info(f"{num} jobs are submitted to {queue} on {self.machine.name}")
+            free_slots = int(max_job_submit) - num
+        # without running_states, the running jobs are not told from the queued
+        # ones (all active jobs count as running), so MAX_JOB_RUN is not applied.
+        if max_job_run is not None and self.running_states is not None:
+            num = self.count_jobs(
+                jobs, owner=owner, queue=queue, running_only=True
+            )
+            logger.info(f"{num} jobs are running in {queue} on {self.machine.name}")
+            if free_slots is None:
+                free_slots = int(max_job_run) - num
+            else:
+                free_slots = min(free_slots, int(max_job_run) - num)
+        if free_slots is None:
+            return None
+        return max(free_slots, 0)
+
+
+class Pbs_scheduler(Scheduler):
+    # PBS Pro (>= 19) json output
+    name = "pbs"
+    finished_states = {"F", "X"}
+    running_states = {"R", "E"}
+    directive_prefix = "#PBS"
+    array_index_variable = "PBS_ARRAY_INDEX"
+    workdir_variable = "PBS_O_WORKDIR"
+    dependency_format = "-W depend=afterany:{}"
+
+    def status_command(self):
+        # -t lists the subjobs of array jobs
+        return f"{self.machine.jobcheck} -t -f -F json"
+
+    def parse_job_id(self, stdout: str):
+        return stdout.strip().split("\n")[-1].strip()
+
+    def parse_status(self, stdout: str):
+        try:
+            data = json.loads(stdout)
+        except ValueError:
+            logger.error("The output of qstat -t -f -F json is not json.")
+            raise ValueError
+        jobs = {}
+        for job_id, value in data.get("Jobs", {}).items():
+            jobs[normalize_job_id(job_id)] = self.job_entry(
+                state=value.get("job_state"),
+                queue=value.get("queue"),
+                owner=value.get("Job_Owner", "").split("@")[0],
+            )
+        return jobs
+
+    def array_directive(self, num_tasks: int, max_run=None):
+        return f"#PBS -J 0-{num_tasks - 1}"
+
+    def native_job_id(self, job_id):
+        # 1234_5 -> 1234[5]
+        parent = array_parent(job_id)
+        if parent is None:
+            return job_id
+        return f"{parent}[{str(job_id).split('_')[1]}]"
+
+
+class Slurm_scheduler(Scheduler):
+    name = "slurm"
+    finished_states = {
+        "BOOT_FAIL",
+        "CANCELLED",
+        "COMPLETED",
+        "DEADLINE",
+        "FAILED",
+        "NODE_FAIL",
+        "OUT_OF_MEMORY",
+        "PREEMPTED",
+        "TIMEOUT",
+    }
+    running_states = {"RUNNING", "COMPLETING"}
+    directive_prefix = "#SBATCH"
+    array_index_variable = "SLURM_ARRAY_TASK_ID"
+    workdir_variable = "SLURM_SUBMIT_DIR"
+    dependency_format = "--dependency=afterany:{}"
+
+    def status_command(self):
+        return f'{self.machine.jobcheck} -h -o "%i|%T|%P|%u"'
+
+    def submit_command(self, submission_script: str, after: Optional[list] = None):
+        return f"{self.machine.jobsubmit} --parsable{self.dependency_option(after)} {submission_script}"
+
+    def parse_job_id(self, stdout: str):
+        # job_id[;cluster_name]
+        return stdout.strip().split("\n")[-1].split(";")[0].strip()
+
+    def parse_status(self, stdout: str):
+        jobs = {}
+        for line in stdout.split("\n"):
+            fields = line.strip().split("|")
+            if len(fields) != 4:
+                continue
+            job_id, state, partition, owner = fields
+            job_entry = self.job_entry(state=state, queue=partition, owner=owner)
+            # pending tasks of an array job are shown as 1234_[5-10%2]
+            match = re.match(r"^(\d+)_\[(.+)\]$", job_id)
+            if match:
+                for task in expand_array_range(match.group(2)):
+                    jobs[f"{match.group(1)}_{task}"] = dict(job_entry)
+            else:
+                jobs[normalize_job_id(job_id)] = job_entry
+        return jobs
+
+    def array_directive(self, num_tasks: int, max_run=None):
+        # MAX_JOB_RUN is enforced by slurm for the tasks
+        if max_run is None:
+            return f"#SBATCH --array=0-{num_tasks - 1}"
+        return f"#SBATCH --array=0-{num_tasks - 1}%{int(max_run)}"
+
+
+class Ps_scheduler(Scheduler):
+    # jobs are background processes on the server; the job id is the pid.
+    name = "ps"
+    finished_states = {"Z"}
+
+    def status_command(self):
+        return f"{self.machine.jobcheck} -e -o pid= -o stat= -o user="
+
+    def submit_command(self, submission_script: str, after: Optional[list] = None):
+        return f"nohup {self.machine.jobsubmit}{self.dependency_option(after)} {submission_script} > /dev/null 2>&1 & echo $!"
+
+    def parse_job_id(self, stdout: str):
+        return stdout.strip().split("\n")[-1].strip()
+
+    def parse_status(self, stdout: str):
+        jobs = {}
+        for line in stdout.split("\n"):
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            pid, state, owner = fields[:3]
+            jobs[pid] = self.job_entry(state=state[0], owner=owner)
+        return jobs
+
+
+class Generic_scheduler(Scheduler):
+    # whitespace separated columns of the jobcheck output.
+    # the column numbers are set by scheduler_columns in machine_data.yaml.
+    name = "generic"
+
+    def __init__(self, machine):
+        super().__init__(machine)
+        self.columns = {"id": 0}
+        self.columns.update(machine.scheduler_columns)
+        self.finished_states = set(machine.scheduler_finished_states)
+        if len(machine.scheduler_running_states) > 0:
+            self.running_states = set(machine.scheduler_running_states)
+
+    @staticmethod
+    def get_column(fields: list, index: Optional[int]):
+        if index is None or index >= len(fields):
+            return None
+        return fields[index]
+
+    def parse_status(self, stdout: str):
+        jobs = {}
+        for line in stdout.split("\n"):
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            job_entry = self.job_entry(
+                state=self.get_column(fields, self.columns.get("state")),
+                queue=self.get_column(fields, self.columns.get("queue")),
+                owner=self.get_column(fields, self.columns.get("owner")),
+            )
+            job_entry["line"] = line
+            jobs[
+                normalize_job_id(self.get_column(fields, self.columns["id"]))
+            ] = job_entry
+        return jobs
+
+    def count_jobs(
+        self, jobs: dict, owner=None, queue=None, running_only: bool = False
+    ):
+        if "owner" in self.columns and "queue" in self.columns:
+            return super().count_jobs(
+                jobs, owner=owner, queue=queue, running_only=running_only
+            )
+        # without the columns, the owner and the queue are searched in the line.
+        return len(
+            [
+                job
+                for job in jobs.values()
+                if (job["running"] or not running_only)
+                and re.match(f".*{owner}.*\\s{queue}(\\s.*)?$", job["line"])
+            ]
+        )
+
+
+schedulers = {
+    scheduler.name: scheduler
+    for scheduler in [
+        Pbs_scheduler,
+        Slurm_scheduler,
+        Ps_scheduler,
+        Generic_scheduler,
+    ]
+}
+
+
+def get_scheduler(machine):
+    try:
+        return schedulers[machine.scheduler](machine)
+    except KeyError:
+        logger.error(
+            f"scheduler = {machine.scheduler} of {machine.name} is not supported."
+        )
+        logger.error(f"Choose one of {list(schedulers.keys())}.")
+        raise KeyError
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import re
+import threading
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import job_manager_env_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+# the placeholders of submit_mpi.sh and submit_nompi.sh.
+# a longer one is matched first (e.g., _BINARY_ROOT_/ before _BINARY_ROOT_).
+keywords = [
+    "_NODES_",
+    "_CORES_PER_NODE_",
+    "_MPI_PER_NODE_",
+    "_MAX_TIME_",
+    "_JOBNAME_",
+    "_QUEUE_",
+    "_OMP_NUM_THREADS_",
+    "_NUM_CORES_",
+    "_BUDGET_",
+    " < $INPUT",
+    "_INPUT_",
+    "_OUTPUT_",
+    "$PREOPTION",
+    "_PREOPTION_",
+    "$POSTOPTION",
+    "_POSTOPTION_",
+    "_BINARY_ROOT_/",
+    "_BINARY_ROOT_",
+    "_BINARY_",
+]
+keyword_pattern = re.compile(
+    "({})".format(
+        "|".join(
+            re.escape(keyword)
+            for keyword in sorted(keywords, key=len, reverse=True)
+        )
+    )
+)
+
+
+class Script_template:
+    # a template split once into literal parts and placeholders.
+    # rendering fills the placeholders in one pass; a placeholder without
+    # a value is kept as it is.
+    cache = {}  # path -> (mtime_ns, Script_template)
+    cache_lock = threading.Lock()
+
+    def __init__(self, text: str):
+        self.parts = keyword_pattern.split(text)
+        # the odd parts are the placeholders
+        self.slots = [
+            (i, self.parts[i]) for i in range(1, len(self.parts), 2)
+        ]
+
+    @property
+    def placeholders(self):
+        return {keyword for i, keyword in self.slots}
+
+    @classmethod
+    def load(cls, path: str):
+        # parsed once per file; reparsed only when the file is modified.
+        mtime_ns = os.stat(path).st_mtime_ns
+        with cls.cache_lock:
+            cached = cls.cache.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                return cached[1]
+        with open(path, "r") as f:
+            template = cls(f.read())
+        logger.debug(f"{path} is compiled ({len(template.slots)} placeholders).")
+        with cls.cache_lock:
+            cls.cache[path] = (mtime_ns, template)
+        return template
+
+    def render(self, values: dict):
+        parts = list(self.parts)
+        for i, keyword in self.slots:
+            if keyword in values:
+                parts[i] = str(values[keyword])
+        return "".join(parts)
+
+    def render_many(self, value_list: list):
+        # e.g., thousands of scripts of a parameter sweep
+        return [self.render(values) for values in value_list]
+
+
+def get_script_template(server_machine_name: str, nompi: bool = False):
+    # cached per server and script type
+    if nompi:
+        script_name = "submit_nompi.sh"
+    else:
+        script_name = "submit_mpi.sh"
+    return Script_template.load(
+        os.path.join(job_manager_env_dir, server_machine_name, script_name)
+    )
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import re
+import copy
+import tempfile
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def escape_pattern(path: str):
+    # a literal path as a pattern; rsync honors the backslashes only when
+    # the pattern has a wildcard character.
+    if not any(c in path for c in "*?["):
+        return path
+    return re.sub(r"([*?\[\\])", r"\\\1", path)
+
+
+def translate_pattern(pattern: str):
+    # rsync-like wildcards: * and ? stop at slashes, ** matches anything.
+    i = 0
+    n = len(pattern)
+    regex = ""
+    while i < n:
+        c = pattern[i]
+        if c == "\\" and i + 1 < n and any(ch in pattern for ch in "*?["):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            j = pattern.find("]", i + 2)
+            if j == -1:
+                regex += re.escape(c)
+            else:
+                chars = pattern[i + 1 : j]
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                regex += f"[{chars}]"
+                i = j
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex
+
+
+class Filter_rule:
+    def __init__(self, pattern: str, include: bool, base: str = ""):
+        self.pattern = pattern
+        self.include = include
+        self.base = base.strip("/")
+
+        body = pattern
+        self.with_contents = body.endswith("/***")
+        if self.with_contents:
+            body = body[:-4]
+        self.dir_only = body.endswith("/")
+        body = body.rstrip("/")
+        self.anchored = body.startswith("/")
+        body = body.lstrip("/")
+        self.full_path = (
+            self.anchored or self.with_contents or "/" in body or "**" in body
+        )
+
+        regex = translate_pattern(body)
+        if self.with_contents:
+            regex += "(/.*)?"
+        if self.anchored or not self.full_path:
+            regex = f"^{regex}$"
+        else:
+            regex = f"^(.*/)?{regex}$"
+        self.regex = re.compile(regex)
+
+    def __str__(self):
+        return "\n".join(self.rsync_lines())
+
+    def match(self, rel_path: str, is_dir: bool = False):
+        if self.dir_only and not is_dir and not self.with_contents:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1 :]
+        if not self.full_path:
+            rel_path = os.path.basename(rel_path)
+        return self.regex.match(rel_path) is not None
+
+    def rsync_lines(self):
+        prefix = "+ " if self.include else "- "
+        if not self.base:
+            return [prefix + self.pattern]
+        if self.anchored:
+            return [f"{prefix}/{self.base}{self.pattern}"]
+        return [
+            f"{prefix}/{self.base}/{self.pattern}",
+            f"{prefix}/{self.base}/**/{self.pattern}",
+        ]
+
+
+class Transfer_filter:
+    ignore_file_name = ".turboignore"
+    legacy_exclude_file_name = "exclude_list.txt"
+
+    def __init__(
+        self,
+        include_list: Optional[list] = None,
+        exclude_list: Optional[list] = None,
+        default_exclude_list: Optional[list] = None,
+        local_root: Optional[str] = None,
+    ):
+        if include_list is None:
+            include_list = []
+        if exclude_list is None:
+            exclude_list = []
+        if default_exclude_list is None:
+            default_exclude_list = []
+        # an empty or unset pattern (e.g., no input file) matches nothing.
+        include_list = [pattern for pattern in include_list if pattern]
+        exclude_list = [pattern for pattern in exclude_list if pattern]
+        default_exclude_list = [pattern for pattern in default_exclude_list if pattern]
+
+        if local_root is not None and len(exclude_list) == 0:
+            legacy_exclude_file = os.path.join(
+                local_root, self.legacy_exclude_file_name
+            )
+            if os.path.isfile(legacy_exclude_file):
+                logger.info(f"exclude list is read from {legacy_exclude_file}")
+                exclude_list = self.read_pattern_file(legacy_exclude_file)
+
+        # the first matching rule wins (the rsync convention).
+        self.head_rules = [
+            Filter_rule(pattern, include=False) for pattern in exclude_list
+        ]
+        self.ignore_rules = {}  # base dir -> rules of its .turboignore
+        self.tail_rules = [
+            Filter_rule(pattern, include=False)
+            for pattern in default_exclude_list
+        ]
+        self.prune_empty_dirs = len(include_list) > 0
+        if len(include_list) > 0:
+            for pattern in include_list:
+                self.tail_rules.append(Filter_rule(pattern, include=True))
+                if not pattern.endswith("/***"):
+                    self.tail_rules.append(
+                        Filter_rule(
+                            f"{pattern.rstrip('/')}/***", include=True
+                        )
+                    )
+            self.tail_rules.append(Filter_rule("*/", include=True))
+            self.tail_rules.append(Filter_rule("*", include=False))
+        self.compile()
+
+        if local_root is not None:
+            self.load_ignore_files(local_root)
+
+    @staticmethod
+    def read_pattern_file(file_name: str):
+        with open(file_name, "r") as f:
+            lines = [line.strip() for line in f.readlines()]
+        return [line for line in lines if line and not line.startswith("#")]
+
+    def compile(self):
+        # deeper .turboignore files override shallower ones.
+        self.dir_cache = {}
+        self.rules = list(self.head_rules)
+        for base in sorted(
+            self.ignore_rules, key=lambda b: b.count("/"), reverse=True
+        ):
+            self.rules += self.ignore_rules[base]
+        self.rules += self.tail_rules
+
+    def copy(self):
+        # an independent filter; walk and is_included update the rules and caches.
+        transfer_filter = copy.copy(self)
+        transfer_filter.head_rules = list(self.head_rules)
+        transfer_filter.ignore_rules = dict(self.ignore_rules)
+        transfer_filter.tail_rules = list(self.tail_rules)
+        transfer_filter.compile()
+        return transfer_filter
+
+    def add_exclude(self, pattern: str):
+        self.head_rules.append(Filter_rule(pattern, include=False))
+        self.compile()
+
+    def add_ignore_file(self, file_name: str, base: str = ""):
+        # gitignore-like: later lines win, ! re-includes, a slash anchors.
+        rules = []
+        for pattern in self.read_pattern_file(file_name):
+            include = pattern.startswith("!")
+            if include:
+                pattern = pattern[1:]
+            if "/" in pattern.rstrip("/") and not pattern.startswith(
+                ("/", "**/")
+            ):
+                pattern = "/" + pattern
+            rules.append(Filter_rule(pattern, include=include, base=base))
+        self.ignore_rules[base] = rules[::-1]
+        self.compile()
+
+    def load_ignore_files(self, local_root: str):
+        # .turboignore files in pruned directories are never read.
+        for rel_dir, dir_entries, file_entries in self.walk(
+            local_root, files=False
+        ):
+            pass
+
+    @property
+    def is_empty(self):
+        return len(self.rules) == 0
+
+    def match(self, rel_path: str, is_dir: bool = False):
+        for rule in self.rules:
+            if rule.match(rel_path, is_dir=is_dir):
+                return rule.include
+        return True
+
+    def is_included(self, rel_path: str, is_dir: bool = False):
+        # a path is included only if all its parent dirs are included.
+        parent_dir = os.path.dirname(rel_path)
+        if parent_dir:
+            if parent_dir not in self.dir_cache:
+                self.dir_cache[parent_dir] = self.is_included(
+                    parent_dir, is_dir=True
+                )
+            if not self.dir_cache[parent_dir]:
+                return False
+        return self.match(rel_path, is_dir=is_dir)
+
+    def walk(self, root_dir: str, files: bool = True):
+        # os.walk-like generator that never enters excluded dirs.
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            current_dir = os.path.join(root_dir, rel_dir)
+            ignore_file = os.path.join(current_dir, self.ignore_file_name)
+            if rel_dir not in self.ignore_rules and os.path.isfile(
+                ignore_file
+            ):
+                self.add_ignore_file(ignore_file, base=rel_dir)
+            try:
+                entries = sorted(os.scandir(current_dir), key=lambda e: e.name)
+            except OSError:
+                continue
+            dir_entries = []
+            file_entries = []
+            for entry in entries:
+                if rel_dir:
+                    rel_path = f"{rel_dir}/{entry.name}"
+                else:
+                    rel_path = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if self.match(rel_path, is_dir=True):
+                        dir_entries.append(entry)
+                    else:
+                        logger.debug(f"{rel_path} is pruned.")
+                elif files:
+                    if self.match(rel_path, is_dir=False):
+                        file_entries.append(entry)
+            yield rel_dir, dir_entries, file_entries
+            for entry in reversed(dir_entries):
+                if rel_dir:
+                    stack.append(f"{rel_dir}/{entry.name}")
+                else:
+                    stack.append(entry.name)
+
+    def write_rsync_filter(self, file_name: Optional[str] = None):
+        # all the rules are passed to rsync as a single merge file.
+        if file_name is None:
+            fd, file_name = tempfile.mkstemp(prefix="turbo-", suffix=".rules")
+            os.close(fd)
+        with open(file_name, "w") as f:
+            for rule in self.rules:
+                for line in rule.rsync_lines():
+                    f.write(line + "\n")
+        logger.debug(f"rsync filter file = {file_name}")
+        return file_name
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import glob
+import json
+import pickle
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+class Transfer_journal:
+    # completed items (objects, shards, steps) of a multi-step operation.
+    # the same operation with the same parameters shares the journal.
+    journal_dir = os.path.join(file_manager_config_dir, "journal")
+
+    def __init__(self, operation: str, parameters: dict):
+        self.operation = operation
+        self.parameters = parameters
+        self.lock = threading.Lock()
+        key = hashlib.sha1(
+            json.dumps(
+                [operation, parameters], sort_keys=True, default=str
+            ).encode()
+        ).hexdigest()
+        self.journal_file = os.path.join(self.journal_dir, f"{key}.pkl")
+        self.completed = {}  # item -> data
+        self.created = datetime.today()
+        try:
+            with open(self.journal_file, "rb") as f:
+                stored = pickle.load(f)
+            self.completed = stored["completed"]
+            self.created = stored["created"]
+            logger.info(
+                f"Resuming {operation}: {len(self.completed)} items are already done."
+            )
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+
+    def __str__(self):
+        output = [
+            f"{self.operation} started at {self.created.strftime('%Y-%m-%d %H:%M:%S')}, {len(self.completed)} items done"
+        ]
+        for key, value in self.parameters.items():
+            output.append(f" - {key} = {value}")
+        return "\n".join(output)
+
+    def is_done(self, item: str):
+        with self.lock:
+            return item in self.completed
+
+    def get_data(self, item: str):
+        with self.lock:
+            return self.completed.get(item)
+
+    def mark_done(self, item: str, data=None):
+        with self.lock:
+            self.completed[item] = data
+            self.save()
+
+    def save(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        tmp_file = f"{self.journal_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(
+                {
+                    "operation": self.operation,
+                    "parameters": self.parameters,
+                    "created": self.created,
+                    "completed": self.completed,
+                },
+                f,
+            )
+        os.replace(tmp_file, self.journal_file)
+
+    def close(self):
+        # the operation has finished.
+        with self.lock:
+            self.completed = {}
+            if os.path.isfile(self.journal_file):
+                os.remove(self.journal_file)
+
+    @classmethod
+    def get_pending_journals(cls, operation: Optional[str] = None):
+        journals = []
+        for journal_file in sorted(
+            glob.glob(os.path.join(cls.journal_dir, "*.pkl"))
+        ):
+            try:
+                with open(journal_file, "rb") as f:
+                    stored = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                logger.warning(f"{journal_file} is broken.")
+                continue
+            if operation is not None and stored["operation"] != operation:
+                continue
+            journals.append(
+                cls(
+                    operation=stored["operation"],
+                    parameters=stored["parameters"],
+                )
+            )
+        return sorted(journals, key=lambda journal: journal.created)
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import fcntl
+import pickle
+import tempfile
+import statistics
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+# import file-manager modules
+from turbofilemanager.file_manager_env import file_manager_config_dir
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+class Transfer_stats:
+    # durations of past transfers per (from machine, to machine, strategy)
+    stats_file = os.path.join(file_manager_config_dir, "transfer_stats.pkl")
+    max_samples = 50
+
+    def __init__(self, stats_file: Optional[str] = None):
+        if stats_file is not None:
+            self.stats_file = stats_file
+        self.data = self.read()
+
+    def read(self):
+        try:
+            with open(self.stats_file, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    def get_samples(self, from_name: str, to_name: str, strategy: str):
+        return self.data.get((from_name, to_name, strategy), [])
+
+    def record(
+        self,
+        from_name: str,
+        to_name: str,
+        strategy: str,
+        file_count: int,
+        total_size: int,
+        duration: float,
+        num_streams: int = 1,
+    ):
+        # concurrent transfers (threads or processes) append to the latest file.
+        key = (from_name, to_name, strategy)
+        stats_dir = os.path.dirname(self.stats_file)
+        os.makedirs(stats_dir, exist_ok=True)
+        with open(f"{self.stats_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.data = self.read()
+                samples = self.data.get(key, [])
+                samples.append((file_count, total_size, duration, num_streams))
+                self.data[key] = samples[-self.max_samples :]
+                fd, tmp_file = tempfile.mkstemp(dir=stats_dir, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(self.data, f)
+                os.replace(tmp_file, self.stats_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class Transfer_plan:
+    def __init__(
+        self,
+        strategy: str,
+        reason: str,
+        file_stats: dict,
+        large_file_stats: Optional[dict] = None,
+        num_streams: int = 1,
+        estimates: Optional[dict] = None,
+    ):
+        if large_file_stats is None:
+            large_file_stats = {}
+        if estimates is None:
+            estimates = {}
+        self.strategy = strategy
+        self.reason = reason
+        self.file_stats = file_stats  # files for the main strategy
+        self.large_file_stats = large_file_stats  # files for chunked transfers
+        self.num_streams = num_streams
+        self.estimates = estimates
+        self.empty_dirs = []  # dirs without files, created by tar and sharded
+
+    @property
+    def file_count(self):
+        return len(self.file_stats)
+
+    @property
+    def total_size(self):
+        return sum(size for size, mtime in self.file_stats.values())
+
+    def __str__(self):
+        output = [f"Transfer plan: {self.strategy}"]
+        if self.strategy == "sharded":
+            output[0] += f" ({self.num_streams} streams)"
+        output.append(
+            f"  files = {self.file_count}, size = {self.total_size} bytes"
+        )
+        if len(self.large_file_stats) > 0:
+            output.append(
+                f"  large files = {len(self.large_file_stats)} (chunked transfer)"
+            )
+        for strategy, (estimate, source) in self.estimates.items():
+            output.append(f"  estimate {strategy} = {estimate:.1f} s ({source})")
+        output.append(f"  reason: {self.reason}")
+        return "\n".join(output)
+
+
+class Transfer_planner:
+    # default cost model: time = per_file * files + per_byte * bytes + latency.
+    # the streams of a sharded transfer overlap the per-file round trips only;
+    # they share the bandwidth and each one costs a session (per_stream).
+    default_costs = {
+        "rsync": (2.0e-3, 1.0 / 50e6, 2.0),
+        "tar": (2.0e-4, 1.0 / 50e6, 2.0),
+        "sharded": (2.0e-3, 1.0 / 50e6, 2.0),
+        "pack": (1.0e-4, 1.0 / 50e6, 4.0),
+    }
+    per_stream = 2.0  # sec. of an ssh session and a file list per rsync stream
+    min_samples = 3
+    min_files_per_stream = 16
+
+    def __init__(
+        self,
+        from_machine,
+        to_machine,
+        num_streams: int = 4,
+        stats: Optional[Transfer_stats] = None,
+    ):
+        self.from_machine = from_machine
+        self.to_machine = to_machine
+        self.num_streams = num_streams
+        if stats is None:
+            stats = Transfer_stats()
+        self.stats = stats
+
+    def default_estimate(
+        self,
+        strategy: str,
+        file_count: int,
+        total_size: int,
+        num_streams: int = 1,
+    ):
+        per_file, per_byte, latency = self.default_costs[strategy]
+        if strategy == "sharded":
+            return (
+                per_file * file_count / num_streams
+                + per_byte * total_size
+                + self.per_stream * num_streams
+                + latency
+            )
+        return per_file * file_count + per_byte * total_size + latency
+
+    def learned_factor(self, strategy: str):
+        # median ratio between the measured and the default durations
+        samples = self.stats.get_samples(
+            self.from_machine.name, self.to_machine.name, strategy
+        )
+        if len(samples) < self.min_samples:
+            return None
+        ratios = [
+            duration
+            / self.default_estimate(
+                strategy, file_count, total_size, num_streams
+            )
+            for file_count, total_size, duration, num_streams in samples
+        ]
+        return statistics.median(ratios)
+
+    def estimate(self, strategy: str, file_count: int, total_size: int):
+        estimate = self.default_estimate(
+            strategy, file_count, total_size, self.num_streams
+        )
+        factor = self.learned_factor(strategy)
+        if factor is None:
+            return estimate, "default"
+        return estimate * factor, f"learned x{factor:.2f}"
+
+    @staticmethod
+    def changed_files(file_stats: dict, dest_stats: Optional[dict] = None):
+        # the files whose size or mtime (in sec., as rsync) differ from the dest
+        if dest_stats is None:
+            return dict(file_stats)
+        changed = {}
+        for rel_path, (size, mtime) in file_stats.items():
+            dest = dest_stats.get(rel_path)
+            if dest is None or dest[0] != size or int(dest[1]) != int(mtime):
+                changed[rel_path] = (size, mtime)
+        return changed
+
+    def plan(
+        self,
+        file_stats: dict,
+        dest_exists: bool = True,
+        delete_flag: bool = False,
+        chunked_threshold: Optional[int] = None,
+        pack_threshold: Optional[int] = None,
+        dest_stats: Optional[dict] = None,
+    ):
+        # pack_threshold: the changed files (vs. dest_stats) are packed into one
+        # archive on the source when there are so many. None: pack is not possible.
+        large_file_stats = {}
+        if chunked_threshold is not None:
+            large_file_stats = {
+                rel_path: value
+                for rel_path, value in file_stats.items()
+                if value[0] >= chunked_threshold
+            }
+            file_stats = {
+                rel_path: value
+                for rel_path, value in file_stats.items()
+                if rel_path not in large_file_stats
+            }
+        file_count = len(file_stats)
+        total_size = sum(size for size, mtime in file_stats.values())
+
+        if pack_threshold is not None and not delete_flag:
+            changed_stats = self.changed_files(file_stats, dest_stats)
+            if len(changed_stats) >= pack_threshold:
+                estimates = {
+                    "rsync": self.estimate("rsync", file_count, total_size),
+                    "pack": self.estimate(
+                        "pack",
+                        len(changed_stats),
+                        sum(size for size, mtime in changed_stats.values()),
+                    ),
+                }
+                reason = f"{len(changed_stats)} changed files >= pack_threshold ({pack_threshold})"
+                if len(large_file_stats) > 0:
+                    reason += f"; {len(large_file_stats)} files >= {chunked_threshold} bytes are chunked"
+                plan = Transfer_plan(
+                    strategy="pack",
+                    reason=reason,
+                    file_stats=changed_stats,
+                    large_file_stats=large_file_stats,
+                    estimates=estimates,
+                )
+                logger.debug(plan)
+                return plan
+
+        candidates = ["rsync"]
+        skipped = []
+        # tar resends everything and cannot delete, so it is used only for a new dest.
+        if dest_exists:
+            skipped.append("tar (dest exists)")
+        elif delete_flag:
+            skipped.append("tar (delete)")
+        else:
+            candidates.append("tar")
+        if delete_flag:
+            skipped.append("sharded (delete)")
+        elif file_count < self.num_streams * self.min_files_per_stream:
+            skipped.append("sharded (few files)")
+        else:
+            candidates.append("sharded")
+
+        estimates = {
+            strategy: self.estimate(strategy, file_count, total_size)
+            for strategy in candidates
+        }
+        strategy = min(candidates, key=lambda s: estimates[s][0])
+        reason = f"{strategy} has the shortest estimated time"
+        if len(skipped) > 0:
+            reason += f"; skipped {', '.join(skipped)}"
+        if len(large_file_stats) > 0:
+            reason += f"; {len(large_file_stats)} files >= {chunked_threshold} bytes are chunked"
+
+        plan = Transfer_plan(
+            strategy=strategy,
+            reason=reason,
+            file_stats=file_stats,
+            large_file_stats=large_file_stats,
+            num_streams=self.num_streams if strategy == "sharded" else 1,
+            estimates=estimates,
+        )
+        logger.debug(plan)
+        return plan
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# import python modules
+import os
+import math
+from datetime import datetime
+from typing import Optional
+
+# define logger
+from logging import getLogger
+
+logger = getLogger("file-manager").getChild(__name__)
+
+
+def get_input_key(input_file: Optional[str], local_dir: str):
+    # the input file name and its size in powers of two,
+    # e.g., input.in:2^12 for a 5 kB input.
+    if input_file is None:
+        return None
+    try:
+        size = os.path.getsize(os.path.join(local_dir, input_file))
+    except OSError:
+        return input_file
+    return f"{input_file}:2^{max(size, 1).bit_length()}"
+
+
+def format_walltime(seconds: float):
+    # rounded up to minutes, HH:MM:SS
+    minutes = int(math.ceil(seconds / 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def record_runtime(submission):
+    # the polls bound the runtime: the job started after the last poll seeing
+    # it queued and finished before the first poll seeing it finished. The
+    # upper bound is recorded so that a predicted walltime is never too short.
+    if getattr(submission, "job_end_date", None) is None:
+        return
+    runtime = (submission.job_end_date - submission.job_start_date).total_seconds()
+    queued_date = getattr(submission, "job_queued_date", None)
+    if queued_date is None:
+        logger.debug(f"the start of job {submission.job_number} is unknown.")
+        return
+    start_gap = (submission.job_start_date - queued_date).total_seconds()
+    if start_gap > runtime:
+        # e.g., checked only by hand; the start is too uncertain to learn from.
+        logger.debug(
+            f"job {submission.job_number} started within {start_gap:.0f} s; the runtime is not recorded."
+        )
+        return
+    runtime += start_gap
+    from turbofilemanager.job_index import Job_index
+
+    job_index = Job_index()
+    job_index.add_runtime(
+        {
+            "local_dir": submission.local_dir,
+            "job_number": submission.job_number,
+            "server_machine": submission.server_machine.name,
+            "package": submission.package,
+            "binary": submission.binary,
+            "cores": submission.cores,
+            "openmp": submission.openmp,
+            "input_key": getattr(submission, "input_key", None),
+            "queue": submission.queue,
+            "runtime": runtime,
+            "finished": submission.job_end_date,
+        }
+    )
+    job_index.close()
+    logger.debug(f"runtime of job {submission.job_number} = {runtime:.0f} s")
+
+
+class Walltime_predictor:
+    # a walltime from the runtimes of the same (server, package, binary,
+    # cores, openmp[, input]) jobs: the longest one times safety_factor.
+    min_samples = 3
+    safety_factor = 1.5
+    min_walltime = 600  # sec.
+
+    def predict(
+        self,
+        server_machine_name: str,
+        package: str,
+        binary: str,
+        cores: int,
+        openmp: int,
+        input_key: Optional[str] = None,
+    ):
+        # returns (walltime in sec. or None, decision)
+        from turbofilemanager.job_index import Job_index
+
+        job_index = Job_index()
+        keys = [input_key, None] if input_key is not None else [None]
+        runtimes = []
+        for key in keys:
+            runtimes = job_index.get_runtimes(
+                server_machine=server_machine_name,
+                package=package,
+                binary=binary,
+                cores=cores,
+                openmp=openmp,
+                input_key=key,
+            )
+            if len(runtimes) >= self.min_samples:
+                break
+        job_index.close()
+        decision = {
+            "time": datetime.today(),
+            "input_key": key,
+            "samples": len(runtimes),
+            "max_runtime": max(runtimes) if len(runtimes) > 0 else None,
+            "walltime": None,
+        }
+        if len(runtimes) < self.min_samples:
+            logger.info(
+                f"{len(runtimes)} runtimes are recorded (< {self.min_samples}); the walltime is not predicted."
+            )
+            return None, decision
+        walltime = max(max(runtimes) * self.safety_factor, self.min_walltime)
+        decision["walltime"] = walltime
+        logger.info(
+            f"predicted walltime = {format_walltime(walltime)} from {len(runtimes)} runs (max {max(runtimes):.0f} s)."
+        )
+        return walltime, decision